@@ -1,22 +1,38 @@
 import os
 import sys
 import time
-import zipfile
-import schedule
+import zlib
+import queue
+import struct
+import hashlib
 import threading
 import configparser
 import smtplib
+import json
+import re
+import base64
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox
+from email import policy
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from email.utils import formatdate
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from urllib.parse import quote
 from datetime import datetime
-import winreg as reg
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import ctypes
 
+# 定时备份和随系统启动依赖的模块，缺少时仍可导入本模块（如在其他系统上运行测试脚本）
+try:
+    import schedule
+except ImportError:
+    schedule = None
+try:
+    import winreg as reg
+except ImportError:
+    reg = None
+
 # 隐藏控制台窗口
 def hide_console():
     if sys.platform.startswith('win32'):
@@ -25,14 +41,413 @@ def hide_console():
 # 配置参数
 SMTP_RETRY = 3  # 重试次数
 RETRY_DELAY = 10  # 重试间隔(秒)
-SEND_DELAY = 15  # 分卷邮件发送间隔(秒)，避免频率限制
+SEND_DELAY = 15  # 分卷邮件初始发送间隔(秒)，之后根据服务器响应自动调整
+SEND_DELAY_MIN = 3  # 连续发送成功时间隔逐步缩短到的下限(秒)
+SEND_DELAY_MAX = 300  # 被限流时间隔翻倍的上限(秒)
+THROTTLE_CODES = (421, 450, 451, 452)  # 表示稍后重试/限流的SMTP响应码
+THROTTLE_KEYWORDS = (b"frequen", b"too many", b"limit", "频率".encode("utf-8"))
+SMTP_SERVER = "smtp.qq.com"  # 默认SMTP服务器，可在config.ini中用smtp_server覆盖
+SMTP_PORT = 465  # 465使用SSL，其他端口使用STARTTLS（服务器支持时）
+SMTP_TIMEOUT = 30
+B64_CHUNK = 57 * 1152  # 每次编码的附件字节数，57的倍数保证每行76个字符
+COMPRESS_LEVEL = 6  # 默认压缩级别(0-9)，9压缩率略高但慢很多
+COMPRESS_THREADS = min(4, os.cpu_count() or 1)  # 默认压缩线程数
+INLINE_COMPRESS_LIMIT = 16 * 1024 * 1024  # 超过该大小的文件由写入线程流式压缩，不在内存中预压缩
+PART_QUEUE_SIZE = 2  # 等待发送的分卷数上限，限制临时目录占用
+READ_CHUNK = 1024 * 1024  # 读取文件的块大小
+MANIFEST_FILE = "backup_manifest.json"  # 增量备份的文件清单，与config.ini放在一起
+FULL_BACKUP_EVERY = 7  # 增量模式下每N次备份做一次完整备份
+DELETED_LIST_NAME = "__deleted__.txt"  # 增量包中记录已删除文件的清单
+LEDGER_FILE = "sent_ledger.json"  # 记录已发送分卷及其摘要的账本
+SPOOL_DIR = "spool"  # 分卷存放目录，发送失败的分卷保留在这里等待补发
+LEDGER_HISTORY = 20  # 账本中保留的成功备份记录数
+UI_POLL_INTERVAL = 100  # 界面线程读取后台日志的间隔(毫秒)
+
+ZIP64_LIMIT = (1 << 31) - 1
+ZIP_MAX_ENTRIES = 0xFFFF
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+
+class ArchiveAborted(Exception):
+    """分卷接收方已放弃，停止压缩"""
+
+
+def zip_dos_time(mtime):
+    """将时间戳转换为ZIP使用的DOS日期和时间"""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def file_digest(file_path):
+    """计算文件内容的SHA-256摘要"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            data = f.read(READ_CHUNK)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+def compress_file(file_path, compresslevel):
+    """压缩单个文件（可在工作线程中执行），返回(crc, 原始大小, 压缩数据)"""
+    crc = 0
+    size = 0
+    chunks = []
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15) if compresslevel > 0 else None
+    with open(file_path, "rb") as f:
+        while True:
+            data = f.read(READ_CHUNK)
+            if not data:
+                break
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            chunks.append(compressor.compress(data) if compressor else data)
+    if compressor:
+        chunks.append(compressor.flush())
+    return crc, size, b"".join(chunks)
+
+
+class SplitVolumeWriter:
+    """按固定大小切分的只写输出流，每写满一个分卷立即交给回调处理
+
+    分卷命名为 name.zip.001、name.zip.002 ...，是对同一个ZIP字节流的顺序切分，
+    7-Zip等工具打开第一个分卷即可解压。
+    """
+
+    def __init__(self, base_path, part_size, on_volume=None):
+        self.base_path = base_path
+        self.part_size = part_size
+        self.on_volume = on_volume
+        self.volumes = []  # 已写完的分卷
+        self.handed = 0  # 已成功交给回调的分卷数
+        self.current_path = None
+        self._fp = None
+        self._current = 0
+        self._written = 0
+
+    def _open_next(self):
+        self.current_path = f"{self.base_path}.{len(self.volumes) + 1:03d}"
+        self._fp = open(self.current_path, "wb")
+        self._current = 0
+
+    def _finish_current(self, is_last):
+        self._fp.close()
+        self._fp = None
+        self.volumes.append(self.current_path)
+        self.current_path = None
+        if self.on_volume:
+            self.on_volume(self.volumes[-1], is_last)
+        self.handed += 1
+
+    def write(self, data):
+        view = memoryview(data)
+        while len(view):
+            # 写满的分卷延迟到有后续数据时再提交，这样close()时才能确定最后一个分卷
+            if self._fp is not None and self._current >= self.part_size:
+                self._finish_current(False)
+            if self._fp is None:
+                self._open_next()
+            chunk = view[:self.part_size - self._current]
+            self._fp.write(chunk)
+            self._current += len(chunk)
+            self._written += len(chunk)
+            view = view[len(chunk):]
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._fp is not None:
+            self._finish_current(True)
+
+    def discard(self):
+        """删除未交给回调的分卷（压缩失败或中止时调用）"""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        leftovers = self.volumes[self.handed:]
+        if self.current_path:
+            leftovers.append(self.current_path)
+        for path in leftovers:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class StreamingZipWriter:
+    """只顺序写入、不回退的ZIP写入器，支持ZIP64
+
+    小文件可由线程池预先压缩后按顺序写入，大文件在写入线程中边读边压缩，
+    整个压缩包不会完整出现在内存或磁盘上。
+    """
+
+    def __init__(self, fileobj, compresslevel=COMPRESS_LEVEL):
+        self.fp = fileobj
+        self.compresslevel = compresslevel
+        self.method = zlib.DEFLATED if compresslevel > 0 else 0
+        self.entries = []
+
+    def _local_header(self, name, flags, dos_time, dos_date, crc, csize, usize, zip64):
+        extra = b""
+        version = 20
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, usize, csize)
+            csize = usize = ZIP_MAX_SIZE
+            version = 45
+        header = struct.pack("<IHHHHHIIIHH", 0x04034b50, version, flags, self.method,
+                             dos_time, dos_date, crc, csize, usize, len(name), len(extra))
+        return header + name + extra
+
+    def write_compressed(self, arcname, mtime, crc, usize, data):
+        """写入已压缩好的成员"""
+        name = arcname.encode("utf-8")
+        dos_time, dos_date = zip_dos_time(mtime)
+        offset = self.fp.tell()
+        zip64 = usize > ZIP64_LIMIT or len(data) > ZIP64_LIMIT
+        self.fp.write(self._local_header(name, 0x800, dos_time, dos_date, crc, len(data), usize, zip64))
+        self.fp.write(data)
+        self.entries.append((name, 0x800, dos_time, dos_date, crc, len(data), usize, offset))
+
+    def write_file(self, file_path, arcname):
+        """边读边压缩写入一个文件，使用数据描述符记录CRC和大小"""
+        st = os.stat(file_path)
+        name = arcname.encode("utf-8")
+        dos_time, dos_date = zip_dos_time(st.st_mtime)
+        flags = 0x800 | 0x08
+        offset = self.fp.tell()
+        zip64 = st.st_size * 1.05 > ZIP64_LIMIT
+        self.fp.write(self._local_header(name, flags, dos_time, dos_date, 0, 0, 0, zip64))
+
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15) if self.method else None
+        crc = usize = csize = 0
+        with open(file_path, "rb") as f:
+            while True:
+                data = f.read(READ_CHUNK)
+                if not data:
+                    break
+                crc = zlib.crc32(data, crc)
+                usize += len(data)
+                if compressor:
+                    data = compressor.compress(data)
+                csize += len(data)
+                self.fp.write(data)
+        if compressor:
+            data = compressor.flush()
+            csize += len(data)
+            self.fp.write(data)
+
+        if zip64:
+            self.fp.write(struct.pack("<IIQQ", 0x08074b50, crc, csize, usize))
+        else:
+            self.fp.write(struct.pack("<IIII", 0x08074b50, crc, csize, usize))
+        self.entries.append((name, flags, dos_time, dos_date, crc, csize, usize, offset))
+
+    def close(self):
+        """写入中央目录和结束记录"""
+        cd_offset = self.fp.tell()
+        for name, flags, dos_time, dos_date, crc, csize, usize, offset in self.entries:
+            extra_fields = []
+            if usize >= ZIP_MAX_SIZE:
+                extra_fields.append(usize)
+                usize = ZIP_MAX_SIZE
+            if csize >= ZIP_MAX_SIZE:
+                extra_fields.append(csize)
+                csize = ZIP_MAX_SIZE
+            if offset >= ZIP_MAX_SIZE:
+                extra_fields.append(offset)
+                offset = ZIP_MAX_SIZE
+            extra = b""
+            version = 20
+            if extra_fields:
+                extra = struct.pack(f"<HH{len(extra_fields)}Q", 1, 8 * len(extra_fields), *extra_fields)
+                version = 45
+            self.fp.write(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, version, version, flags,
+                                      self.method, dos_time, dos_date, crc, csize, usize,
+                                      len(name), len(extra), 0, 0, 0, 0, offset))
+            self.fp.write(name + extra)
+        cd_size = self.fp.tell() - cd_offset
+
+        count = len(self.entries)
+        if count >= ZIP_MAX_ENTRIES or cd_offset >= ZIP_MAX_SIZE or cd_size >= ZIP_MAX_SIZE:
+            zip64_end = self.fp.tell()
+            self.fp.write(struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45, 0, 0,
+                                      count, count, cd_size, cd_offset))
+            self.fp.write(struct.pack("<IIQI", 0x07064b50, 0, zip64_end, 1))
+            count = min(count, ZIP_MAX_ENTRIES)
+            cd_size = min(cd_size, ZIP_MAX_SIZE)
+            cd_offset = min(cd_offset, ZIP_MAX_SIZE)
+        self.fp.write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0))
+
+
+def is_throttle_response(code, message):
+    """判断SMTP错误响应是否为服务器限流"""
+    if code in THROTTLE_CODES:
+        return True
+    if isinstance(message, str):
+        message = message.encode("utf-8", "ignore")
+    message = (message or b"").lower()
+    return code in (550, 554) and any(k in message for k in THROTTLE_KEYWORDS)
+
+
+class SendPacer:
+    """根据服务器响应自适应调整邮件发送间隔：成功时缩短，被限流时加倍"""
+
+    def __init__(self, delay=SEND_DELAY):
+        self.delay = delay
+        self.last_send = 0
+
+    def wait(self):
+        """距上次发送不足当前间隔时等待，返回实际等待秒数"""
+        remaining = self.last_send + self.delay - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            return remaining
+        return 0
+
+    def on_success(self):
+        self.last_send = time.monotonic()
+        self.delay = max(SEND_DELAY_MIN, self.delay * 0.8)
+
+    def on_throttle(self):
+        self.last_send = time.monotonic()
+        self.delay = min(SEND_DELAY_MAX, max(self.delay * 2, RETRY_DELAY))
+
+
+class SMTPSession:
+    """复用同一个已登录的SMTP连接，连接断开后下次发送时自动重连"""
+
+    def __init__(self, host, port, user, password, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.server = None
+
+    def connect(self):
+        self.reset()
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            server.ehlo()
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+        try:
+            server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        return server
+
+    def sendmail(self, from_addr, to_addr, msg):
+        if self.server is None:
+            self.connect()
+        return self.server.sendmail(from_addr, to_addr, msg)
+
+    def send_stream(self, from_addr, to_addr, chunks):
+        """逐块把邮件内容直接写入SMTP连接，内存中只保留当前块
+        
+        chunks 中每一块都须以换行结尾（iter_message 生成的内容满足这一点），以便按行做点号转义。
+        """
+        if self.server is None:
+            self.connect()
+        server = self.server
+        code, resp = server.mail(from_addr)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+        code, resp = server.rcpt(to_addr)
+        if code not in (250, 251):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused({to_addr: (code, resp)})
+        code, resp = server.docmd("data")
+        if code != 354:
+            server.rset()
+            raise smtplib.SMTPDataError(code, resp)
+        for chunk in chunks:
+            server.send(re.sub(rb"(?m)^\.", b"..", chunk))
+        server.send(b".\r\n")
+        code, resp = server.getreply()
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPDataError(code, resp)
+
+    def reset(self):
+        """丢弃当前连接（不等待服务器响应）"""
+        if self.server is not None:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+            self.server = None
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+        self.reset()
+
+
+def iter_message(from_addr, to_addr, subject, body, attachment_path=None):
+    """按块生成MIME邮件字节流，附件边读边做base64编码，不整体载入内存"""
+    boundary = f"===============backup{os.urandom(8).hex()}=="
+    headers = [
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        "MIME-Version: 1.0",
+        f"From: {from_addr}",
+        f"To: {to_addr}",
+        f"Subject: {Header(subject, 'utf-8').encode()}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: {make_msgid()}",
+    ]
+    yield ("\r\n".join(headers) + "\r\n\r\n").encode("ascii")
+    
+    yield f"--{boundary}\r\n".encode("ascii")
+    yield MIMEText(body, "plain", "utf-8").as_bytes(policy=policy.SMTP)
+    
+    if attachment_path and os.path.exists(attachment_path):
+        filename = quote(os.path.basename(attachment_path))
+        part_headers = [
+            f"--{boundary}",
+            "Content-Type: application/octet-stream",
+            "MIME-Version: 1.0",
+            "Content-Transfer-Encoding: base64",
+            f"Content-Disposition: attachment; filename*=UTF-8''{filename}",
+        ]
+        yield ("\r\n" + "\r\n".join(part_headers) + "\r\n\r\n").encode("ascii")
+        with open(attachment_path, "rb") as f:
+            while True:
+                data = f.read(B64_CHUNK)
+                if not data:
+                    break
+                yield base64.encodebytes(data).replace(b"\n", b"\r\n")
+    
+    yield f"\r\n--{boundary}--\r\n".encode("ascii")
+
 
 class BackupTool:
     def __init__(self, root):
         # 初始化主窗口
         self.root = root
         self.root.title("文件备份工具")
-        self.root.geometry("650x580")
+        self.root.geometry("650x660")
         self.root.resizable(False, False)
         
         # 设置图标
@@ -46,6 +461,9 @@ class BackupTool:
         
         # 配置文件路径
         self.config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+        self.manifest_path = os.path.join(os.path.dirname(self.config_path), MANIFEST_FILE)
+        self.ledger_path = os.path.join(os.path.dirname(self.config_path), LEDGER_FILE)
+        self.spool_dir = os.path.join(os.path.dirname(self.config_path), SPOOL_DIR)
         
         # 初始化变量
         self.source_folder = StringVar()
@@ -54,8 +472,20 @@ class BackupTool:
         self.sender_password = StringVar()
         self.backup_interval = StringVar(value="1")
         self.part_size = StringVar(value="19")
+        self.compress_level = StringVar(value=str(COMPRESS_LEVEL))
+        self.compress_threads = StringVar(value=str(COMPRESS_THREADS))
+        self.incremental = BooleanVar(value=False)
+        self.full_every = StringVar(value=str(FULL_BACKUP_EVERY))
+        self.smtp_server = SMTP_SERVER
+        self.smtp_port = SMTP_PORT
+        self.pacer = SendPacer()
         self.is_running = False
         self.backup_thread = None
+        # 备份在后台线程执行，只使用启动时读取的设置快照；日志经队列交给界面线程显示
+        self.settings = {}
+        self.backup_worker = None
+        self.backup_requested = threading.Event()
+        self.log_queue = queue.Queue()
         
         # 创建UI
         self.create_widgets()
@@ -68,6 +498,8 @@ class BackupTool:
         
         # 启动定时任务线程
         self.start_scheduler_thread()
+        
+        self.root.after(UI_POLL_INTERVAL, self.poll_ui)
     
     def center_window(self):
         """窗口居中"""
@@ -110,31 +542,46 @@ class BackupTool:
         ttk.Label(main_frame, text="备份间隔(小时):").grid(row=6, column=0, sticky=W, pady=5)
         ttk.Entry(main_frame, textvariable=self.backup_interval, width=10).grid(row=6, column=1, sticky=W, pady=5)
         
+        # 压缩设置
+        ttk.Label(main_frame, text="压缩级别(0-9):").grid(row=7, column=0, sticky=W, pady=5)
+        compress_frame = ttk.Frame(main_frame)
+        compress_frame.grid(row=7, column=1, columnspan=2, sticky=W, pady=5)
+        ttk.Entry(compress_frame, textvariable=self.compress_level, width=10).pack(side=LEFT)
+        ttk.Label(compress_frame, text="压缩线程:").pack(side=LEFT, padx=(20, 5))
+        ttk.Entry(compress_frame, textvariable=self.compress_threads, width=10).pack(side=LEFT)
+        
+        # 增量备份
+        incremental_frame = ttk.Frame(main_frame)
+        incremental_frame.grid(row=8, column=0, columnspan=3, sticky=W, pady=5)
+        ttk.Checkbutton(incremental_frame, text="增量备份（只发送新增或修改的文件），每", variable=self.incremental).pack(side=LEFT)
+        ttk.Entry(incremental_frame, textvariable=self.full_every, width=5).pack(side=LEFT, padx=5)
+        ttk.Label(incremental_frame, text="次做一次完整备份").pack(side=LEFT)
+        
         # 随系统启动
         self.startup_var = BooleanVar()
-        ttk.Checkbutton(main_frame, text="随Windows启动", variable=self.startup_var, command=self.toggle_startup).grid(row=7, column=0, columnspan=3, sticky=W, pady=10)
+        ttk.Checkbutton(main_frame, text="随Windows启动", variable=self.startup_var, command=self.toggle_startup).grid(row=9, column=0, columnspan=3, sticky=W, pady=10)
         
         # 状态显示
-        ttk.Label(main_frame, text="状态:").grid(row=8, column=0, sticky=W, pady=5)
+        ttk.Label(main_frame, text="状态:").grid(row=10, column=0, sticky=W, pady=5)
         self.status_var = StringVar(value="未运行")
-        ttk.Label(main_frame, textvariable=self.status_var, foreground="red").grid(row=8, column=1, sticky=W, pady=5)
+        ttk.Label(main_frame, textvariable=self.status_var, foreground="red").grid(row=10, column=1, sticky=W, pady=5)
         
         # 日志区域
-        ttk.Label(main_frame, text="日志:").grid(row=9, column=0, sticky=NW, pady=5)
+        ttk.Label(main_frame, text="日志:").grid(row=11, column=0, sticky=NW, pady=5)
         self.log_text = Text(main_frame, width=65, height=8, state=DISABLED)
-        self.log_text.grid(row=9, column=1, columnspan=2, pady=5)
+        self.log_text.grid(row=11, column=1, columnspan=2, pady=5)
         scrollbar = ttk.Scrollbar(main_frame, command=self.log_text.yview)
-        scrollbar.grid(row=9, column=3, sticky=NS)
+        scrollbar.grid(row=11, column=3, sticky=NS)
         self.log_text.config(yscrollcommand=scrollbar.set)
         
         # 按钮区域
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=10, column=0, columnspan=3, pady=20)
+        button_frame.grid(row=12, column=0, columnspan=3, pady=20)
         
         self.start_button = ttk.Button(button_frame, text="开始备份服务", command=self.start_service)
         self.start_button.pack(side=LEFT, padx=10)
         
-        ttk.Button(button_frame, text="立即备份", command=self.backup_now).pack(side=LEFT, padx=10)
+        ttk.Button(button_frame, text="立即备份", command=self.start_backup).pack(side=LEFT, padx=10)
         
         ttk.Button(button_frame, text="测试邮箱连接", command=self.test_email_connection).pack(side=LEFT, padx=10)
     
@@ -145,14 +592,28 @@ class BackupTool:
             self.source_folder.set(folder)
     
     def log(self, message):
-        """添加日志信息"""
+        """添加日志信息，任何线程都可调用，由界面线程写入日志框"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] {message}\n"
+        self.log_queue.put(f"[{timestamp}] {message}\n")
+    
+    def poll_ui(self):
+        """界面线程定时显示后台日志，并启动定时任务请求的备份"""
+        lines = []
+        while True:
+            try:
+                lines.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            self.log_text.config(state=NORMAL)
+            self.log_text.insert(END, "".join(lines))
+            self.log_text.see(END)
+            self.log_text.config(state=DISABLED)
         
-        self.log_text.config(state=NORMAL)
-        self.log_text.insert(END, log_message)
-        self.log_text.see(END)
-        self.log_text.config(state=DISABLED)
+        if self.backup_requested.is_set():
+            self.backup_requested.clear()
+            self.start_backup()
+        self.root.after(UI_POLL_INTERVAL, self.poll_ui)
     
     def load_config(self):
         """加载配置文件"""
@@ -168,6 +629,12 @@ class BackupTool:
                 self.sender_password.set(settings.get("sender_password", ""))
                 self.backup_interval.set(settings.get("backup_interval", "1"))
                 self.part_size.set(settings.get("part_size", "19"))
+                self.compress_level.set(settings.get("compress_level", str(COMPRESS_LEVEL)))
+                self.compress_threads.set(settings.get("compress_threads", str(COMPRESS_THREADS)))
+                self.incremental.set(settings.getboolean("incremental", False))
+                self.full_every.set(settings.get("full_every", str(FULL_BACKUP_EVERY)))
+                self.smtp_server = settings.get("smtp_server", SMTP_SERVER)
+                self.smtp_port = settings.getint("smtp_port", SMTP_PORT)
                 
                 self.log("配置文件加载成功")
     
@@ -180,7 +647,13 @@ class BackupTool:
             "sender_email": self.sender_email.get(),
             "sender_password": self.sender_password.get(),
             "backup_interval": self.backup_interval.get(),
-            "part_size": self.part_size.get()
+            "part_size": self.part_size.get(),
+            "compress_level": self.compress_level.get(),
+            "compress_threads": self.compress_threads.get(),
+            "incremental": str(self.incremental.get()),
+            "full_every": self.full_every.get(),
+            "smtp_server": self.smtp_server,
+            "smtp_port": str(self.smtp_port)
         }
         
         with open(self.config_path, "w") as configfile:
@@ -191,6 +664,10 @@ class BackupTool:
     
     def check_startup_status(self):
         """检查是否随系统启动"""
+        if reg is None:
+            self.startup_var.set(False)
+            return False
+        
         try:
             key = reg.OpenKey(reg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\Run", 0, reg.KEY_READ)
             value, _ = reg.QueryValueEx(key, "FileBackupTool")
@@ -207,6 +684,11 @@ class BackupTool:
     
     def toggle_startup(self):
         """切换是否随系统启动"""
+        if reg is None:
+            self.startup_var.set(False)
+            messagebox.showerror("错误", "当前系统不支持设置随系统启动")
+            return
+        
         try:
             key = reg.OpenKey(reg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\Run", 0, reg.KEY_SET_VALUE)
             
@@ -225,92 +707,187 @@ class BackupTool:
             self.log(f"设置启动项失败: {str(e)}")
             messagebox.showerror("错误", f"设置启动项失败: {str(e)}")
     
-    def create_split_zip(self):
-        """创建分卷压缩文件"""
-        if not self.source_folder.get():
+    def get_compress_settings(self):
+        """读取并校验压缩级别和线程数，无效时返回None"""
+        try:
+            level = int(self.settings["compress_level"])
+            threads = int(self.settings["compress_threads"])
+        except ValueError:
+            self.log("请输入有效的压缩级别和压缩线程数")
+            return None
+        if not 0 <= level <= 9 or threads < 1:
+            self.log("压缩级别必须在0-9之间，压缩线程数至少为1")
+            return None
+        return level, threads
+    
+    def iter_source_files(self, source_folder):
+        """遍历源文件夹，产出(文件路径, 压缩包内路径)"""
+        for root, dirs, files in os.walk(source_folder):
+            for file in files:
+                file_path = os.path.join(root, file)
+                arcname = os.path.relpath(file_path, source_folder).replace(os.sep, "/")
+                yield file_path, arcname
+    
+    def create_split_zip(self, on_part=None, files=None, extra_members=None):
+        """边压缩边生成分卷文件，每完成一个分卷调用 on_part(分卷路径, 是否最后一卷)
+        
+        files 为要打包的(文件路径, 压缩包内路径)，默认打包整个源文件夹；
+        extra_members 为额外写入的 {压缩包内路径: 内容}。返回所有分卷路径，失败返回None。
+        """
+        if not self.settings["source_folder"]:
             self.log("请设置源文件夹")
             return None
         
-        if not os.path.exists(self.source_folder.get()):
-            self.log(f"源文件夹不存在: {self.source_folder.get()}")
+        if not os.path.exists(self.settings["source_folder"]):
+            self.log(f"源文件夹不存在: {self.settings['source_folder']}")
             return None
         
+        # 获取分卷大小(MB转字节)
         try:
-            # 获取分卷大小(MB转字节)
-            try:
-                part_size_mb = float(self.part_size.get())
-                if part_size_mb <= 0 or part_size_mb > 20:
-                    self.log("分卷大小必须大于0且不超过20MB")
-                    return None
-                part_size = int(part_size_mb * 1024 * 1024)
-            except ValueError:
-                self.log("请输入有效的分卷大小")
+            part_size_mb = float(self.settings["part_size"])
+            if part_size_mb <= 0 or part_size_mb > 20:
+                self.log("分卷大小必须大于0且不超过20MB")
                 return None
+            part_size = int(part_size_mb * 1024 * 1024)
+        except ValueError:
+            self.log("请输入有效的分卷大小")
+            return None
+        
+        settings = self.get_compress_settings()
+        if not settings:
+            return None
+        level, threads = settings
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        base_zip_path = os.path.join(self.spool_dir, f"backup_{timestamp}.zip")
+        volumes = SplitVolumeWriter(base_zip_path, part_size, on_part)
+        archive = StreamingZipWriter(volumes, level)
+        if files is None:
+            files = self.iter_source_files(self.settings["source_folder"])
+        
+        try:
+            self.log(f"开始压缩（级别 {level}，{threads} 线程）...")
+            for file_path, arcname, result in self.iter_compressed_files(files, level, threads):
+                try:
+                    if result is None:
+                        archive.write_file(file_path, arcname)
+                    else:
+                        crc, size, data = result.result()
+                        archive.write_compressed(arcname, os.path.getmtime(file_path), crc, size, data)
+                except (OSError, zlib.error) as e:
+                    # 被占用或无权限的文件跳过，不影响整个备份
+                    self.log(f"跳过文件 {arcname}: {str(e)}")
+            for arcname, content in (extra_members or {}).items():
+                data = zlib.compress(content, level)[2:-4] if level > 0 else content
+                archive.write_compressed(arcname, time.time(), zlib.crc32(content), len(content), data)
+            archive.close()
+            volumes.close()
             
-            # 创建临时压缩文件
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_zip_name = f"backup_{timestamp}"
-            base_zip_path = os.path.join(os.environ["TEMP"], base_zip_name)
-            
-            # 创建分卷压缩
-            with zipfile.ZipFile(f"{base_zip_path}.zip", 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
-                zipf.pkzip = True  # 启用分卷模式
-                
-                for root, dirs, files in os.walk(self.source_folder.get()):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, self.source_folder.get())
-                        zipf.write(file_path, arcname)
-            
-            # 收集所有分卷文件
-            part_files = []
-            part_number = 1
-            while True:
-                part_ext = f".z{part_number:02d}" if part_number > 1 else ".zip"
-                part_file = f"{base_zip_path}{part_ext}"
-                if os.path.exists(part_file):
-                    part_files.append(part_file)
-                    part_number += 1
-                else:
-                    break
-            
-            self.log(f"分卷压缩完成，共 {len(part_files)} 个文件")
-            return part_files
+            self.log(f"分卷压缩完成，共 {len(volumes.volumes)} 个文件")
+            return volumes.volumes
+        except ArchiveAborted:
+            self.log("分卷压缩已中止")
+            volumes.discard()
+            return None
         except Exception as e:
             self.log(f"分卷压缩失败: {str(e)}")
+            volumes.discard()
             return None
     
-    def send_single_email(self, to_email, subject, body, attachment_path=None):
-        """发送单封邮件（带重试机制）"""
+    def iter_compressed_files(self, files, level, threads):
+        """按顺序产出(文件路径, 压缩包内路径, 预压缩结果)
+        
+        小文件提交到线程池并行压缩（zlib压缩时释放GIL），预压缩结果为Future；
+        大文件或单线程时结果为None，由写入线程流式压缩。最多同时预压缩 threads*2 个文件。
+        """
+        if threads <= 1:
+            for file_path, arcname in files:
+                yield file_path, arcname, None
+            return
+        
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                for file_path, arcname in files:
+                    try:
+                        small = os.path.getsize(file_path) <= INLINE_COMPRESS_LIMIT
+                    except OSError:
+                        small = False
+                    future = pool.submit(compress_file, file_path, level) if small else None
+                    pending.append((file_path, arcname, future))
+                    while len(pending) > threads * 2:
+                        yield pending.popleft()
+                while pending:
+                    yield pending.popleft()
+            finally:
+                for _, _, future in pending:
+                    if future:
+                        future.cancel()
+    
+    def iter_split_zip(self, files=None, extra_members=None):
+        """在后台线程压缩，按完成顺序产出(分卷路径, 是否最后一卷)
+        
+        未发送的分卷最多保留 PART_QUEUE_SIZE 个；调用方提前停止迭代时压缩随之中止。
+        """
+        parts = queue.Queue(maxsize=PART_QUEUE_SIZE)
+        abort = threading.Event()
+        
+        def put(item):
+            while not abort.is_set():
+                try:
+                    parts.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            raise ArchiveAborted()
+        
+        def produce():
+            try:
+                self.create_split_zip(lambda path, is_last: put((path, is_last)), files, extra_members)
+            finally:
+                try:
+                    put(None)
+                except ArchiveAborted:
+                    pass
+        
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = parts.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            abort.set()
+            producer.join()
+            # 清理已压缩但未交给调用方的分卷
+            while True:
+                try:
+                    item = parts.get_nowait()
+                except queue.Empty:
+                    break
+                if item:
+                    try:
+                        os.remove(item[0])
+                    except OSError:
+                        pass
+    
+
+    def new_smtp_session(self):
+        """按本次备份的设置创建SMTP会话（尚未连接）"""
+        return SMTPSession(self.smtp_server, self.smtp_port,
+                           self.settings["sender_email"], self.settings["sender_password"])
+    
+    def send_single_email(self, session, to_email, subject, body, attachment_path=None):
+        """通过已有会话发送单封邮件（断线自动重连，限流时自动放慢并重试）"""
         for attempt in range(SMTP_RETRY):
             try:
-                # 创建邮件
-                msg = MIMEMultipart()
-                msg['From'] = self.sender_email.get()
-                msg['To'] = to_email
-                msg['Subject'] = subject
-                msg['Date'] = formatdate(localtime=True)
-                
-                # 添加正文
-                msg.attach(MIMEText(body, 'plain', 'utf-8'))
-                
-                # 添加附件
-                if attachment_path and os.path.exists(attachment_path):
-                    filename = os.path.basename(attachment_path)
-                    with open(attachment_path, "rb") as attachment:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(attachment.read())
-                    
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', f"attachment; filename*=UTF-8''{filename}",)
-                    msg.attach(part)
-                
-                # 发送邮件（带SSL加密）
-                with smtplib.SMTP_SSL("smtp.qq.com", 465, timeout=30) as server:
-                    server.ehlo()  # 增强握手
-                    server.login(self.sender_email.get(), self.sender_password.get())
-                    server.sendmail(self.sender_email.get(), to_email, msg.as_string())
-                
+                # 附件边读边编码边发送，不在内存中拼出整封邮件
+                chunks = iter_message(self.settings["sender_email"], to_email, subject, body, attachment_path)
+                session.send_stream(self.settings["sender_email"], to_email, chunks)
+                self.pacer.on_success()
                 return True
                 
             except smtplib.SMTPAuthenticationError:
@@ -318,57 +895,227 @@ class BackupTool:
                 return False
             except smtplib.SMTPConnectError:
                 self.log(f"连接SMTP服务器失败（尝试 {attempt+1}/{SMTP_RETRY}）")
+                session.reset()
                 if attempt < SMTP_RETRY - 1:
                     time.sleep(RETRY_DELAY)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code == 421:
+                    # 服务器即将关闭连接
+                    session.reset()
+                if is_throttle_response(e.smtp_code, e.smtp_error):
+                    self.pacer.on_throttle()
+                    self.log(f"服务器限流({e.smtp_code})，发送间隔调整为 {self.pacer.delay:.0f} 秒（尝试 {attempt+1}/{SMTP_RETRY}）")
+                    if attempt < SMTP_RETRY - 1:
+                        self.pacer.wait()
+                else:
+                    self.log(f"邮件发送失败（尝试 {attempt+1}/{SMTP_RETRY}）: {e.smtp_code} {e.smtp_error}")
+                    if attempt < SMTP_RETRY - 1:
+                        time.sleep(RETRY_DELAY)
             except Exception as e:
+                # 连接断开等错误，丢弃当前连接，下次发送时重连
+                session.reset()
                 self.log(f"邮件发送失败（尝试 {attempt+1}/{SMTP_RETRY}）: {str(e)}")
                 if attempt < SMTP_RETRY - 1:
                     time.sleep(RETRY_DELAY)
         
         return False
     
-    def send_email_with_attachments(self, part_files):
-        """发送带多个附件的邮件（分卷）"""
-        if not all([self.dest_email.get(), self.sender_email.get(), self.sender_password.get()]):
-            self.log("请填写完整的邮箱信息")
+    def send_part(self, session, base_subject, index, total, is_last, part_file, resend=False):
+        """发送一个分卷邮件；total 为None表示总数尚未确定"""
+        if total:
+            label = f"第 {index}/{total} 部分"
+        else:
+            label = f"第 {index}/{index} 部分" if is_last else f"第 {index} 部分"
+        self.log(f"准备{'补发' if resend else '发送'}{label}...")
+        
+        # 邮件内容
+        subject = f"{base_subject} ({label}{'，补发' if resend else ''})"
+        if is_last or (total and index == total):
+            body = f"这是自动备份的最后一部分，共 {total or index} 部分。\n"
+        else:
+            body = f"这是自动备份的第 {index} 部分，后续部分将陆续发送。\n"
+        body += "所有部分下载后放在同一文件夹，用7-Zip等工具打开第一个分卷(.zip.001)即可解压。"
+        
+        # 发送邮件（复用同一个SMTP会话）
+        waited = self.pacer.wait()
+        if waited:
+            self.log(f"等待 {waited:.0f} 秒后发送，避免触发频率限制")
+        if not self.send_single_email(session, self.settings["dest_email"], subject, body, part_file):
             return False
+        self.log(f"{label}发送成功")
+        return True
+    
+    def send_email_with_attachments(self, parts, run, ledger):
+        """逐个发送分卷邮件，parts 按顺序产出(分卷路径, 是否最后一卷)
         
-        if not part_files or len(part_files) == 0:
-            self.log("没有要发送的附件")
+        每个分卷的摘要都记入账本 run["parts"]，发送成功后删除分卷。某个分卷发送失败后
+        不再发送，但继续等待压缩完成，剩余分卷保留在本地，下次备份时只补发这些分卷。
+        全部发送成功返回True。
+        """
+        if not all([self.settings["dest_email"], self.settings["sender_email"], self.settings["sender_password"]]):
+            self.log("请填写完整的邮箱信息")
             return False
         
+        failed = False
+        session = self.new_smtp_session()
         try:
-            total_parts = len(part_files)
-            base_subject = f"文件备份 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            
-            for i, part_file in enumerate(part_files):
-                self.log(f"准备发送第 {i+1}/{total_parts} 部分...")
-                
-                # 邮件内容
-                subject = f"{base_subject} (第 {i+1}/{total_parts} 部分)"
-                body = f"这是自动备份的第 {i+1}/{total_parts} 部分。\n所有部分下载后放在同一文件夹，解压第一个文件即可合并。"
+            for part_file, is_last in parts:
+                entry = {
+                    "name": os.path.basename(part_file),
+                    "sha256": file_digest(part_file),
+                    "size": os.path.getsize(part_file),
+                    "sent": False,
+                }
+                run["parts"].append(entry)
+                run["complete"] = is_last
+                index = len(run["parts"])
                 
-                # 发送邮件
-                if not self.send_single_email(
-                    self.dest_email.get(),
-                    subject,
-                    body,
-                    part_file
-                ):
-                    self.log(f"第 {i+1} 部分发送失败，终止发送流程")
-                    return False
-                
-                self.log(f"第 {i+1}/{total_parts} 部分发送成功")
-                
-                # 控制发送频率，避免触发限制
-                if i < total_parts - 1:
-                    self.log(f"等待 {SEND_DELAY} 秒后发送下一部分...")
-                    time.sleep(SEND_DELAY)
+                if not failed:
+                    if self.send_part(session, run["subject"], index, None, is_last, part_file):
+                        entry["sent"] = True
+                        self.remove_temp_file(part_file)
+                    else:
+                        failed = True
+                        self.log(f"第 {index} 部分发送失败，停止发送；压缩继续完成，剩余分卷保留待下次补发")
+                self.save_ledger(ledger)
             
-            return True
+            if not run["parts"]:
+                self.log("没有要发送的附件")
+                return False
+            return not failed and run["complete"]
         except Exception as e:
             self.log(f"邮件发送过程出错: {str(e)}")
             return False
+        finally:
+            session.close()
+    
+    def remove_temp_file(self, path):
+        """删除临时分卷文件"""
+        try:
+            os.remove(path)
+            self.log(f"临时文件已删除: {os.path.basename(path)}")
+        except Exception as e:
+            self.log(f"删除临时文件失败: {str(e)}")
+    
+    def load_ledger(self):
+        """读取发送账本：history 为最近成功的备份，pending 为未发完的备份"""
+        try:
+            with open(self.ledger_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.log(f"读取发送账本失败: {str(e)}")
+        return {"history": [], "pending": None}
+    
+    def save_ledger(self, ledger):
+        """保存发送账本（先写临时文件再替换）"""
+        tmp_path = self.ledger_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(ledger, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.ledger_path)
+        except OSError as e:
+            self.log(f"保存发送账本失败: {str(e)}")
+    
+    def tree_fingerprint(self, entries):
+        """根据(相对路径, 大小, 修改时间)计算源文件夹指纹，目标邮箱变化也视为不同"""
+        h = hashlib.sha256()
+        h.update(f"{self.settings['source_folder']}\0{self.settings['dest_email']}\0".encode("utf-8"))
+        for arcname, size, mtime_ns in sorted(entries):
+            h.update(f"{arcname}\0{size}\0{mtime_ns}\n".encode("utf-8"))
+        return h.hexdigest()
+    
+    def scan_source(self, source):
+        """遍历源文件夹，返回(文件列表, 指纹条目)"""
+        files = []
+        entries = []
+        for file_path, arcname in self.iter_source_files(source):
+            try:
+                st = os.stat(file_path)
+            except OSError as e:
+                self.log(f"跳过文件 {arcname}: {str(e)}")
+                continue
+            files.append((file_path, arcname))
+            entries.append((arcname, st.st_size, st.st_mtime_ns))
+        return files, entries
+    
+    def discard_run(self, run):
+        """删除一次备份留在本地的分卷和清单"""
+        for part in run["parts"]:
+            path = os.path.join(self.spool_dir, part["name"])
+            if os.path.exists(path):
+                self.remove_temp_file(path)
+        if run.get("manifest") and os.path.exists(run["manifest"]):
+            os.remove(run["manifest"])
+    
+    def finish_run(self, ledger, run, ok):
+        """记录一次备份的结果：成功则写入历史，失败则保留或丢弃待补发的分卷"""
+        if ok:
+            if run.get("manifest"):
+                try:
+                    os.replace(run["manifest"], self.manifest_path)
+                except OSError as e:
+                    self.log(f"更新文件清单失败: {str(e)}")
+            ledger["history"].append({
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "subject": run["subject"],
+                "fingerprint": run["fingerprint"],
+                "parts": [{k: p[k] for k in ("name", "sha256", "size")} for p in run["parts"]],
+            })
+            del ledger["history"][:-LEDGER_HISTORY]
+            ledger["pending"] = None
+        elif run["complete"]:
+            unsent = sum(1 for p in run["parts"] if not p["sent"])
+            self.log(f"{unsent} 个分卷未发送成功，已保留在本地，下次备份时补发")
+            ledger["pending"] = run
+        else:
+            # 压缩未完成的备份无法补发
+            self.discard_run(run)
+            ledger["pending"] = None
+        self.save_ledger(ledger)
+    
+    def resume_pending(self, ledger):
+        """补发上次未发完的分卷，无需重新压缩；返回是否可以继续新的备份"""
+        run = ledger["pending"]
+        if not run.get("complete"):
+            # 上次在压缩过程中被中断，已有分卷不是完整的压缩包，不能补发
+            self.log("上次备份在压缩过程中中断，丢弃已生成的分卷，重新完整备份")
+            self.discard_run(run)
+            ledger["pending"] = None
+            self.save_ledger(ledger)
+            return True
+        
+        unsent = [p for p in run["parts"] if not p["sent"]]
+        for part in unsent:
+            path = os.path.join(self.spool_dir, part["name"])
+            if not os.path.exists(path) or file_digest(path) != part["sha256"]:
+                self.log(f"待补发的分卷 {part['name']} 已丢失或损坏，放弃补发，重新完整备份")
+                self.discard_run(run)
+                ledger["pending"] = None
+                self.save_ledger(ledger)
+                return True
+        
+        self.log(f"发现上次未发完的备份，补发 {len(unsent)} 个分卷...")
+        total = len(run["parts"])
+        session = self.new_smtp_session()
+        try:
+            for part in unsent:
+                path = os.path.join(self.spool_dir, part["name"])
+                index = run["parts"].index(part) + 1
+                if not self.send_part(session, run["subject"], index, total, False, path, resend=True):
+                    self.log("补发失败，下次备份时继续补发")
+                    self.save_ledger(ledger)
+                    return False
+                part["sent"] = True
+                self.remove_temp_file(path)
+                self.save_ledger(ledger)
+        finally:
+            session.close()
+        
+        self.finish_run(ledger, run, True)
+        self.log("上次未发完的备份已补发完成")
+        return True
     
     def test_email_connection(self):
         """测试邮箱连接是否正常"""
@@ -378,12 +1125,14 @@ class BackupTool:
             messagebox.showerror("错误", "请填写发件人邮箱和授权码")
             return
         
+        session = SMTPSession(self.smtp_server, self.smtp_port,
+                              self.sender_email.get(), self.sender_password.get())
+        session.timeout = 10
         try:
-            with smtplib.SMTP_SSL("smtp.qq.com", 465, timeout=10) as server:
-                server.ehlo()
-                server.login(self.sender_email.get(), self.sender_password.get())
-                self.log("邮箱连接测试成功！")
-                messagebox.showinfo("成功", "邮箱连接测试成功")
+            session.connect()
+            session.close()
+            self.log("邮箱连接测试成功！")
+            messagebox.showinfo("成功", "邮箱连接测试成功")
         except smtplib.SMTPAuthenticationError:
             self.log("邮箱认证失败，请检查授权码是否正确")
             messagebox.showerror("错误", "邮箱认证失败，请检查授权码是否正确")
@@ -394,30 +1143,180 @@ class BackupTool:
             self.log(f"邮箱测试失败: {str(e)}")
             messagebox.showerror("错误", f"邮箱测试失败: {str(e)}")
     
+    def load_manifest(self):
+        """读取上次成功备份时的文件清单，不存在或损坏时返回None"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.log(f"读取文件清单失败，将执行完整备份: {str(e)}")
+            return None
+    
+    def save_manifest(self, manifest):
+        """备份发送成功后保存文件清单（先写临时文件再替换，避免写坏）"""
+        tmp_path = self.manifest_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            self.log(f"保存文件清单失败: {str(e)}")
+    
+    def plan_backup(self):
+        """根据上次的文件清单决定本次备份内容
+        
+        返回(是否完整备份, 要打包的文件列表, 已删除的文件列表, 新清单)。
+        文件大小和修改时间都没变时沿用旧摘要，只有变化的文件才重新计算摘要。
+        """
+        source = self.settings["source_folder"]
+        try:
+            full_every = max(1, int(self.settings["full_every"]))
+        except ValueError:
+            self.log(f"完整备份间隔无效，按每 {FULL_BACKUP_EVERY} 次计算")
+            full_every = FULL_BACKUP_EVERY
+        
+        manifest = self.load_manifest()
+        if manifest and manifest.get("source") == source:
+            old_files = manifest.get("files", {})
+            runs_since_full = manifest.get("runs_since_full", 0)
+        else:
+            old_files = None
+            runs_since_full = 0
+        full = old_files is None or runs_since_full + 1 >= full_every
+        
+        new_files = {}
+        changed = []
+        for file_path, arcname in self.iter_source_files(source):
+            try:
+                st = os.stat(file_path)
+                old = (old_files or {}).get(arcname)
+                if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    digest = old[2]
+                else:
+                    digest = file_digest(file_path)
+            except OSError as e:
+                self.log(f"跳过文件 {arcname}: {str(e)}")
+                continue
+            new_files[arcname] = [st.st_size, st.st_mtime_ns, digest]
+            if full or not old or old[2] != digest:
+                changed.append((file_path, arcname))
+        
+        deleted = [] if full else sorted(set(old_files) - set(new_files))
+        new_manifest = {
+            "source": source,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "runs_since_full": 0 if full else runs_since_full + 1,
+            "files": new_files,
+        }
+        return full, changed, deleted, new_manifest
+    
+    def read_settings(self):
+        """在界面线程读取当前设置，备份线程只使用这份快照，不访问Tk变量"""
+        return {
+            "source_folder": self.source_folder.get(),
+            "dest_email": self.dest_email.get(),
+            "sender_email": self.sender_email.get(),
+            "sender_password": self.sender_password.get(),
+            "part_size": self.part_size.get(),
+            "compress_level": self.compress_level.get(),
+            "compress_threads": self.compress_threads.get(),
+            "incremental": self.incremental.get(),
+            "full_every": self.full_every.get(),
+        }
+    
+    def start_backup(self):
+        """在后台线程执行一次备份（界面线程调用），上一次备份未结束时不重复启动"""
+        if self.backup_worker is not None and self.backup_worker.is_alive():
+            self.log("上一次备份仍在进行中，请稍后再试")
+            return
+        self.settings = self.read_settings()
+        self.backup_worker = threading.Thread(target=self.backup_now, daemon=True)
+        self.backup_worker.start()
+    
     def backup_now(self):
-        """立即执行备份"""
+        """执行备份（后台线程）：边压缩边发送，每完成一个分卷就立即发送"""
         self.log("开始执行备份...")
         
-        # 创建分卷压缩文件
-        part_files = self.create_split_zip()
-        if not part_files:
+        if not all([self.settings["dest_email"], self.settings["sender_email"], self.settings["sender_password"]]):
+            self.log("请填写完整的邮箱信息")
             return
         
-        # 发送邮件
-        if self.send_email_with_attachments(part_files):
-            # 备份成功后删除临时文件
-            for part_file in part_files:
-                try:
-                    os.remove(part_file)
-                    self.log(f"临时文件已删除: {os.path.basename(part_file)}")
-                except Exception as e:
-                    self.log(f"删除临时文件失败: {str(e)}")
+        source = self.settings["source_folder"]
+        if not source or not os.path.isdir(source):
+            self.log(f"源文件夹不存在: {source}")
+            return
+        
+        # 先补发上次失败的分卷
+        ledger = self.load_ledger()
+        if ledger.get("pending") and not self.resume_pending(ledger):
+            return
+        
+        extra_members = None
+        new_manifest = None
+        title = "文件备份"
+        if self.settings["incremental"]:
+            full, files, deleted, new_manifest = self.plan_backup()
+            entries = [(name, info[0], info[1]) for name, info in new_manifest["files"].items()]
+        else:
+            files, entries = self.scan_source(source)
+        
+        # 与上次成功发送的备份相比没有变化时不再重复发送
+        fingerprint = self.tree_fingerprint(entries)
+        history = ledger.get("history", [])
+        if history and history[-1].get("fingerprint") == fingerprint:
+            self.log("源文件夹自上次成功备份以来没有变化，跳过本次备份")
+            return
+        
+        if new_manifest:
+            if full:
+                title = "文件备份(完整)"
+                self.log(f"执行完整备份，共 {len(files)} 个文件")
+            else:
+                if not files and not deleted:
+                    # 只有修改时间变化，内容相同
+                    self.save_manifest(new_manifest)
+                    self.log("自上次备份以来没有文件内容变化，跳过本次增量备份")
+                    return
+                title = "文件备份(增量)"
+                self.log(f"执行增量备份: {len(files)} 个新增或修改的文件，{len(deleted)} 个已删除的文件")
+                if deleted:
+                    extra_members = {DELETED_LIST_NAME: "\n".join(deleted).encode("utf-8")}
+        
+        run = {
+            "subject": f"{title} {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            "fingerprint": fingerprint,
+            "manifest": None,
+            "parts": [],
+            "complete": False,
+        }
+        os.makedirs(self.spool_dir, exist_ok=True)
+        if new_manifest:
+            # 新清单等全部分卷发送成功后才生效
+            run["manifest"] = os.path.join(self.spool_dir, f"manifest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            with open(run["manifest"], "w", encoding="utf-8") as f:
+                json.dump(new_manifest, f, ensure_ascii=False)
+        ledger["pending"] = run
+        self.save_ledger(ledger)
+        
+        parts = self.iter_split_zip(files, extra_members)
+        try:
+            ok = self.send_email_with_attachments(parts, run, ledger)
+        finally:
+            # 发送过程出错时停止压缩并清理剩余分卷
+            parts.close()
+        self.finish_run(ledger, run, ok)
         
         self.log("备份操作完成")
     
     def start_service(self):
         """启动或停止备份服务"""
         if not self.is_running:
+            if schedule is None:
+                messagebox.showerror("错误", "缺少schedule模块，无法启动定时备份，请先安装: pip install schedule")
+                return
+            
             # 检查必要配置
             if not all([self.source_folder.get(), self.dest_email.get(), 
                        self.sender_email.get(), self.sender_password.get()]):
@@ -441,7 +1340,8 @@ class BackupTool:
             
             # 设置定时任务
             schedule.clear()
-            schedule.every(interval).hours.do(self.backup_now)
+            # 定时任务线程只发出请求，由界面线程读取设置后启动备份
+            schedule.every(interval).hours.do(self.backup_requested.set)
         else:
             # 停止服务
             self.is_running = False
@@ -0,0 +1,160 @@
+"""测量不同分卷大小下发送一封附件邮件的峰值内存(RSS)
+
+对比两种方式:
+    legacy  旧实现：MIMEBase.set_payload + encode_base64 + as_string 后整体发送
+    stream  当前实现：附件按块base64编码后直接写入SMTP连接
+
+每个测量在独立的子进程中进行，邮件发往本机的 smtp_stub 测试服务器。
+用法:
+    python bench_mail_memory.py --sizes 5 10 19 50
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import tempfile
+import traceback
+import multiprocessing
+
+from smtp_stub import SMTPStubServer
+
+
+MEASURE_TIMEOUT = 600  # 单次测量的最长等待时间(秒)
+
+
+def peak_rss():
+    """返回当前进程的峰值内存(字节)"""
+    if sys.platform.startswith("win32"):
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def send_legacy(session, from_addr, to_addr, path):
+    """旧版 send_single_email 的组包方式"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.base import MIMEBase
+    from email.mime.text import MIMEText
+    from email import encoders
+
+    msg = MIMEMultipart()
+    msg["From"] = from_addr
+    msg["To"] = to_addr
+    msg["Subject"] = "bench"
+    msg.attach(MIMEText("bench", "plain", "utf-8"))
+    with open(path, "rb") as attachment:
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(attachment.read())
+    encoders.encode_base64(part)
+    part.add_header("Content-Disposition", f"attachment; filename*=UTF-8''{os.path.basename(path)}")
+    msg.attach(part)
+    session.sendmail(from_addr, to_addr, msg.as_string())
+
+
+def measure(mode, size_mb, result_queue):
+    """在子进程中发送一封邮件并回传(发送前峰值, 发送后峰值, 耗时)，出错时回传错误信息"""
+    try:
+        send_once(mode, size_mb, result_queue)
+    except Exception:
+        result_queue.put(traceback.format_exc())
+        sys.exit(1)
+
+
+def send_once(mode, size_mb, result_queue):
+    """发送一封测试邮件，测量发送前后的峰值内存"""
+    import backup_tool
+    
+    stub = SMTPStubServer(port=0).start()
+    fd, path = tempfile.mkstemp(suffix=".zip.001")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for _ in range(int(size_mb)):
+                f.write(os.urandom(1024 * 1024))
+        session = backup_tool.SMTPSession(stub.host, stub.port, "bench@localhost", "bench")
+        session.connect()
+        before = peak_rss()
+        start = time.perf_counter()
+        if mode == "legacy":
+            send_legacy(session, "bench@localhost", "bench@localhost", path)
+        else:
+            chunks = backup_tool.iter_message("bench@localhost", "bench@localhost", "bench", "bench", path)
+            session.send_stream("bench@localhost", "bench@localhost", chunks)
+        elapsed = time.perf_counter() - start
+        session.close()
+        result_queue.put((before, peak_rss(), elapsed))
+    finally:
+        stub.stop()
+        os.remove(path)
+
+
+def run_measure(ctx, mode, size_mb):
+    """启动子进程测量并等待结果；子进程出错、提前退出或超时时抛出RuntimeError"""
+    result_queue = ctx.Queue()
+    proc = ctx.Process(target=measure, args=(mode, size_mb, result_queue))
+    proc.start()
+    deadline = time.monotonic() + MEASURE_TIMEOUT
+    result = None
+    try:
+        while result is None:
+            try:
+                result = result_queue.get(timeout=1)
+            except queue.Empty:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"等待超过 {MEASURE_TIMEOUT} 秒没有结果")
+                if not proc.is_alive():
+                    # 子进程退出前写入的结果可能还在管道中
+                    try:
+                        result = result_queue.get(timeout=1)
+                    except queue.Empty:
+                        raise RuntimeError(f"子进程异常退出，退出码 {proc.exitcode}")
+    finally:
+        proc.join(5)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+    if isinstance(result, str):
+        raise RuntimeError(f"子进程出错（退出码 {proc.exitcode}）:\n{result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分卷邮件发送峰值内存测试")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[5, 10, 19, 50], help="分卷大小(MB)")
+    parser.add_argument("--modes", nargs="+", default=["legacy", "stream"], choices=["legacy", "stream"])
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    failed = False
+    print(f"{'分卷(MB)':>8} {'方式':>8} {'峰值RSS(MB)':>12} {'增量(MB)':>10} {'增量/分卷':>10} {'耗时(s)':>8}")
+    for size_mb in args.sizes:
+        for mode in args.modes:
+            try:
+                before, peak, elapsed = run_measure(ctx, mode, size_mb)
+            except RuntimeError as e:
+                failed = True
+                print(f"{size_mb:>8.0f} {mode:>8} 测量失败: {e}", file=sys.stderr)
+                continue
+            growth = (peak - before) / 1024 / 1024
+            print(f"{size_mb:>8.0f} {mode:>8} {peak / 1024 / 1024:>12.1f} {growth:>10.1f} "
+                  f"{growth / size_mb:>10.2f} {elapsed:>8.2f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
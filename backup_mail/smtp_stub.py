@@ -0,0 +1,198 @@
+"""本地SMTP测试服务器，用于在不连接真实邮箱的情况下测试备份工具的邮件发送
+
+用法:
+    python smtp_stub.py --port 2525 --throttle-every 3 --drop-every 5 --save-dir mails
+
+然后在 config.ini 的 [Settings] 中设置:
+    smtp_server = 127.0.0.1
+    smtp_port = 2525
+
+--throttle-every N  每第N封邮件返回 451 频率限制，用于测试自适应发送间隔
+--drop-every N      每第N封邮件在数据接收后直接断开连接，用于测试断线重连
+--save-dir DIR      把收到的邮件保存为 .eml 文件（默认只统计大小，不占用内存）
+
+也可以在脚本中使用:
+    server = SMTPStubServer(port=0)
+    server.start()        # 后台线程运行，server.port 为实际端口
+    ...
+    server.stop()
+    print(server.messages)
+"""
+import os
+import sys
+import time
+import base64
+import argparse
+import threading
+import socketserver
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """处理单个SMTP连接，只实现备份工具用到的命令"""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        stub = self.server.stub
+        stub.connections += 1
+        self.reply("220 localhost SMTP stub ready")
+        mail_from = None
+        rcpt_to = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "ignore").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 73400320\r\n")
+                self.wfile.flush()
+            elif verb == "AUTH":
+                if not self.authenticate(command):
+                    self.reply("535 Authentication failed")
+                    continue
+                stub.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                mail_from = command[10:].strip()
+                rcpt_to = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(command[8:].strip())
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size, path = self.receive_data()
+                stub.received += 1
+                if stub.drop_every and stub.received % stub.drop_every == 0:
+                    # 模拟网络中断：不回复直接断开
+                    return
+                if stub.throttle_every and stub.received % stub.throttle_every == 0:
+                    self.reply("451 4.7.1 Too many messages, frequency limited")
+                    continue
+                stub.messages.append({"from": mail_from, "to": rcpt_to, "size": size, "path": path})
+                self.reply("250 OK queued")
+            elif verb == "RSET":
+                mail_from = None
+                rcpt_to = []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def authenticate(self, command):
+        """支持 AUTH PLAIN 和 AUTH LOGIN，设置了用户名密码时才校验"""
+        stub = self.server.stub
+        parts = command.split()
+        mechanism = parts[1].upper() if len(parts) > 1 else ""
+        if mechanism == "PLAIN":
+            if len(parts) > 2:
+                token = parts[2]
+            else:
+                self.reply("334 ")
+                token = self.rfile.readline().strip().decode("ascii")
+            fields = base64.b64decode(token).split(b"\0")
+            user, password = fields[-2].decode(), fields[-1].decode()
+        elif mechanism == "LOGIN":
+            self.reply("334 VXNlcm5hbWU6")
+            user = base64.b64decode(self.rfile.readline().strip()).decode()
+            self.reply("334 UGFzc3dvcmQ6")
+            password = base64.b64decode(self.rfile.readline().strip()).decode()
+        else:
+            return False
+        if stub.user is None:
+            return True
+        return user == stub.user and password == stub.password
+
+    def receive_data(self):
+        """读取邮件内容直到单独一行的'.'，返回(字节数, 保存路径)"""
+        stub = self.server.stub
+        out = None
+        path = None
+        if stub.save_dir:
+            path = os.path.join(stub.save_dir, f"{time.time():.6f}.eml")
+            out = open(path, "wb")
+        size = 0
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line or line == b".\r\n":
+                    break
+                if line.startswith(b".."):
+                    line = line[1:]
+                size += len(line)
+                if out:
+                    out.write(line)
+        finally:
+            if out:
+                out.close()
+        return size, path
+
+
+class SMTPStubServer:
+    """在后台线程运行的SMTP测试服务器"""
+
+    def __init__(self, host="127.0.0.1", port=2525, user=None, password=None,
+                 throttle_every=0, drop_every=0, save_dir=None):
+        self.user = user
+        self.password = password
+        self.throttle_every = throttle_every
+        self.drop_every = drop_every
+        self.save_dir = save_dir
+        self.messages = []
+        self.received = 0
+        self.connections = 0
+        self.logins = 0
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), SMTPStubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="备份工具本地SMTP测试服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--drop-every", type=int, default=0)
+    parser.add_argument("--save-dir")
+    args = parser.parse_args()
+
+    stub = SMTPStubServer(args.host, args.port, args.user, args.password,
+                          args.throttle_every, args.drop_every, args.save_dir)
+    print(f"SMTP测试服务器已启动: {stub.host}:{stub.port}，按 Ctrl+C 退出")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+        print(f"共建立 {stub.connections} 个连接，登录 {stub.logins} 次，"
+              f"收到 {stub.received} 封邮件，成功 {len(stub.messages)} 封")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,9 +8,20 @@ from tkinter import filedialog, messagebox, ttk
 import logging
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+import re
 import json
+import zlib
+import sqlite3
+import queue
+import random
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 import qrcode
 from io import BytesIO
+from collections import deque
 from PIL import Image, ImageTk
 
 # 配置日志
@@ -28,12 +39,47 @@ API_KEY = "9Ed03IJAgtoRMwljjSVUsFOpP6t3cEBe"  # 替换为你的AppKey
 SECRET_KEY = "IthBI8HZfaVkjg5KsGz5BonW5Ivfe6l9"  # 替换为你的SecretKey
 REDIRECT_URI = "oob"
 
+# 接口地址前缀，可通过环境变量指向本地模拟服务器（mock_netdisk_server.py）进行离线测试
+OAUTH_BASE = os.environ.get("BAIDU_OAUTH_BASE", "https://openapi.baidu.com")
+PAN_API_BASE = os.environ.get("BAIDU_PAN_API_BASE", "https://pan.baidu.com")
+PCS_API_BASE = os.environ.get("BAIDU_PCS_API_BASE", "https://d.pcs.baidu.com")
+
 # 包含完整的权限范围
-AUTH_URL = f"https://openapi.baidu.com/oauth/2.0/authorize?response_type=code&client_id={API_KEY}&redirect_uri={REDIRECT_URI}&scope=basic,netdisk,netdisk.read,netdisk.write,netdisk.file"
-TOKEN_URL = "https://openapi.baidu.com/oauth/2.0/token"
-UPLOAD_URL = "https://pan.baidu.com/rest/2.0/xpan/file?method=upload"
-MKDIR_URL = "https://pan.baidu.com/rest/2.0/xpan/file?method=mkdir"
-LIST_URL = "https://pan.baidu.com/rest/2.0/xpan/file?method=list"
+AUTH_URL = f"{OAUTH_BASE}/oauth/2.0/authorize?response_type=code&client_id={API_KEY}&redirect_uri={REDIRECT_URI}&scope=basic,netdisk,netdisk.read,netdisk.write,netdisk.file"
+TOKEN_URL = f"{OAUTH_BASE}/oauth/2.0/token"
+MKDIR_URL = f"{PAN_API_BASE}/rest/2.0/xpan/file?method=mkdir"
+LIST_URL = f"{PAN_API_BASE}/rest/2.0/xpan/file?method=list"
+PRECREATE_URL = f"{PAN_API_BASE}/rest/2.0/xpan/file?method=precreate"
+SUPERFILE_URL = f"{PCS_API_BASE}/rest/2.0/pcs/superfile2?method=upload"
+CREATE_URL = f"{PAN_API_BASE}/rest/2.0/xpan/file?method=create"
+RAPIDUPLOAD_URL = f"{PCS_API_BASE}/rest/2.0/pcs/file?method=rapidupload"
+FILEMANAGER_URL = f"{PAN_API_BASE}/rest/2.0/xpan/file?method=filemanager"
+
+# 分片上传参数
+UPLOAD_SLICE_SIZE = 4 * 1024 * 1024  # 分片大小，普通用户固定为4MB
+UPLOAD_SLICE_WORKERS = 4  # 同一文件并行上传的分片数
+UPLOAD_STATE_FILE = "netdisk_upload_state.json"  # 断点续传状态
+UPLOAD_ID_TTL = 24 * 3600  # 断点续传的uploadid有效期(秒)，过期后重新预上传
+REQUEST_TIMEOUT = 60  # 单次请求超时(秒)
+RAPID_SLICE_SIZE = 256 * 1024  # 秒传校验用的文件头部大小，小于该大小的文件不能秒传
+LIST_PAGE_SIZE = 1000  # 列目录接口每页最多返回的条目数
+LIST_NOT_FOUND_ERRNO = -9  # 列目录接口返回的"目录不存在"错误码
+UPLOAD_WORKERS = 4  # 同时上传的文件数
+UPLOAD_QUEUE_SIZE = 100  # 待上传文件队列长度，遍历目录的速度超过上传时在此等待
+API_RATE_LIMIT = 10  # 所有接口合计每秒最多请求次数，超过开放平台频控会返回错误
+API_RATE_BURST = 20  # 允许的突发请求数
+PROGRESS_INTERVAL = 1000  # 界面刷新上传进度的间隔(毫秒)
+API_RETRY = 4  # 网络错误、服务端错误和频控时的重试次数
+API_BACKOFF_BASE = 1  # 第一次重试前等待的秒数，之后每次翻倍
+API_BACKOFF_MAX = 60  # 单次重试最长等待秒数
+TOKEN_REFRESH_MARGIN = 300  # 访问令牌在过期前多少秒主动刷新
+RATE_LIMIT_ERRNOS = (31034,)  # 接口频控错误码，等待后重试
+TOKEN_ERROR_CODES = (110, 111)  # 访问令牌无效/过期（error_code），刷新令牌后重试
+UPLOAD_READ_CHUNK = 64 * 1024  # 限速时每次发送的数据块大小
+SPEED_WINDOW = 5  # 计算当前上传速度的时间窗口(秒)
+SYNC_DB_FILE = "netdisk_sync_state.db"  # 同步模式的状态数据库
+SNAPSHOT_RESUME_LIMIT = 3  # 未完成的快照最多续传几次，之后改为上传到新的备份目录
+FILEMANAGER_BATCH = 100  # 每次批量删除的文件数
 
 # 百度网盘API错误码解释
 ERROR_CODE_EXPLANATIONS = {
@@ -51,14 +97,251 @@ ERROR_CODE_EXPLANATIONS = {
     112: "路径过长",
     113: "包含非法字符",
     114: "目录不为空",
+    31034: "接口请求过于频繁，已触发频控",
+    31079: "网盘中没有相同内容的文件，无法秒传",
     31064: "应用未获得文件操作权限，请在开放平台配置权限并重新授权"
 }
 
+class RateLimiter:
+    """令牌桶限速：平均每秒最多rate个令牌，空闲时最多积累burst个，rate为0时不限速
+    
+    既用于接口调用次数（每次1个），也用于上传带宽（每个字节1个）。
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def set_rate(self, rate, burst):
+        """修改限速，已积累的令牌不超过新的上限"""
+        with self.lock:
+            self.refill()
+            self.rate = rate
+            self.capacity = burst
+            self.tokens = min(self.tokens, burst)
+    
+    def refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+    
+    def acquire(self, amount=1):
+        """取得amount个令牌，没有令牌时等待
+        
+        令牌可以透支，透支的部分由后面的请求等待补足，这样大块数据也不会一直等不到足够的令牌。
+        """
+        while True:
+            with self.lock:
+                if self.rate <= 0:
+                    return
+                self.refill()
+                if self.tokens > 0:
+                    self.tokens -= amount
+                    return
+                wait = -self.tokens / self.rate
+            time.sleep(min(wait, 1))
+
+class ThroughputMeter:
+    """统计最近 SPEED_WINDOW 秒内的上传速度"""
+    def __init__(self):
+        self.samples = deque()
+        self.lock = threading.Lock()
+    
+    def add(self, size):
+        with self.lock:
+            self.samples.append((time.monotonic(), size))
+    
+    def rate(self):
+        """当前速度(字节/秒)"""
+        with self.lock:
+            cutoff = time.monotonic() - SPEED_WINDOW
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            return sum(size for _, size in self.samples) / SPEED_WINDOW
+
+class ThrottledUpload:
+    """分片上传的multipart请求体，发送时按上传限速分块读出
+    
+    requests 发送文件对象时按块调用read()，在这里等待限速令牌就能让所有上传线程共享同一个带宽上限。
+    """
+    def __init__(self, data, limiter, meter, field="file", filename="blob"):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = (f"--{boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+                f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self.buffer = BytesIO(head + data + tail)
+        self.length = len(head) + len(data) + len(tail)
+        self.limiter = limiter
+        self.meter = meter
+    
+    def __len__(self):
+        return self.length
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        chunk = self.buffer.read(min(size, UPLOAD_READ_CHUNK))
+        if chunk:
+            self.limiter.acquire(len(chunk))
+            self.meter.add(len(chunk))
+        return chunk
+    
+    def seek(self, offset, whence=0):
+        """请求重试时从头发送"""
+        return self.buffer.seek(offset, whence)
+    
+    def tell(self):
+        return self.buffer.tell()
+
+def parse_upload_limit(text):
+    """解析上传限速(KB/s)，空为0（不限速）；不是不小于0的数字时抛出ValueError"""
+    try:
+        limit = float(text.strip() or 0)
+    except ValueError:
+        raise ValueError(f"限速不是数字: {text}") from None
+    if not 0 <= limit < float("inf"):
+        raise ValueError(f"限速必须是不小于0的数字: {text}")
+    return limit
+
+def parse_bandwidth_profiles(text):
+    """解析分时限速设置，如 "08:00-18:00=512;18:00-22:00=2048"
+    
+    返回 [(开始分钟, 结束分钟, KB/s)]，时间在 00:00-24:00 之间，结束早于开始表示跨过午夜；
+    格式错误时抛出ValueError，错误信息中带有出错的那一项。
+    """
+    profiles = []
+    for item in text.replace("；", ";").split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split("=")
+        span = parts[0].split("-")
+        if len(parts) != 2 or len(span) != 2:
+            raise ValueError(f"分时限速格式应为 开始-结束=限速: {item}")
+        minutes = []
+        for value in span:
+            match = re.fullmatch(r"(\d{1,2}):(\d{2})", value.strip(), re.ASCII)
+            if not match:
+                raise ValueError(f"时间格式应为 时:分: {item}")
+            hour, minute = int(match.group(1)), int(match.group(2))
+            if minute >= 60 or hour > 24 or (hour == 24 and minute > 0):
+                raise ValueError(f"时间必须在 00:00-24:00 之间: {item}")
+            minutes.append(hour * 60 + minute)
+        try:
+            limit = parse_upload_limit(parts[1])
+        except ValueError as e:
+            raise ValueError(f"{e}（{item}）") from None
+        profiles.append((minutes[0], minutes[1], limit))
+    return profiles
+
+class NetdiskClient:
+    """百度网盘接口客户端
+    
+    所有请求共用一个连接池并受全局限速约束；访问令牌在过期前自动刷新；
+    网络错误、服务端错误和频控按指数退避重试。接口返回统一解析为dict。
+    """
+    def __init__(self, log, get_refresh_token, on_refresh_token):
+        self.log = log
+        self.get_refresh_token = get_refresh_token
+        self.on_refresh_token = on_refresh_token  # 获得新的refresh_token时回调，用于保存配置
+        self.access_token = ""
+        self.token_expire_time = 0
+        self.token_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=UPLOAD_WORKERS * UPLOAD_SLICE_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.rate_limiter = RateLimiter(API_RATE_LIMIT, API_RATE_BURST)
+    
+    def http(self, method, url, **kwargs):
+        """通过共享连接池发送请求，所有接口调用都经过全局限速"""
+        self.rate_limiter.acquire()
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return self.session.request(method, url, **kwargs)
+    
+    def request_token(self, params):
+        """请求令牌接口，成功时保存访问令牌"""
+        try:
+            response = self.http("GET", TOKEN_URL, params=dict(params, client_id=API_KEY, client_secret=SECRET_KEY))
+            self.log(f"令牌请求响应: 状态码={response.status_code}")
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.log(f"获取访问令牌失败: {str(e)}")
+            return False
+        
+        if "access_token" not in result:
+            self.log(f"获取访问令牌失败: {result.get('error_description', '未知错误')}")
+            return False
+        self.access_token = result["access_token"]
+        self.token_expire_time = time.time() + result["expires_in"] - TOKEN_REFRESH_MARGIN
+        # 更新refresh_token（如果有新的）
+        if result.get("refresh_token") and result["refresh_token"] != self.get_refresh_token():
+            self.on_refresh_token(result["refresh_token"])
+        return True
+    
+    def authorize(self, code):
+        """使用授权码获取访问令牌"""
+        with self.token_lock:
+            return self.request_token({"grant_type": "authorization_code", "code": code, "redirect_uri": REDIRECT_URI})
+    
+    def ensure_token(self):
+        """确保访问令牌有效，临近过期时刷新；多个线程同时调用时只刷新一次"""
+        with self.token_lock:
+            if self.access_token and time.time() < self.token_expire_time:
+                return True
+            if not self.get_refresh_token():
+                self.log("没有刷新令牌，无法刷新访问令牌")
+                return False
+            self.log("正在刷新访问令牌...")
+            if not self.request_token({"grant_type": "refresh_token", "refresh_token": self.get_refresh_token()}):
+                return False
+            self.log("访问令牌已刷新")
+            return True
+    
+    def request(self, method, url, params=None, **kwargs):
+        """调用网盘接口并返回解析后的结果，自动带上访问令牌
+        
+        无法得到结果时返回 {"errno": -3, "errmsg": 原因}，调用方统一按错误码处理。
+        """
+        result = None
+        error = ""
+        for attempt in range(API_RETRY + 1):
+            if not self.ensure_token():
+                return {"errno": -5, "errmsg": "授权无效，请重新授权"}
+            if hasattr(kwargs.get("data"), "seek"):
+                kwargs["data"].seek(0)
+            try:
+                response = self.http(method, url, params=dict(params or {}, access_token=self.access_token), **kwargs)
+                result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                result = None
+                error = str(e)
+            else:
+                errno = result.get("error_code", result.get("errno", 0))
+                if "error_code" in result and errno in TOKEN_ERROR_CODES:
+                    # 令牌被提前吊销或过期，强制刷新后重试
+                    with self.token_lock:
+                        self.token_expire_time = 0
+                    error = f"访问令牌失效: {result.get('error_msg', '')}"
+                elif errno in RATE_LIMIT_ERRNOS or response.status_code >= 500:
+                    error = f"状态码={response.status_code}, 错误码={errno}"
+                else:
+                    return result
+            if attempt < API_RETRY:
+                time.sleep(min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1))
+        self.log(f"接口请求失败，已重试 {API_RETRY} 次: {url.split('?')[0]}，{error}")
+        return result or {"errno": -3, "errmsg": error}
+
 class BaiduNetdiskBackupTool:
     def __init__(self, root):
         self.root = root
         self.root.title("百度网盘定时备份工具")
-        self.root.geometry("700x600")
+        self.root.geometry("700x830")
         self.root.resizable(True, True)
         
         # 设置中文字体支持
@@ -70,16 +353,35 @@ class BaiduNetdiskBackupTool:
         # 备份参数
         self.folder_to_backup = tk.StringVar()
         self.refresh_token = tk.StringVar()
-        self.access_token = ""
-        self.expires_in = 0
-        self.token_expire_time = 0
         self.remote_folder = tk.StringVar(value="/备份")  # 默认备份目录
         self.backup_interval = tk.StringVar(value="1")  # 默认1小时
         self.interval_unit = tk.StringVar(value="小时")
+        self.backup_mode = tk.StringVar(value="快照")  # 快照: 每次完整上传到新目录；同步: 只上传变化的文件
+        self.sync_remote_changes = tk.BooleanVar(value=False)  # 同步模式下是否删除/改名网盘文件
+        self.snapshot_days = tk.StringVar(value="0")  # 同步模式下每隔几天额外做一次完整快照，0为不做
+        self.upload_limit = tk.StringVar(value="0")  # 上传限速(KB/s)，0为不限速
+        self.limit_profiles = tk.StringVar(value="")  # 分时限速，未列出的时段使用上传限速
         self.backup_running = False
+        self.backup_lock = threading.Lock()  # 同一时间只执行一次备份，定时任务和"立即备份"都要先取得
+        self.remote_cache_lock = threading.Lock()
+        self.upload_state_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.sync_db_lock = threading.Lock()
+        self.progress = None  # 正在进行的上传进度，只供界面定时读取
+        self.ui_queue = queue.Queue()  # 后台线程交给界面线程执行的 (函数, 参数)，Tk 控件只能在界面线程中访问
+        self.client = NetdiskClient(self.log, self.refresh_token.get, self.on_refresh_token)
+        self.bandwidth = RateLimiter(0, 0)  # 所有上传线程共用的带宽限速
+        self.upload_meter = ThroughputMeter()
+        self.bandwidth_limit = 0  # 当前生效的限速(KB/s)
+        self.invalid_limit_setting = None  # 已提示过无效的限速设置，避免每次刷新都重复提示
         
         # 创建界面
         self.create_widgets()
+        self.root.after(PROGRESS_INTERVAL, self.update_progress)
+        
+        # 读取断点续传状态和同步状态
+        self.upload_state = self.load_upload_state()
+        self.sync_db = self.open_sync_db()
         
         # 加载保存的配置
         self.load_config()
@@ -132,6 +434,36 @@ class BaiduNetdiskBackupTool:
         )
         interval_combobox.grid(row=0, column=3, sticky=tk.W, pady=5)
         
+        ttk.Label(timer_frame, text="备份方式:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        ttk.Combobox(
+            timer_frame,
+            textvariable=self.backup_mode,
+            values=["快照", "同步"],
+            state="readonly",
+            width=8
+        ).grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(timer_frame, text="完整快照间隔(天):").grid(row=1, column=2, sticky=tk.W, pady=5, padx=5)
+        ttk.Entry(timer_frame, textvariable=self.snapshot_days, width=10).grid(row=1, column=3, sticky=tk.W, pady=5)
+        
+        ttk.Checkbutton(
+            timer_frame,
+            text="同步删除和改名（本地删除的文件也会从网盘删除）",
+            variable=self.sync_remote_changes
+        ).grid(row=2, column=0, columnspan=4, sticky=tk.W, pady=5)
+        
+        ttk.Label(timer_frame, text="上传限速(KB/s):").grid(row=3, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(timer_frame, textvariable=self.upload_limit, width=10).grid(row=3, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(timer_frame, text="分时限速:").grid(row=3, column=2, sticky=tk.W, pady=5, padx=5)
+        ttk.Entry(timer_frame, textvariable=self.limit_profiles, width=30).grid(row=3, column=3, sticky=tk.W, pady=5)
+        
+        ttk.Label(
+            timer_frame,
+            text="分时限速格式: 08:00-18:00=512;18:00-08:00=0（KB/s，0为不限速），未列出的时段使用上传限速",
+            foreground="#666666"
+        ).grid(row=4, column=0, columnspan=4, sticky=tk.W)
+        
         # 按钮区域
         button_frame = ttk.Frame(main_frame, padding="10")
         button_frame.pack(fill=tk.X, pady=5)
@@ -148,6 +480,15 @@ class BaiduNetdiskBackupTool:
         self.save_config_button = ttk.Button(button_frame, text="保存配置", command=self.save_config)
         self.save_config_button.pack(side=tk.LEFT, padx=5)
         
+        # 上传进度
+        progress_frame = ttk.LabelFrame(main_frame, text="上传进度", padding="10")
+        progress_frame.pack(fill=tk.X, pady=5)
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+        self.progress_bar.pack(fill=tk.X)
+        self.progress_var = tk.StringVar(value="")
+        ttk.Label(progress_frame, textvariable=self.progress_var, wraplength=620).pack(fill=tk.X, pady=(5, 0))
+        
         # 状态区域
         status_frame = ttk.LabelFrame(main_frame, text="状态日志", padding="10")
         status_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -173,30 +514,113 @@ class BaiduNetdiskBackupTool:
             self.folder_to_backup.set(folder)
             self.log("已选择备份文件夹: " + folder)
     
+    def update_progress(self):
+        """定时在界面上显示后台线程的日志、状态和上传进度：总体进度、平均速度和正在上传的文件"""
+        while True:
+            try:
+                func, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+        
+        progress = self.progress
+        if progress:
+            with self.stats_lock:
+                active = [(os.path.basename(path), done, size) for path, (done, size) in progress["active"].items()]
+                done_bytes = progress["bytes_done"] + sum(done for _, done, _ in active)
+                elapsed = (progress["end"] or time.time()) - progress["start"]
+                speed = progress["bytes_sent"] / max(elapsed, 0.001) / 1024 / 1024
+                text = (f"已处理 {progress['files_done']}/{progress['files_total']} 个文件，"
+                        f"{done_bytes / 1024 / 1024:.1f}/{progress['bytes_total'] / 1024 / 1024:.1f} MB，"
+                        f"平均速度 {speed:.2f} MB/s")
+            if active:
+                text += "\n正在上传: " + "，".join(
+                    f"{name} {done * 100 // max(size, 1)}%" for name, done, size in active)
+            self.progress_bar["maximum"] = max(progress["bytes_total"], 1)
+            self.progress_bar["value"] = done_bytes
+            self.progress_var.set(text)
+        
+        # 按时段调整限速，上传时在状态栏显示当前/平均/限速
+        self.apply_bandwidth_limit()
+        if progress and not progress["end"]:
+            limit = f"{self.bandwidth_limit:.0f} KB/s" if self.bandwidth_limit > 0 else "不限速"
+            self.status_var.set(f"正在备份... 当前 {self.upload_meter.rate() / 1024:.0f} KB/s，"
+                                f"平均 {speed * 1024:.0f} KB/s，限速 {limit}")
+        self.root.after(PROGRESS_INTERVAL, self.update_progress)
+    
+    def current_bandwidth_limit(self):
+        """当前时段的上传限速(KB/s)，0为不限速
+        
+        设置无效时在日志中提示（每个无效设置只提示一次），并保持当前生效的限速。
+        """
+        setting = (self.upload_limit.get(), self.limit_profiles.get())
+        try:
+            limit = parse_upload_limit(setting[0])
+            profiles = parse_bandwidth_profiles(setting[1])
+        except ValueError as e:
+            if setting != self.invalid_limit_setting:
+                self.invalid_limit_setting = setting
+                current = f"{self.bandwidth_limit:.0f} KB/s" if self.bandwidth_limit > 0 else "不限速"
+                self.log(f"限速设置无效: {e}，修改前仍按 {current} 上传")
+            return self.bandwidth_limit
+        self.invalid_limit_setting = None
+        now = datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, profile_limit in profiles:
+            if start <= minute < end or (end < start and (minute >= start or minute < end)):
+                return profile_limit
+        return limit
+    
+    def apply_bandwidth_limit(self):
+        """把当前时段的限速应用到所有上传线程"""
+        limit = self.current_bandwidth_limit()
+        if limit != self.bandwidth_limit:
+            self.bandwidth_limit = limit
+            rate = int(limit * 1024)
+            self.bandwidth.set_rate(rate, max(rate, UPLOAD_READ_CHUNK))
+            self.log(f"上传限速已调整为: {f'{limit:.0f} KB/s' if limit > 0 else '不限速'}")
+    
+    def run_in_ui(self, func, *args):
+        """让界面线程执行 func(*args)，任何线程都可调用，在 update_progress 中执行"""
+        self.ui_queue.put((func, args))
+    
     def log(self, message):
-        """在日志文本框中显示消息"""
-        self.log_text.config(state=tk.NORMAL)
+        """记录日志，任何线程都可调用，由界面线程写入日志文本框"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.run_in_ui(self.show_log, f"[{timestamp}] {message}\n")
+        logging.info(message)
+    
+    def show_log(self, line):
+        """在日志文本框中显示一行日志（界面线程）"""
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, line)
         self.log_text.see(tk.END)  # 滚动到最后
         self.log_text.config(state=tk.DISABLED)
-        logging.info(message)
     
     def save_config(self):
         """保存配置到文件"""
         try:
-            with open("netdisk_backup_config.txt", "w", encoding="utf-8") as f:
-                f.write(f"REFRESH_TOKEN={self.refresh_token.get()}\n")
-                f.write(f"FOLDER={self.folder_to_backup.get()}\n")
-                f.write(f"REMOTE_FOLDER={self.remote_folder.get()}\n")
-                f.write(f"INTERVAL={self.backup_interval.get()}\n")
-                f.write(f"UNIT={self.interval_unit.get()}\n")
+            self.write_config()
             self.log("配置已保存")
             messagebox.showinfo("成功", "配置已保存")
         except Exception as e:
             self.log(f"保存配置失败: {str(e)}")
             messagebox.showerror("错误", f"保存配置失败: {str(e)}")
     
+    def write_config(self):
+        """把配置写入文件（界面线程），失败时抛出异常"""
+        with open("netdisk_backup_config.txt", "w", encoding="utf-8") as f:
+            f.write(f"REFRESH_TOKEN={self.refresh_token.get()}\n")
+            f.write(f"FOLDER={self.folder_to_backup.get()}\n")
+            f.write(f"REMOTE_FOLDER={self.remote_folder.get()}\n")
+            f.write(f"INTERVAL={self.backup_interval.get()}\n")
+            f.write(f"UNIT={self.interval_unit.get()}\n")
+            f.write(f"MODE={self.backup_mode.get()}\n")
+            f.write(f"SYNC_CHANGES={int(self.sync_remote_changes.get())}\n")
+            f.write(f"SNAPSHOT_DAYS={self.snapshot_days.get()}\n")
+            f.write(f"UPLOAD_LIMIT={self.upload_limit.get()}\n")
+            f.write(f"LIMIT_PROFILES={self.limit_profiles.get()}\n")
+    
     def load_config(self):
         """从文件加载配置"""
         try:
@@ -214,6 +638,16 @@ class BaiduNetdiskBackupTool:
                             self.backup_interval.set(line[9:])
                         elif line.startswith("UNIT="):
                             self.interval_unit.set(line[5:])
+                        elif line.startswith("MODE="):
+                            self.backup_mode.set(line[5:])
+                        elif line.startswith("SYNC_CHANGES="):
+                            self.sync_remote_changes.set(line[13:] == "1")
+                        elif line.startswith("SNAPSHOT_DAYS="):
+                            self.snapshot_days.set(line[14:])
+                        elif line.startswith("UPLOAD_LIMIT="):
+                            self.upload_limit.set(line[13:])
+                        elif line.startswith("LIMIT_PROFILES="):
+                            self.limit_profiles.set(line[15:])
                 self.log("配置已加载")
         except Exception as e:
             self.log(f"加载配置失败: {str(e)}")
@@ -344,84 +778,36 @@ class BaiduNetdiskBackupTool:
     
     def get_access_token(self, code):
         """使用授权码获取访问令牌"""
+        self.log("正在获取访问令牌...")
+        if self.client.authorize(code):
+            self.log("授权成功，已获取访问令牌")
+            return True
+        self.log("授权失败")
+        return False
+    
+    def on_refresh_token(self, refresh_token):
+        """获得新的刷新令牌时保存配置，可能在上传线程中调用，交给界面线程处理且不弹出对话框"""
+        self.run_in_ui(self.store_refresh_token, refresh_token)
+    
+    def store_refresh_token(self, refresh_token):
+        """保存新的刷新令牌（界面线程）"""
+        self.refresh_token.set(refresh_token)
         try:
-            self.log("正在获取访问令牌...")
-            params = {
-                "grant_type": "authorization_code",
-                "code": code,
-                "client_id": API_KEY,
-                "client_secret": SECRET_KEY,
-                "redirect_uri": REDIRECT_URI
-            }
-            
-            response = requests.get(TOKEN_URL, params=params)
-            self.log(f"令牌请求响应: 状态码={response.status_code}, 内容={response.text}")
-            
-            result = json.loads(response.text)
-            
-            if "access_token" in result:
-                self.access_token = result["access_token"]
-                self.refresh_token.set(result["refresh_token"])
-                self.expires_in = result["expires_in"]
-                self.token_expire_time = time.time() + self.expires_in - 300  # 提前5分钟刷新
-                self.log("授权成功，已获取访问令牌")
-                self.save_config()  # 保存refresh_token
-                return True
-            else:
-                error_msg = result.get('error_description', '未知错误')
-                self.log(f"授权失败: {error_msg}")
-                return False
-        except Exception as e:
-            self.log(f"获取访问令牌失败: {str(e)}")
-            return False
+            self.write_config()
+            self.log("已保存新的刷新令牌")
+        except OSError as e:
+            self.log(f"保存刷新令牌失败: {str(e)}")
     
     def refresh_access_token(self):
         """刷新访问令牌"""
-        if not self.refresh_token.get():
-            self.log("没有刷新令牌，无法刷新访问令牌")
-            return False
-        
-        try:
-            self.log("正在刷新访问令牌...")
-            params = {
-                "grant_type": "refresh_token",
-                "refresh_token": self.refresh_token.get(),
-                "client_id": API_KEY,
-                "client_secret": SECRET_KEY
-            }
-            
-            response = requests.get(TOKEN_URL, params=params)
-            self.log(f"刷新令牌响应: 状态码={response.status_code}, 内容={response.text}")
-            
-            result = json.loads(response.text)
-            
-            if "access_token" in result:
-                self.access_token = result["access_token"]
-                # 更新refresh_token（如果有新的）
-                if "refresh_token" in result:
-                    self.refresh_token.set(result["refresh_token"])
-                    self.save_config()
-                self.expires_in = result["expires_in"]
-                self.token_expire_time = time.time() + self.expires_in - 300  # 提前5分钟刷新
-                self.log("访问令牌已刷新")
-                return True
-            else:
-                error_msg = result.get('error_description', '未知错误')
-                self.log(f"刷新令牌失败: {error_msg}")
-                return False
-        except Exception as e:
-            self.log(f"刷新访问令牌失败: {str(e)}")
-            return False
+        return self.client.ensure_token()
     
     def verify_auth(self):
         """验证授权是否有效"""
         if not self.refresh_token.get():
             self.log("请先获取授权")
             return False
-            
-        if time.time() > self.token_expire_time:
-            return self.refresh_access_token()
-        return True
+        return self.client.ensure_token()
     
     def create_remote_folder(self):
         """在百度网盘中创建文件夹"""
@@ -451,47 +837,23 @@ class BaiduNetdiskBackupTool:
         
         try:
             self.log(f"正在创建网盘文件夹: {folder_path}")
-            params = {
-                "access_token": self.access_token,
-                "path": folder_path,
-                "isdir": 1
-            }
-            
-            # 记录发送的请求参数（隐藏部分token）
-            log_params = params.copy()
-            if 'access_token' in log_params:
-                log_params['access_token'] = log_params['access_token'][:10] + '...'
-            self.log(f"发送创建文件夹请求: {log_params}")
-            
-            response = requests.post(MKDIR_URL, params=params)
-            
-            # 记录详细响应信息
-            self.log(f"API响应状态码: {response.status_code}")
-            self.log(f"API响应内容: {response.text}")
-            
-            # 处理响应
-            try:
-                result = json.loads(response.text)
-            except json.JSONDecodeError:
-                self.log("API返回的响应不是有效的JSON格式")
-                return False
+            result = self.client.request("POST", MKDIR_URL, params={"path": folder_path, "isdir": 1})
+            self.log(f"API响应内容: {json.dumps(result, ensure_ascii=False)}")
             
             # 解析错误码
-            errno = result.get("error_code", result.get("errno", -3))
-            errmsg = result.get("error_msg", result.get("errmsg", "未知错误"))
-            
-            error_explanation = ERROR_CODE_EXPLANATIONS.get(errno, "未知错误")
-            self.log(f"创建文件夹失败: 错误码={errno}, 错误信息={errmsg}")
-            self.log(f"错误解释: {error_explanation}")
-            
-            # 根据错误码提供解决方案
+            errno, errmsg, error_explanation = self.api_error(result)
             if errno == 0:
                 self.log(f"文件夹创建成功: {folder_path}")
                 return True
             elif errno == 110:
                 self.log(f"文件夹已存在: {folder_path}")
                 return True
-            elif errno == -6:
+            
+            self.log(f"创建文件夹失败: 错误码={errno}, 错误信息={errmsg}")
+            self.log(f"错误解释: {error_explanation}")
+            
+            # 根据错误码提供解决方案
+            if errno == -6:
                 self.log("解决方案: 请先创建上级目录，或检查路径是否正确")
             elif errno == -7 or errno == 31064:
                 self.log("解决方案: 1. 登录百度网盘开放平台(https://pan.baidu.com/union)")
@@ -507,76 +869,670 @@ class BaiduNetdiskBackupTool:
             self.log(f"创建文件夹失败: {str(e)}")
             return False
     
-    def upload_file(self, local_path, remote_path):
-        """上传文件到百度网盘"""
-        if not self.verify_auth():
-            self.log("授权无效，请重新授权")
-            return False
+    def upload_file(self, job, local_path, remote_path, hashes=None, overwrite=False):
+        """上传文件到百度网盘，job 为本次备份的运行状态（见 backup_files）
         
+        hashes 为已算好的校验值；overwrite 为True时不检查网盘中是否已有同名同大小的文件。
+        访问令牌由 NetdiskClient 在请求时自动刷新，这里不再逐个文件验证授权。
+        """
         try:
-            # 先检查文件是否已存在
+            # 先检查文件是否已存在（目录列表每次备份只获取一次）
             remote_dir = os.path.dirname(remote_path)
             file_name = os.path.basename(remote_path)
+            local_size = os.path.getsize(local_path)
+            
+            if not overwrite:
+                item = self.list_remote_dir(job, remote_dir).get(file_name)
+                if item and item["isdir"] == 0 and item["size"] == local_size:
+                    self.log(f"文件已存在且大小相同，跳过上传: {file_name}")
+                    return True
             
-            # 列出远程目录下的文件
+            # 读一遍文件同时算出秒传和分片上传需要的校验值，先尝试秒传
+            hashes = hashes or self.compute_file_hashes(local_path)
+            if self.rapid_upload(job, local_path, remote_path, hashes):
+                uploaded = True
+            else:
+                uploaded = self.upload_file_chunked(job, local_path, remote_path, hashes)
+            if uploaded:
+                # 缓存中该文件的旧记录已失效，更新为刚上传的文件
+                with self.remote_cache_lock:
+                    job["remote_cache"].setdefault(remote_dir, {})[file_name] = {"size": local_size, "isdir": 0}
+            return uploaded
+        except Exception as e:
+            self.log(f"文件上传失败: {str(e)}")
+            return False
+    
+    def list_remote_dir(self, job, remote_dir):
+        """获取网盘目录下的文件列表（分页获取全部条目），结果缓存到本次备份结束
+        
+        目录不存在时按空目录处理；其他错误抛出RuntimeError且不缓存，避免把不完整的列表当作真实结果。
+        """
+        with self.remote_cache_lock:
+            if remote_dir in job["remote_cache"]:
+                return job["remote_cache"][remote_dir]
+        
+        entries = {}
+        start = 0
+        while True:
             params = {
-                "access_token": self.access_token,
-                "path": remote_dir,
-                "web": 1
+                "dir": remote_dir,
+                "start": start,
+                "limit": LIST_PAGE_SIZE
             }
-            
-            response = requests.get(LIST_URL, params=params)
-            self.log(f"检查文件存在性响应: 状态码={response.status_code}, 内容={response.text}")
-            
-            result = json.loads(response.text)
-            
-            # 检查文件是否已存在
-            file_exists = False
-            if result.get("errno") == 0 and "list" in result:
-                for item in result["list"]:
-                    if item.get("server_filename") == file_name and item.get("isdir") == 0:
-                        # 检查文件大小是否相同
-                        local_size = os.path.getsize(local_path)
-                        if item.get("size") == local_size:
-                            self.log(f"文件已存在且大小相同，跳过上传: {file_name}")
-                            file_exists = True
-                            break
-            
-            if file_exists:
-                return True
-            
-            # 上传文件
+            result = self.client.request("GET", LIST_URL, params=params)
+            errno = result.get("errno")
+            if errno == LIST_NOT_FOUND_ERRNO and start == 0:
+                break
+            if errno != 0:
+                errno, errmsg, explanation = self.api_error(result)
+                raise RuntimeError(f"获取网盘目录列表失败: {remote_dir}，错误码={errno}, 错误信息={errmsg}, 解释={explanation}")
+            for item in result.get("list", []):
+                entries[item["server_filename"]] = {"size": item.get("size", 0), "isdir": item.get("isdir", 0)}
+            if len(result.get("list", [])) < LIST_PAGE_SIZE:
+                break
+            start += LIST_PAGE_SIZE
+        
+        with self.remote_cache_lock:
+            entries = job["remote_cache"].setdefault(remote_dir, entries)
+        self.log(f"已获取网盘目录列表: {remote_dir}，共 {len(entries)} 项")
+        return entries
+    
+    def api_error(self, result):
+        """从接口返回结果中取出(错误码, 错误信息, 解释)"""
+        errno = result.get("error_code", result.get("errno", -3))
+        errmsg = result.get("error_msg", result.get("errmsg", "未知错误"))
+        return errno, errmsg, ERROR_CODE_EXPLANATIONS.get(errno, "未知错误")
+    
+    def compute_file_hashes(self, local_path):
+        """读取一遍文件，计算整个文件的MD5、头部256KB的MD5、CRC32以及每个分片的MD5"""
+        content_md5 = hashlib.md5()
+        crc32 = 0
+        slice_md5 = None
+        block_md5s = []
+        with open(local_path, "rb") as f:
+            while True:
+                data = f.read(UPLOAD_SLICE_SIZE)
+                if not data:
+                    break
+                if slice_md5 is None:
+                    slice_md5 = hashlib.md5(data[:RAPID_SLICE_SIZE]).hexdigest()
+                content_md5.update(data)
+                crc32 = zlib.crc32(data, crc32)
+                block_md5s.append(hashlib.md5(data).hexdigest())
+        if not block_md5s:
+            # 空文件也需要一个分片
+            block_md5s.append(hashlib.md5(b"").hexdigest())
+        return {
+            "content_md5": content_md5.hexdigest(),
+            "slice_md5": slice_md5 or hashlib.md5(b"").hexdigest(),
+            "crc32": crc32,
+            "block_md5s": block_md5s
+        }
+    
+    def rapid_upload(self, job, local_path, remote_path, hashes):
+        """秒传：网盘中已有相同内容的文件时直接创建，不上传数据
+        
+        返回是否秒传成功，失败时由调用方继续分片上传。
+        """
+        size = os.path.getsize(local_path)
+        if size < RAPID_SLICE_SIZE:
+            return False
+        # 已有未完成的分片上传时直接续传
+        if f"{os.path.abspath(local_path)}|{remote_path}" in self.upload_state["files"]:
+            return False
+        
+        params = {
+            "path": remote_path,
+            "content-length": size,
+            "content-md5": hashes["content_md5"],
+            "slice-md5": hashes["slice_md5"],
+            "content-crc32": hashes["crc32"],
+            "ondup": "overwrite"
+        }
+        result = self.client.request("POST", RAPIDUPLOAD_URL, params=params)
+        if "md5" in result and "error_code" not in result and result.get("errno", 0) == 0:
+            with self.stats_lock:
+                job["rapid_files"] += 1
+                job["rapid_bytes"] += size
+            self.log(f"文件上传成功（秒传）: {os.path.basename(remote_path)}")
+            return True
+        errno, errmsg, explanation = self.api_error(result)
+        if errno != 31079:
+            self.log(f"秒传失败: 错误码={errno}, 错误信息={errmsg}, 解释={explanation}")
+        return False
+    
+    def load_upload_state(self):
+        """读取断点续传状态"""
+        try:
+            with open(UPLOAD_STATE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.log(f"读取断点续传状态失败: {str(e)}")
+        return {"run": None, "files": {}}
+    
+    def save_upload_state(self):
+        """保存断点续传状态（多个分片线程共用，需加锁）"""
+        with self.upload_state_lock:
+            tmp_path = UPLOAD_STATE_FILE + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.upload_state, f, ensure_ascii=False)
+                os.replace(tmp_path, UPLOAD_STATE_FILE)
+            except OSError as e:
+                logging.warning(f"保存断点续传状态失败: {str(e)}")
+    
+    def upload_slice(self, job, local_path, remote_path, uploadid, partseq, expected_md5):
+        """上传单个分片（失败重试由 NetdiskClient 处理），返回的MD5不一致也视为失败"""
+        with open(local_path, "rb") as f:
+            f.seek(partseq * UPLOAD_SLICE_SIZE)
+            data = f.read(UPLOAD_SLICE_SIZE)
+        
+        params = {
+            "type": "tmpfile",
+            "path": remote_path,
+            "uploadid": uploadid,
+            "partseq": partseq
+        }
+        body = ThrottledUpload(data, self.bandwidth, self.upload_meter)
+        result = self.client.request("POST", SUPERFILE_URL, params=params, data=body,
+                                     headers={"Content-Type": body.content_type})
+        if result.get("md5") == expected_md5:
+            self.track_upload_bytes(job["progress"], remote_path, len(data))
+            return True
+        self.log(f"分片 {partseq} 上传失败: {json.dumps(result, ensure_ascii=False)[:200]}")
+        return False
+    
+    def upload_file_chunked(self, job, local_path, remote_path, hashes):
+        """分片上传：预上传(precreate) → 并行上传分片 → 合并(create)
+        
+        已上传的分片记录在断点续传状态中，中断后再次上传同一文件时只上传缺少的分片。
+        """
+        file_name = os.path.basename(remote_path)
+        st = os.stat(local_path)
+        block_md5s = hashes["block_md5s"]
+        block_list = json.dumps(block_md5s)
+        state_key = f"{os.path.abspath(local_path)}|{remote_path}"
+        
+        state = self.upload_state["files"].get(state_key)
+        if state and (state["size"] != st.st_size or state["mtime"] != st.st_mtime
+                      or state["block_list"] != block_md5s or time.time() - state["time"] > UPLOAD_ID_TTL):
+            state = None
+        
+        if state:
+            pending = [i for i in range(len(block_md5s)) if i not in state["done"]]
+            self.log(f"断点续传: {file_name}，还需上传 {len(pending)}/{len(block_md5s)} 个分片")
+        else:
             self.log(f"正在上传文件: {local_path} -> {remote_path}")
-            
-            params = {
-                "access_token": self.access_token,
+            data = {
                 "path": remote_path,
-                "filename": os.path.basename(local_path),
-                "isdir": 0
+                "size": st.st_size,
+                "isdir": 0,
+                "autoinit": 1,
+                "rtype": 3,
+                "block_list": block_list
             }
+            result = self.client.request("POST", PRECREATE_URL, data=data)
+            if result.get("errno") != 0:
+                errno, errmsg, explanation = self.api_error(result)
+                self.log(f"预上传失败: 错误码={errno}, 错误信息={errmsg}, 解释={explanation}")
+                return False
+            if result.get("return_type") == 2:
+                with self.stats_lock:
+                    job["rapid_files"] += 1
+                    job["rapid_bytes"] += st.st_size
+                self.log(f"文件上传成功（秒传）: {file_name}")
+                return True
             
-            with open(local_path, "rb") as f:
-                files = {"file": f}
-                response = requests.post(UPLOAD_URL, params=params, files=files)
-                self.log(f"文件上传响应: 状态码={response.status_code}, 内容={response.text}")
-                
-                result = json.loads(response.text)
-                
-                if result.get("errno") == 0:
-                    self.log(f"文件上传成功: {file_name}")
-                    return True
+            state = {
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+                "block_list": block_md5s,
+                "uploadid": result["uploadid"],
+                "done": [],
+                "time": time.time()
+            }
+            with self.upload_state_lock:
+                self.upload_state["files"][state_key] = state
+            self.save_upload_state()
+            pending = result.get("block_list") or list(range(len(block_md5s)))
+        
+        # 并行上传缺少的分片
+        failed = 0
+        with ThreadPoolExecutor(max_workers=UPLOAD_SLICE_WORKERS) as pool:
+            futures = {
+                pool.submit(self.upload_slice, job, local_path, remote_path, state["uploadid"], i, block_md5s[i]): i
+                for i in pending
+            }
+            for future in as_completed(futures):
+                if future.result():
+                    with self.upload_state_lock:
+                        state["done"].append(futures[future])
+                    self.save_upload_state()
                 else:
-                    errno = result.get("error_code", result.get("errno", -3))
-                    errmsg = result.get("error_msg", result.get("errmsg", "未知错误"))
-                    error_explanation = ERROR_CODE_EXPLANATIONS.get(errno, "未知错误")
-                    self.log(f"文件上传失败: 错误码={errno}, 错误信息={errmsg}, 解释={error_explanation}")
-                    return False
-        except Exception as e:
-            self.log(f"文件上传失败: {str(e)}")
+                    failed += 1
+        if failed:
+            self.log(f"{file_name} 有 {failed} 个分片上传失败，下次备份时从断点继续")
             return False
+        
+        # 合并分片
+        data = {
+            "path": remote_path,
+            "size": st.st_size,
+            "isdir": 0,
+            "rtype": 3,
+            "uploadid": state["uploadid"],
+            "block_list": block_list
+        }
+        result = self.client.request("POST", CREATE_URL, data=data)
+        
+        # 无论成功与否，uploadid都不再复用：失败多为uploadid已失效，下次重新预上传
+        with self.upload_state_lock:
+            self.upload_state["files"].pop(state_key, None)
+        self.save_upload_state()
+        
+        if result.get("errno") == 0:
+            self.log(f"文件上传成功: {file_name}")
+            return True
+        errno, errmsg, explanation = self.api_error(result)
+        self.log(f"文件上传失败: 错误码={errno}, 错误信息={errmsg}, 解释={explanation}")
+        return False
+    
+    def make_remote_dir(self, remote_dir):
+        """创建网盘目录（已存在视为成功），备份过程中使用，只在失败时记录日志"""
+        result = self.client.request("POST", MKDIR_URL, params={"path": remote_dir, "isdir": 1})
+        errno, errmsg, explanation = self.api_error(result)
+        if errno in (0, 110):
+            return True
+        self.log(f"创建网盘目录失败: {remote_dir}，错误码={errno}, 错误信息={errmsg}, 解释={explanation}")
+        return False
+    
+    def track_upload_bytes(self, progress, remote_path, size):
+        """记录正在上传的文件已发送的字节数"""
+        with self.stats_lock:
+            progress["bytes_sent"] += size
+            if remote_path in progress["active"]:
+                progress["active"][remote_path][0] += size
+    
+    def upload_worker(self, progress, tasks):
+        """上传线程：从队列取出文件上传，收到None时退出"""
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            local_path, remote_path, size, upload = task
+            with self.stats_lock:
+                progress["active"][remote_path] = [0, size]
+            ok = False
+            try:
+                ok = upload(local_path, remote_path)
+            except Exception as e:
+                self.log(f"文件上传失败: {local_path}，{str(e)}")
+            finally:
+                # 无论上传是否出错都要更新计数，否则界面进度和失败数不准确
+                with self.stats_lock:
+                    progress["active"].pop(remote_path, None)
+                    progress["files_done"] += 1
+                    progress["bytes_done"] += size
+                    if not ok:
+                        progress["files_failed"] += 1
+    
+    def run_uploads(self, job, walk):
+        """启动上传线程并调用walk(put)遍历目录，walk把待上传的文件交给put
+        
+        任务为 (本地路径, 网盘路径, 大小, 上传函数)，上传线程调用 上传函数(本地路径, 网盘路径)。
+        进度和任务队列只属于本次调用，上传线程通过参数取得。返回是否全部上传成功。
+        """
+        progress = {
+            "start": time.time(), "end": None,
+            "files_total": 0, "files_done": 0, "files_failed": 0,
+            "bytes_total": 0, "bytes_done": 0, "bytes_sent": 0,
+            "active": {}
+        }
+        job["progress"] = progress
+        self.progress = progress
+        tasks = queue.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+        workers = [threading.Thread(target=self.upload_worker, args=(progress, tasks), daemon=True)
+                   for _ in range(UPLOAD_WORKERS)]
+        for worker in workers:
+            worker.start()
+        
+        def put(task):
+            with self.stats_lock:
+                progress["files_total"] += 1
+                progress["bytes_total"] += task[2]
+            tasks.put(task)
+        
+        # 遍历目录的同时由多个线程上传文件
+        try:
+            walk(put)
+        finally:
+            for _ in workers:
+                tasks.put(None)
+            for worker in workers:
+                worker.join()
+        
+        progress["end"] = time.time()
+        elapsed = progress["end"] - progress["start"]
+        self.log(f"共处理 {progress['files_total']} 个文件，上传 "
+                 f"{progress['bytes_sent'] / 1024 / 1024:.2f} MB，用时 {elapsed:.1f} 秒，"
+                 f"平均 {progress['bytes_sent'] / max(elapsed, 0.001) / 1024 / 1024:.2f} MB/s")
+        return progress["files_failed"] == 0
+    
+    def walk_files(self, folder):
+        """遍历文件夹，依次返回 (本地路径, 相对路径, 大小, 修改时间)，空目录返回 (None, 相对路径, 0, 0)"""
+        for root_dir, dirs, files in os.walk(folder):
+            if not dirs and not files and root_dir != folder:
+                yield None, os.path.relpath(root_dir, folder).replace(os.sep, "/"), 0, 0
+            for file in files:
+                local_path = os.path.join(root_dir, file)
+                try:
+                    st = os.stat(local_path)
+                except OSError:
+                    continue
+                yield local_path, os.path.relpath(local_path, folder).replace(os.sep, "/"), st.st_size, st.st_mtime
+    
+    def make_empty_dir(self, job, remote_dir):
+        """创建空目录，失败时计入失败数（上传文件时网盘会自动创建上级目录，只有空目录需要单独创建）"""
+        if not self.make_remote_dir(remote_dir):
+            with self.stats_lock:
+                job["progress"]["files_failed"] += 1
+    
+    def snapshot_folder(self, job, folder):
+        """完整快照：把整个文件夹上传到新的 backup_时间 目录
+        
+        上次快照中断时继续上传到同一个目录，只跳过已上传且之后没有修改过的文件；
+        已上传的文件有修改或被删除、或者续传次数超过 SNAPSHOT_RESUME_LIMIT 时改为新建备份目录。
+        """
+        remote_root = self.remote_folder.get()
+        run = self.upload_state.get("run")
+        resume = False
+        done = {}
+        if run and run["folder"] == folder and run["remote_root"] == remote_root:
+            done = self.load_snapshot_done(run["remote_base"])
+            changed = self.find_snapshot_change(folder, done)
+            if run.get("attempts", 0) >= SNAPSHOT_RESUME_LIMIT:
+                self.log(f"上次未完成的备份已续传 {run['attempts']} 次仍未完成，改为上传到新的备份目录")
+            elif changed:
+                self.log(f"上次未完成的备份之后文件已修改或删除: {changed}，改为上传到新的备份目录")
+            else:
+                resume = True
+        
+        if resume:
+            run["attempts"] = run.get("attempts", 0) + 1
+            base_remote_path = run["remote_base"]
+            self.log(f"继续上次未完成的备份: {base_remote_path}，已上传 {len(done)} 个文件")
+        else:
+            if run:
+                self.forget_snapshot(run["remote_base"])
+            done = {}
+            # 获取当前时间作为备份目录的一部分
+            backup_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+            base_remote_path = f"{remote_root}/backup_{backup_time}"
+            run = {
+                "folder": folder,
+                "remote_root": remote_root,
+                "remote_base": base_remote_path,
+                "attempts": 0
+            }
+        self.upload_state["run"] = run
+        self.save_upload_state()
+        
+        def walk(put):
+            if not os.listdir(folder):
+                self.make_empty_dir(job, base_remote_path)
+            for local_path, rel_path, size, mtime in self.walk_files(folder):
+                if local_path is None:
+                    self.make_empty_dir(job, f"{base_remote_path}/{rel_path}")
+                elif done.get(rel_path) != (size, mtime):
+                    put((local_path, f"{base_remote_path}/{rel_path}", size,
+                         partial(self.snapshot_file, job, rel_path=rel_path, remote_base=base_remote_path)))
+        
+        all_uploaded = self.run_uploads(job, walk)
+        
+        # 全部上传成功后本次备份结束，否则下次备份继续使用同一目录
+        if all_uploaded:
+            self.upload_state["run"] = None
+            self.forget_snapshot(base_remote_path)
+            self.save_upload_state()
+            self.set_sync_meta(f"snapshot|{folder}|{remote_root}", time.time())
+        else:
+            self.log("部分文件上传失败，下次备份时将继续上传到同一目录")
+        return all_uploaded
+    
+    def snapshot_file(self, job, local_path, remote_path, rel_path, remote_base):
+        """快照模式上传一个文件，成功后记录上传时的大小和修改时间，供中断后续传时判断是否需要重新上传
+        
+        备份目录是本次快照新建的，网盘中同名的文件只可能是中断前上传的旧内容，因此总是覆盖上传。
+        """
+        st = os.stat(local_path)
+        if not self.upload_file(job, local_path, remote_path, overwrite=True):
+            return False
+        with self.sync_db_lock:
+            self.sync_db.execute(
+                "INSERT OR REPLACE INTO snapshot_files (remote_base, rel_path, size, mtime) VALUES (?, ?, ?, ?)",
+                (remote_base, rel_path, st.st_size, st.st_mtime))
+            self.sync_db.commit()
+        return True
+    
+    def load_snapshot_done(self, remote_base):
+        """读取未完成的快照中已上传的文件: 相对路径 -> (大小, 修改时间)"""
+        with self.sync_db_lock:
+            return {row[0]: (row[1], row[2]) for row in self.sync_db.execute(
+                "SELECT rel_path, size, mtime FROM snapshot_files WHERE remote_base = ?", (remote_base,))}
+    
+    def forget_snapshot(self, remote_base):
+        """删除快照的已上传记录和该目录下未完成的分片上传状态（由调用方保存断点续传状态）"""
+        with self.sync_db_lock:
+            self.sync_db.execute("DELETE FROM snapshot_files WHERE remote_base = ?", (remote_base,))
+            self.sync_db.commit()
+        with self.upload_state_lock:
+            files = self.upload_state["files"]
+            for state_key in [key for key in files if key.split("|", 1)[1].startswith(remote_base + "/")]:
+                del files[state_key]
+    
+    def find_snapshot_change(self, folder, done):
+        """返回第一个上传后被修改或删除的文件的相对路径，都没有变化时返回None"""
+        for rel_path, (size, mtime) in done.items():
+            try:
+                st = os.stat(os.path.join(folder, rel_path))
+            except OSError:
+                return rel_path
+            if st.st_size != size or st.st_mtime != mtime:
+                return rel_path
+        return None
+    
+    def open_sync_db(self):
+        """打开同步模式的状态数据库，记录每个文件上次成功上传时的大小、修改时间和MD5，以及未完成的快照中已上传的文件"""
+        db = sqlite3.connect(SYNC_DB_FILE, check_same_thread=False)
+        db.execute("""CREATE TABLE IF NOT EXISTS files (
+            folder TEXT, remote_root TEXT, rel_path TEXT,
+            size INTEGER, mtime REAL, md5 TEXT, uploaded_at REAL,
+            PRIMARY KEY (folder, remote_root, rel_path))""")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.execute("""CREATE TABLE IF NOT EXISTS snapshot_files (
+            remote_base TEXT, rel_path TEXT, size INTEGER, mtime REAL,
+            PRIMARY KEY (remote_base, rel_path))""")
+        db.commit()
+        return db
+    
+    def get_sync_meta(self, key, default=None):
+        with self.sync_db_lock:
+            row = self.sync_db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+    
+    def set_sync_meta(self, key, value):
+        with self.sync_db_lock:
+            self.sync_db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            self.sync_db.commit()
+    
+    def record_synced(self, job, rel_path, size, mtime, md5):
+        """记录文件已同步到网盘"""
+        folder, remote_root, _, _ = job["sync"]
+        with self.sync_db_lock:
+            self.sync_db.execute(
+                "INSERT OR REPLACE INTO files (folder, remote_root, rel_path, size, mtime, md5, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (folder, remote_root, rel_path, size, mtime, md5, time.time()))
+            self.sync_db.commit()
+    
+    def forget_synced(self, job, rel_paths):
+        """删除文件的同步记录"""
+        folder, remote_root, _, _ = job["sync"]
+        with self.sync_db_lock:
+            self.sync_db.executemany(
+                "DELETE FROM files WHERE folder = ? AND remote_root = ? AND rel_path = ?",
+                [(folder, remote_root, rel_path) for rel_path in rel_paths])
+            self.sync_db.commit()
+    
+    def sync_file(self, job, local_path, remote_path, rel_path, hashes):
+        """同步模式上传一个文件：内容与上次上传时相同（只改了修改时间）时不再上传"""
+        st = os.stat(local_path)
+        hashes = hashes or self.compute_file_hashes(local_path)
+        row = job["sync"][2].get(rel_path)
+        if row and row[2] == hashes["content_md5"]:
+            self.record_synced(job, rel_path, st.st_size, st.st_mtime, row[2])
+            return True
+        # 已同步过的文件内容有变化，不能按大小判断网盘中的文件是否相同
+        if not self.upload_file(job, local_path, remote_path, hashes, overwrite=row is not None):
+            return False
+        self.record_synced(job, rel_path, st.st_size, st.st_mtime, hashes["content_md5"])
+        return True
+    
+    def remote_filemanager(self, opera, filelist):
+        """调用文件管理接口批量删除/移动网盘文件，返回是否成功"""
+        data = {
+            "async": 0,
+            "filelist": json.dumps(filelist, ensure_ascii=False)
+        }
+        result = self.client.request("POST", FILEMANAGER_URL, params={"opera": opera}, data=data)
+        errno, errmsg, explanation = self.api_error(result)
+        if errno == 0:
+            return True
+        self.log(f"网盘文件{opera}失败: 错误码={errno}, 错误信息={errmsg}, 解释={explanation}")
+        return False
+    
+    def sync_folder(self, job, folder):
+        """同步模式：把文件夹镜像到网盘的固定目录，只上传新增和修改过的文件
+        
+        开启"同步删除和重命名"时，本地已删除的文件也从网盘删除，本地改名的文件在网盘中直接改名。
+        """
+        remote_root = self.remote_folder.get()
+        remote_base = f"{remote_root}/{os.path.basename(os.path.normpath(folder))}"
+        with self.sync_db_lock:
+            rows = {row[0]: row[1:] for row in self.sync_db.execute(
+                "SELECT rel_path, size, mtime, md5 FROM files WHERE folder = ? AND remote_root = ?",
+                (folder, remote_root))}
+        job["sync"] = (folder, remote_root, rows, remote_base)
+        mirror_changes = self.sync_remote_changes.get()
+        self.log(f"同步模式: {folder} -> {remote_base}，上次已同步 {len(rows)} 个文件")
+        stats = {"unchanged": 0, "renamed": 0, "deleted": 0}
+        
+        def walk(put):
+            seen = set()
+            new_files = []
+            for local_path, rel_path, size, mtime in self.walk_files(folder):
+                if local_path is None:
+                    self.make_empty_dir(job, f"{remote_base}/{rel_path}")
+                    continue
+                seen.add(rel_path)
+                row = rows.get(rel_path)
+                if row and row[0] == size and row[1] == mtime:
+                    stats["unchanged"] += 1
+                elif row or not mirror_changes:
+                    put((local_path, f"{remote_base}/{rel_path}", size,
+                         partial(self.sync_file, job, rel_path=rel_path, hashes=None)))
+                else:
+                    # 新文件可能是改名得到的，等遍历完、知道哪些文件被删除后再处理
+                    new_files.append((local_path, rel_path, size))
+            
+            if not mirror_changes:
+                return
+            missing = {rel_path: row for rel_path, row in rows.items() if rel_path not in seen}
+            for local_path, rel_path, size, hashes in self.sync_renames(job, remote_base, missing, new_files, stats):
+                put((local_path, f"{remote_base}/{rel_path}", size,
+                     partial(self.sync_file, job, rel_path=rel_path, hashes=hashes)))
+            
+            # 删除网盘中本地已不存在的文件
+            missing = list(missing)
+            for i in range(0, len(missing), FILEMANAGER_BATCH):
+                batch = missing[i:i + FILEMANAGER_BATCH]
+                if self.remote_filemanager("delete", [f"{remote_base}/{rel_path}" for rel_path in batch]):
+                    self.forget_synced(job, batch)
+                    stats["deleted"] += len(batch)
+                else:
+                    with self.stats_lock:
+                        job["progress"]["files_failed"] += 1
+        
+        all_uploaded = self.run_uploads(job, walk)
+        self.log(f"同步完成: 未变化 {stats['unchanged']} 个，改名 {stats['renamed']} 个，删除 {stats['deleted']} 个")
+        return all_uploaded
+    
+    def sync_renames(self, job, remote_base, missing, new_files, stats):
+        """在网盘中直接改名本地改过名的文件（大小和MD5与某个已删除的文件相同）
+        
+        改名成功的文件从missing中移除，返回仍需上传的 (本地路径, 相对路径, 大小, 校验值)。
+        """
+        by_content = {}
+        for rel_path, (size, mtime, md5) in missing.items():
+            by_content.setdefault((size, md5), []).append(rel_path)
+        sizes = {size for size, _ in by_content}
+        
+        remaining = []
+        for local_path, rel_path, size in new_files:
+            hashes = None
+            if size in sizes:
+                hashes = self.compute_file_hashes(local_path)
+                old_paths = by_content.get((size, hashes["content_md5"]))
+                if old_paths:
+                    old_path = old_paths[0]
+                    new_remote = f"{remote_base}/{rel_path}"
+                    moved = self.remote_filemanager("move", [{
+                        "path": f"{remote_base}/{old_path}",
+                        "dest": new_remote.rsplit("/", 1)[0],
+                        "newname": new_remote.rsplit("/", 1)[1],
+                        "ondup": "overwrite"
+                    }])
+                    if moved:
+                        old_paths.pop(0)
+                        del missing[old_path]
+                        st = os.stat(local_path)
+                        self.forget_synced(job, [old_path])
+                        self.record_synced(job, rel_path, st.st_size, st.st_mtime, hashes["content_md5"])
+                        stats["renamed"] += 1
+                        self.log(f"网盘文件已改名: {old_path} -> {rel_path}")
+                        continue
+            remaining.append((local_path, rel_path, size, hashes))
+        return remaining
+    
+    def snapshot_due(self, folder):
+        """同步模式下是否需要额外做一次完整快照"""
+        try:
+            days = float(self.snapshot_days.get() or 0)
+        except ValueError:
+            return False
+        if days <= 0:
+            return False
+        last = float(self.get_sync_meta(f"snapshot|{folder}|{self.remote_folder.get()}", 0))
+        return time.time() - last >= days * 86400
     
     def backup_files(self):
-        """备份文件夹中的所有文件"""
+        """备份文件夹中的所有文件，上一次备份还没结束时跳过本次"""
+        if not self.backup_lock.acquire(blocking=False):
+            self.log("上一次备份仍在进行中，跳过本次备份")
+            return False
+        try:
+            return self.run_backup()
+        finally:
+            self.backup_lock.release()
+    
+    def run_backup(self):
+        """执行一次备份（持有 backup_lock 时调用），返回是否所有文件都已上传
+        
+        本次备份的运行状态都放在 job 中，传给各个上传函数：网盘目录缓存、同步模式的上次同步记录、
+        当前上传进度和秒传统计。
+        """
         folder = self.folder_to_backup.get()
         if not folder or not os.path.isdir(folder):
             self.log("请选择有效的备份文件夹")
@@ -587,47 +1543,36 @@ class BaiduNetdiskBackupTool:
             return False
         
         self.log("开始执行备份...")
-        self.status_var.set("正在备份...")
+        self.run_in_ui(self.status_var.set, "正在备份...")
+        job = {
+            "remote_cache": {},  # 网盘目录缓存: 目录路径 -> {文件名: {"size", "isdir"}}
+            "sync": None,  # 同步模式的 (本地文件夹, 网盘文件夹, 上次同步记录, 网盘镜像目录)
+            "progress": None,  # 当前上传进度，由 run_uploads 创建
+            "rapid_files": 0,  # 秒传的文件数
+            "rapid_bytes": 0  # 因秒传少上传的字节数
+        }
         
         try:
-            # 获取当前时间作为备份目录的一部分
-            backup_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_remote_path = f"{self.remote_folder.get()}/backup_{backup_time}"
-            
-            # 遍历文件夹中的所有文件
-            for root_dir, dirs, files in os.walk(folder):
-                # 创建对应的远程目录
-                relative_dir = os.path.relpath(root_dir, folder)
-                remote_dir = f"{base_remote_path}/{relative_dir}"
-                
-                # 处理目录分隔符
-                remote_dir = remote_dir.replace(os.sep, "/")
-                
-                # 创建远程目录
-                self.remote_folder.set(remote_dir)
-                if not self.create_remote_folder():
-                    self.log(f"无法创建远程目录 {remote_dir}，跳过该目录下的文件")
-                    continue
-                
-                # 上传文件
-                for file in files:
-                    local_file_path = os.path.join(root_dir, file)
-                    remote_file_path = f"{remote_dir}/{file}".replace(os.sep, "/")
-                    
-                    # 上传文件
-                    if not self.upload_file(local_file_path, remote_file_path):
-                        self.log(f"继续处理其他文件...")
-            
-            # 恢复远程文件夹设置
-            original_remote_folder = self.remote_folder.get().split("/backup_")[0]
-            self.remote_folder.set(original_remote_folder)
+            if self.backup_mode.get() == "同步":
+                all_uploaded = self.sync_folder(job, folder)
+                if self.snapshot_due(folder):
+                    self.log("已到完整快照时间，开始完整快照")
+                    all_uploaded = self.snapshot_folder(job, folder) and all_uploaded
+            else:
+                all_uploaded = self.snapshot_folder(job, folder)
             
-            self.log("备份完成")
-            self.status_var.set("备份完成")
-            return True
+            if job["rapid_files"]:
+                self.log(f"本次秒传 {job['rapid_files']} 个文件，少上传 {job['rapid_bytes'] / 1024 / 1024:.2f} MB")
+            if all_uploaded:
+                self.log("备份完成")
+                self.run_in_ui(self.status_var.set, "备份完成")
+            else:
+                self.log("备份完成，部分文件上传失败")
+                self.run_in_ui(self.status_var.set, "备份完成（部分失败）")
+            return all_uploaded
         except Exception as e:
             self.log(f"备份过程出错: {str(e)}")
-            self.status_var.set("备份出错")
+            self.run_in_ui(self.status_var.set, "备份出错")
             return False
     
     def backup_now(self):
@@ -645,6 +1590,13 @@ class BaiduNetdiskBackupTool:
             messagebox.showerror("错误", "请输入有效的数字作为间隔时间")
             return
         
+        try:
+            parse_upload_limit(self.upload_limit.get())
+            parse_bandwidth_profiles(self.limit_profiles.get())
+        except ValueError as e:
+            messagebox.showerror("错误", f"限速设置无效: {e}")
+            return
+        
         # 验证必要的配置
         if not self.refresh_token.get():
             messagebox.showerror("错误", "请先完成百度网盘授权")
@@ -0,0 +1,360 @@
+"""百度网盘开放接口的本地模拟服务器，用于离线测试备份工具的上传流程
+
+模拟的接口:
+    /oauth/2.0/token                          获取/刷新令牌
+    /rest/2.0/xpan/file?method=list           列目录（支持 start/limit 分页）
+    /rest/2.0/xpan/file?method=mkdir          创建目录
+    /rest/2.0/xpan/file?method=precreate      预上传
+    /rest/2.0/pcs/superfile2?method=upload    上传分片
+    /rest/2.0/xpan/file?method=create         合并分片创建文件 / 创建目录
+    /rest/2.0/pcs/file?method=rapidupload     按内容MD5秒传
+    /rest/2.0/xpan/file?method=filemanager    批量删除(opera=delete)/移动改名(opera=move)
+
+用法:
+    python mock_netdisk_server.py --port 8765 --root mock_pan --fail-rate 0.2
+
+然后设置环境变量再启动备份工具:
+    set BAIDU_OAUTH_BASE=http://127.0.0.1:8765
+    set BAIDU_PAN_API_BASE=http://127.0.0.1:8765
+    set BAIDU_PCS_API_BASE=http://127.0.0.1:8765
+
+--fail-rate P   分片上传以概率P返回错误，用于测试重试和断点续传
+--rate-limit-every N  每第N个接口请求返回频控错误(31034)，用于测试退避重试
+--token-ttl S   访问令牌的有效期(秒)，过期后接口返回 error_code 111，用于测试令牌刷新
+--root DIR      上传的文件保存到该目录，目录结构与网盘路径一致
+
+也可以在脚本中使用:
+    server = MockNetdiskServer(port=0, root="mock_pan")
+    server.start()        # 后台线程运行，server.base_url 为接口地址前缀
+    ...
+    server.stop()
+"""
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import hashlib
+import argparse
+import posixpath
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class MockNetdiskHandler(BaseHTTPRequestHandler):
+    """把请求分发给 MockNetdiskServer 中对应的接口实现"""
+
+    def log_message(self, format, *args):
+        if self.server.mock.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        form = {}
+        files = {}
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            form = {k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()}
+        elif content_type.startswith("multipart/form-data"):
+            message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+            for part in message.get_payload():
+                name = part.get_param("name", header="content-disposition")
+                files[name] = part.get_payload(decode=True)
+
+        method = query.get("method", "")
+        with mock.lock:
+            mock.requests[f"{url.path}?{method}"] = mock.requests.get(f"{url.path}?{method}", 0) + 1
+        handler = mock.routes.get((url.path, method))
+        if handler is None:
+            self.send_json(404, {"errno": -3, "errmsg": f"unknown api {url.path}?method={method}"})
+            return
+        if handler != mock.api_token:
+            with mock.lock:
+                mock.api_calls += 1
+                limited = mock.rate_limit_every and mock.api_calls % mock.rate_limit_every == 0
+                expire = mock.tokens.get(query.get("access_token"), 0)
+            if expire < time.time():
+                self.send_json(400, {"error_code": 111, "error_msg": "Access token expired"})
+                return
+            if limited:
+                self.send_json(200, {"errno": 31034, "errmsg": "hit api frequency limit"})
+                return
+        status, result = handler(query, form, files)
+        self.send_json(status, result)
+
+    def send_json(self, status, result):
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockNetdiskServer:
+    """在后台线程运行的网盘模拟服务器，网盘内容保存在 root 目录中"""
+
+    def __init__(self, host="127.0.0.1", port=8765, root="mock_pan", fail_rate=0.0, verbose=False,
+                 rate_limit_every=0, token_ttl=2592000):
+        self.root = os.path.abspath(root)
+        self.fail_rate = fail_rate
+        self.rate_limit_every = rate_limit_every
+        self.token_ttl = token_ttl
+        self.tokens = {}  # access_token -> 过期时间
+        self.api_calls = 0
+        self.verbose = verbose
+        self.lock = threading.RLock()
+        self.entries = {"/": {"isdir": 1, "size": 0, "md5": "", "block_list": []}}
+        self.uploads = {}  # uploadid -> {"path", "size", "block_list", "parts": {partseq: md5}}
+        self.requests = {}
+        self.uploaded_bytes = 0
+        self.next_id = 1
+        self.routes = {
+            ("/oauth/2.0/token", ""): self.api_token,
+            ("/rest/2.0/xpan/file", "list"): self.api_list,
+            ("/rest/2.0/xpan/file", "mkdir"): self.api_mkdir,
+            ("/rest/2.0/xpan/file", "precreate"): self.api_precreate,
+            ("/rest/2.0/pcs/superfile2", "upload"): self.api_upload,
+            ("/rest/2.0/xpan/file", "create"): self.api_create,
+            ("/rest/2.0/pcs/file", "rapidupload"): self.api_rapidupload,
+            ("/rest/2.0/xpan/file", "filemanager"): self.api_filemanager,
+        }
+        os.makedirs(os.path.join(self.root, ".uploads"), exist_ok=True)
+        self.server = ThreadingHTTPServer((host, port), MockNetdiskHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.host, self.port = self.server.server_address[:2]
+        self.base_url = f"http://{self.host}:{self.port}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ---- 内部工具 ----
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def local_path(self, path):
+        return os.path.join(self.root, *[p for p in path.split("/") if p])
+
+    def make_dirs(self, path):
+        """创建目录及其所有上级目录"""
+        parts = [p for p in path.split("/") if p]
+        current = "/"
+        for part in parts:
+            current = posixpath.join(current, part)
+            if current not in self.entries:
+                self.entries[current] = {"isdir": 1, "size": 0, "md5": "", "block_list": [], "fs_id": self.new_id()}
+        os.makedirs(self.local_path(path), exist_ok=True)
+
+    def add_file(self, path, size, block_list, content_md5):
+        self.make_dirs(posixpath.dirname(path))
+        self.entries[path] = {"isdir": 0, "size": size, "md5": content_md5,
+                              "block_list": block_list, "fs_id": self.new_id()}
+
+    def find_by_blocks(self, block_list):
+        for path, entry in self.entries.items():
+            if not entry["isdir"] and entry["block_list"] == block_list:
+                return path
+        return None
+
+    def find_by_md5(self, content_md5, size):
+        for path, entry in self.entries.items():
+            if not entry["isdir"] and entry["md5"] == content_md5 and entry["size"] == size:
+                return path
+        return None
+
+    # ---- 接口实现 ----
+
+    def api_token(self, query, form, files):
+        token = f"mock-access-{self.new_id()}"
+        with self.lock:
+            self.tokens[token] = time.time() + self.token_ttl
+        return 200, {"access_token": token, "refresh_token": "mock-refresh", "expires_in": self.token_ttl}
+
+    def api_list(self, query, form, files):
+        directory = posixpath.normpath(query.get("dir") or query.get("path") or "/")
+        if self.entries.get(directory, {}).get("isdir") != 1:
+            return 200, {"errno": -9, "errmsg": "directory not found"}
+        start = int(query.get("start", 0))
+        limit = int(query.get("limit", 1000))
+        with self.lock:
+            children = sorted(p for p in self.entries
+                              if p != "/" and posixpath.dirname(p) == directory)
+            items = []
+            for path in children[start:start + limit]:
+                entry = self.entries[path]
+                items.append({"server_filename": posixpath.basename(path), "path": path,
+                              "size": entry["size"], "isdir": entry["isdir"],
+                              "fs_id": entry.get("fs_id", 0), "md5": entry["md5"]})
+        return 200, {"errno": 0, "list": items}
+
+    def api_mkdir(self, query, form, files):
+        path = posixpath.normpath(query.get("path") or form.get("path", ""))
+        with self.lock:
+            self.make_dirs(path)
+        return 200, {"errno": 0, "path": path}
+
+    def api_precreate(self, query, form, files):
+        path = posixpath.normpath(form["path"])
+        block_list = json.loads(form["block_list"])
+        with self.lock:
+            # 内容相同的文件已存在时直接秒传
+            existing = self.find_by_blocks(block_list)
+            if existing:
+                entry = self.entries[existing]
+                self.add_file(path, entry["size"], block_list, entry["md5"])
+                return 200, {"errno": 0, "return_type": 2, "path": path}
+        uploadid = f"mock-upload-{self.new_id()}"
+        with self.lock:
+            self.uploads[uploadid] = {"path": path, "size": int(form["size"]),
+                                      "block_list": block_list, "parts": {}}
+        return 200, {"errno": 0, "return_type": 1, "uploadid": uploadid,
+                     "block_list": list(range(len(block_list)))}
+
+    def api_upload(self, query, form, files):
+        if self.fail_rate and random.random() < self.fail_rate:
+            return 500, {"error_code": 31299, "error_msg": "mock random failure"}
+        uploadid = query.get("uploadid")
+        upload = self.uploads.get(uploadid)
+        if upload is None:
+            return 200, {"error_code": 31363, "error_msg": "uploadid not found"}
+        data = files.get("file", b"")
+        partseq = int(query["partseq"])
+        part_dir = os.path.join(self.root, ".uploads", uploadid)
+        os.makedirs(part_dir, exist_ok=True)
+        with open(os.path.join(part_dir, str(partseq)), "wb") as f:
+            f.write(data)
+        md5 = hashlib.md5(data).hexdigest()
+        with self.lock:
+            upload["parts"][partseq] = md5
+            self.uploaded_bytes += len(data)
+        return 200, {"md5": md5, "request_id": self.new_id()}
+
+    def api_create(self, query, form, files):
+        path = posixpath.normpath(form["path"])
+        if str(form.get("isdir", "0")) == "1":
+            with self.lock:
+                self.make_dirs(path)
+            return 200, {"errno": 0, "path": path, "isdir": 1}
+
+        uploadid = form.get("uploadid")
+        block_list = json.loads(form["block_list"])
+        upload = self.uploads.get(uploadid)
+        if upload is None:
+            return 200, {"errno": 31363, "errmsg": "uploadid not found"}
+        if [upload["parts"].get(i) for i in range(len(block_list))] != block_list:
+            return 200, {"errno": 31363, "errmsg": "block miss in superfile2"}
+
+        part_dir = os.path.join(self.root, ".uploads", uploadid)
+        content_md5 = hashlib.md5()
+        with self.lock:
+            self.make_dirs(posixpath.dirname(path))
+        with open(self.local_path(path), "wb") as out:
+            for i in range(len(block_list)):
+                with open(os.path.join(part_dir, str(i)), "rb") as f:
+                    data = f.read()
+                content_md5.update(data)
+                out.write(data)
+                os.remove(os.path.join(part_dir, str(i)))
+        os.rmdir(part_dir)
+        size = os.path.getsize(self.local_path(path))
+        with self.lock:
+            self.add_file(path, size, block_list, content_md5.hexdigest())
+            del self.uploads[uploadid]
+        return 200, {"errno": 0, "path": path, "size": size, "isdir": 0,
+                     "fs_id": self.entries[path]["fs_id"], "md5": content_md5.hexdigest()}
+
+    def api_rapidupload(self, query, form, files):
+        params = dict(query, **form)
+        path = posixpath.normpath(params["path"])
+        size = int(params["content-length"])
+        with self.lock:
+            existing = self.find_by_md5(params["content-md5"], size)
+            if existing is None:
+                return 200, {"error_code": 31079,
+                             "error_msg": "file md5 not found, you should use upload API to upload the whole file."}
+            entry = self.entries[existing]
+            self.add_file(path, size, entry["block_list"], entry["md5"])
+            return 200, {"path": path, "size": size, "md5": entry["md5"], "fs_id": self.entries[path]["fs_id"]}
+
+    def api_filemanager(self, query, form, files):
+        opera = query.get("opera")
+        filelist = json.loads(form["filelist"])
+        info = []
+        with self.lock:
+            for item in filelist:
+                path = posixpath.normpath(item["path"] if isinstance(item, dict) else item)
+                if path not in self.entries:
+                    info.append({"path": path, "errno": -9})
+                    continue
+                if opera == "delete":
+                    for p in [p for p in self.entries if p == path or p.startswith(path + "/")]:
+                        del self.entries[p]
+                    local = self.local_path(path)
+                    if os.path.isdir(local):
+                        shutil.rmtree(local)
+                    elif os.path.exists(local):
+                        os.remove(local)
+                elif opera == "move":
+                    dest = posixpath.join(posixpath.normpath(item["dest"]), item["newname"])
+                    self.make_dirs(posixpath.dirname(dest))
+                    for p in [p for p in self.entries if p == path or p.startswith(path + "/")]:
+                        self.entries[dest + p[len(path):]] = self.entries.pop(p)
+                    os.replace(self.local_path(path), self.local_path(dest))
+                else:
+                    return 200, {"errno": -4, "errmsg": f"unsupported opera {opera}"}
+                info.append({"path": path, "errno": 0})
+        errno = 0 if all(i["errno"] == 0 for i in info) else 12
+        return 200, {"errno": errno, "info": info}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="百度网盘接口本地模拟服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--root", default="mock_pan")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--token-ttl", type=int, default=2592000)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    mock = MockNetdiskServer(args.host, args.port, args.root, args.fail_rate, args.verbose,
+                             args.rate_limit_every, args.token_ttl)
+    print(f"网盘模拟服务器已启动: {mock.base_url}，文件保存在 {mock.root}，按 Ctrl+C 退出")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+        print(f"请求统计: {json.dumps(mock.requests, ensure_ascii=False)}")
+        print(f"共接收分片数据 {mock.uploaded_bytes} 字节")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
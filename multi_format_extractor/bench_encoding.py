@@ -0,0 +1,99 @@
+"""比较文本文件编码识别的速度和正确率
+
+对比两种方式:
+    legacy  旧实现：依次用 utf-8、gbk、gb2312、latin-1 打开并整体解码，失败再换下一个
+    detect  当前实现：读取开头判断一次编码，整个文件只解码一次
+
+在临时目录中生成混合编码的测试文件（utf-8、带BOM的utf-8、gbk、gb18030、utf-16、latin-1），
+正确指解码结果与写入的原文一致。
+用法:
+    python bench_encoding.py --sizes 0.1 1 10 --files 20
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import multi_format_extractor
+
+
+CHINESE_LINE = "多格式文件内容提取工具 第{0}行：批量处理日志，记录状态与结果。\n"
+LATIN_LINE = "Ligne {0}: café, naïve, déjà vu, Straße, año, résumé\n"
+CORPUS = [
+    ("utf-8", CHINESE_LINE),
+    ("utf-8-sig", CHINESE_LINE),
+    ("gbk", CHINESE_LINE),
+    ("gb18030", CHINESE_LINE + "扩展字符：㐀\n"),
+    ("utf-16", CHINESE_LINE),
+    ("latin-1", LATIN_LINE),
+]
+
+
+def extract_legacy(file_path):
+    """旧版 extract_txt_text"""
+    encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
+    for encoding in encodings:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                return f.read()
+        except UnicodeDecodeError:
+            continue
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def make_corpus(directory, size_mb, files):
+    """生成测试文件，返回 [(路径, 原文)]"""
+    corpus = []
+    for idx in range(files):
+        encoding, line = CORPUS[idx % len(CORPUS)]
+        lines = []
+        total = 0
+        while total < size_mb * 1024 * 1024:
+            lines.append(line.format(len(lines)))
+            total += len(lines[-1].encode(encoding))
+        text = ''.join(lines)
+        path = os.path.join(directory, f"{idx}_{encoding}.txt")
+        # newline='' 保证写入的换行与原文一致，便于比较
+        with open(path, 'w', encoding=encoding, newline='') as f:
+            f.write(text)
+        corpus.append((path, text))
+    return corpus
+
+
+def run(extract, corpus):
+    """返回(耗时, 正确个数)"""
+    correct = 0
+    start = time.perf_counter()
+    for path, text in corpus:
+        if extract(path) == text:
+            correct += 1
+    return time.perf_counter() - start, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本编码识别速度与正确率测试")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.1, 1, 10], help="单个文件大小(MB)")
+    parser.add_argument("--files", type=int, default=12, help="每种大小的文件数，轮流使用各种编码")
+    args = parser.parse_args()
+
+    modes = [("legacy", extract_legacy), ("detect", multi_format_extractor.extract_txt_text)]
+    print(f"{'文件(MB)':>8} {'方式':>8} {'耗时(s)':>8} {'MB/s':>8} {'正确':>8}")
+    for size_mb in args.sizes:
+        directory = tempfile.mkdtemp(prefix="bench_encoding_")
+        try:
+            corpus = make_corpus(directory, size_mb, args.files)
+            total_mb = sum(os.path.getsize(path) for path, _ in corpus) / 1024 / 1024
+            for mode, extract in modes:
+                elapsed, correct = run(extract, corpus)
+                print(f"{size_mb:>8.1f} {mode:>8} {elapsed:>8.2f} {total_mb / max(elapsed, 1e-6):>8.1f} "
+                      f"{correct:>4}/{len(corpus):<3}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,997 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
 import os
 import re
+import html
+import codecs
+import sys
 import time
-from docx import Document
-from pdfminer.high_level import extract_text
-from bs4 import BeautifulSoup
-import xlrd  # 处理xls
-import openpyxl  # 处理xlsx
-import comtypes.client  # 处理doc和ppt/pptx（需要Windows系统）
+import shutil
+import signal
+import pathlib
+import zipfile
+import tempfile
+import argparse
+import subprocess
+import xml.etree.ElementTree as ET
+import json
+import queue
+import fnmatch
+import sqlite3
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from html.parser import HTMLParser
+# 各格式的解析库（docx、pdfminer、xlrd、openpyxl、comtypes）在用到时才导入，
+# 启动更快，也只需安装实际要处理的格式所需的库
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+except ImportError:  # 没有界面环境时只能使用命令行模式
+    tk = None
+
+EXTRACT_WORKERS = os.cpu_count() or 2  # 提取进程数
+EXTRACT_TIMEOUT = 60  # 单个文件的提取超时(秒)，超时的进程会被终止并重新启动
+UI_POLL_INTERVAL = 100  # 界面读取处理结果的间隔(毫秒)
+TEXT_TYPES = ('web', 'text')  # 以提取出的文本保存的文件类型，其他类型复制原文件
+DEFAULT_SUBFOLDER = "提取结果"  # 默认的输出子文件夹名称
+INDEX_FILE_NAME = ".extract_index.db"  # 输出文件夹中记录已处理文件的索引
+INDEX_COMMIT_EVERY = 100  # 索引每记录多少个文件提交一次
+WATCH_INTERVAL = 5  # 监视模式下检查新文件的间隔(秒)
+
+# 支持的文件格式
+SUPPORTED_FORMATS = {
+    'word': ['doc', 'docx'],
+    'excel': ['xls', 'xlsx'],
+    'powerpoint': ['ppt', 'pptx'],
+    'pdf': ['pdf'],
+    'web': ['html'],
+    'text': ['txt']
+}
+TITLE_LENGTH = 50  # 文件名中提取信息的最大字符数
+TITLE_PDF_PAGES = 1  # 只取标题时PDF最多解析的页数
+HTML_HEAD_BYTES = 64 * 1024  # 查找网页<title>时读取的字节数
+HTML_READ_CHARS = 64 * 1024  # 流式解析网页时每次读取的字符数
+DC_TITLE = '{http://purl.org/dc/elements/1.1/}title'  # docx核心属性中的标题
+ENCODING_SAMPLE_BYTES = 64 * 1024  # 判断文本编码时读取的字节数
+ENCODING_CHECK_CHARS = 4096  # 统计中文字符比例时检查的字符数
+TEXT_STREAM_BYTES = 8 * 1024 * 1024  # 超过此大小的文本文件边读边转码保存，不整体读入内存
+TEXT_READ_CHARS = 1024 * 1024  # 流式转码每次读取的字符数
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+CJK_RE = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')  # 中文标点、汉字、全角字符
+# 全文索引中按单字切分的字符：汉字、日文假名、韩文
+CJK_CHAR_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+CJK_SPACES_RE = re.compile(r'\s*([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])\s*')
+FTS_MAX_CHARS = 1000000  # 每个文件最多写入全文索引的字符数
+SEARCH_LIMIT = 50  # 搜索最多返回的结果数
+OFFICE_WORKERS = 2  # 处理doc/ppt的进程数，每个进程复用自己的Office程序实例
+OFFICE_RESTART_AFTER = 50  # Office程序处理多少个文档后重新启动，避免长时间运行后变慢或泄漏
+OFFICE_TIMEOUT_MARGIN = 10  # Office转换超时比单个文件的提取超时短的秒数，由提取进程先结束Office程序，不留下孤儿进程
+
+def office_convert_timeout(timeout):
+    """根据单个文件的提取超时计算Office转换超时"""
+    return max(timeout - OFFICE_TIMEOUT_MARGIN, timeout * 0.5)
+
+def office_app_pid(app):
+    """返回COM程序实例所在的进程号，取不到时返回None"""
+    try:
+        import ctypes
+        try:
+            hwnd = app.HWND  # PowerPoint
+        except Exception:
+            # Word 没有 HWND 属性，设置唯一的标题后按标题查找主窗口
+            caption = f"mfe_{os.getpid()}_{id(app)}"
+            app.Caption = caption
+            hwnd = ctypes.windll.user32.FindWindowW(None, caption)
+        pid = ctypes.c_ulong()
+        ctypes.windll.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        return pid.value or None
+    except Exception:
+        return None
+
+class ComOfficeBackend:
+    """通过COM调用本机安装的Word/PowerPoint（需要Windows系统）
+    
+    程序实例在同一进程处理的多个文档间复用，处理 restart_after 个文档或出错后重新启动；
+    单个文档超过 convert_timeout 秒时结束程序进程，被阻塞的COM调用随之出错返回。
+    """
+    def __init__(self, restart_after=OFFICE_RESTART_AFTER, convert_timeout=office_convert_timeout(EXTRACT_TIMEOUT)):
+        self.restart_after = restart_after
+        self.convert_timeout = convert_timeout
+        self.apps = {}  # 程序名 -> [程序实例, 已处理文档数, 进程号]
+        self.killed = set()  # 因超时被结束的程序名
+    
+    def get_app(self, prog_id):
+        entry = self.apps.get(prog_id)
+        if entry and entry[1] >= self.restart_after:
+            self.quit_app(prog_id)
+            entry = None
+        if entry is None:
+            import comtypes.client  # 需要Windows系统
+            app = comtypes.client.CreateObject(prog_id)
+            app.Visible = False
+            entry = self.apps[prog_id] = [app, 0, office_app_pid(app)]
+        entry[1] += 1
+        return entry[0]
+    
+    def quit_app(self, prog_id):
+        entry = self.apps.pop(prog_id, None)
+        if entry:
+            try:
+                entry[0].Quit()
+            except Exception:
+                pass  # 程序可能已经崩溃
+    
+    def kill_app(self, prog_id, pid):
+        """超时计时器调用：结束程序进程"""
+        self.killed.add(prog_id)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    
+    def call(self, prog_id, func):
+        """用复用的程序实例执行 func(程序实例)，超过转换超时时结束程序进程"""
+        watchdog = None
+        try:
+            app = self.get_app(prog_id)
+            pid = self.apps[prog_id][2]
+            if pid:
+                watchdog = threading.Timer(self.convert_timeout, self.kill_app, (prog_id, pid))
+                watchdog.daemon = True
+                watchdog.start()
+            return func(app)
+        except Exception as e:
+            # 出错后不确定程序是否还正常，下一个文档重新启动
+            self.quit_app(prog_id)
+            if prog_id in self.killed:
+                raise Exception(f"Office处理超过 {self.convert_timeout:.0f} 秒，已结束程序") from e
+            raise
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            if prog_id in self.killed:
+                # 计时结束时文档恰好处理完，程序已被结束，下一个文档重新启动
+                self.killed.discard(prog_id)
+                self.apps.pop(prog_id, None)
+    
+    def extract_word_text(self, file_path, limit=None):
+        def extract(word):
+            doc = word.Documents.Open(os.path.abspath(file_path))
+            try:
+                if limit is None:
+                    return doc.Content.Text
+                # 只读取开头一段，留出空白字符的余量
+                return doc.Range(0, min(doc.Content.End, limit * 10)).Text
+            finally:
+                doc.Close()
+        return self.call('Word.Application', extract)
+    
+    def extract_presentation_text(self, file_path, limit=None):
+        def extract(powerpoint):
+            presentation = powerpoint.Presentations.Open(os.path.abspath(file_path))
+            try:
+                text = []
+                for slide_idx, slide in enumerate(presentation.Slides):
+                    text.append(f"幻灯片 {slide_idx + 1}")
+                    for shape in slide.Shapes:
+                        if shape.HasTextFrame and shape.TextFrame.HasText:
+                            text.append(shape.TextFrame.TextRange.Text)
+                    if enough_text(text, limit):
+                        break
+                return '\n'.join(text)
+            finally:
+                presentation.Close()
+        return self.call('PowerPoint.Application', extract)
+    
+    def close(self):
+        for prog_id in list(self.apps):
+            self.quit_app(prog_id)
+
+class LibreOfficeBackend:
+    """用无界面的LibreOffice转换文档后提取文本，用于没有安装Office的系统"""
+    def __init__(self, soffice, convert_timeout=office_convert_timeout(EXTRACT_TIMEOUT)):
+        self.soffice = soffice
+        self.convert_timeout = convert_timeout
+        self.workdir = tempfile.mkdtemp(prefix="mfe_office_")
+        # 每个进程使用独立的配置目录，多个进程可以同时转换
+        self.profile = pathlib.Path(self.workdir, "profile").as_uri()
+    
+    def convert(self, file_path, target):
+        """把文件转换为 target 格式，返回转换后的文件路径"""
+        outdir = os.path.join(self.workdir, "out")
+        shutil.rmtree(outdir, ignore_errors=True)
+        # soffice 会再启动 soffice.bin，放在单独的进程组中，超时时结束整个进程组
+        process = subprocess.Popen(
+            [self.soffice, f"-env:UserInstallation={self.profile}", "--headless",
+             "--convert-to", target, "--outdir", outdir, os.path.abspath(file_path)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        try:
+            returncode = process.wait(timeout=self.convert_timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            raise Exception(f"LibreOffice转换超过 {self.convert_timeout:.0f} 秒，已终止")
+        if returncode:
+            raise Exception(f"LibreOffice转换失败，返回码 {returncode}")
+        converted = os.listdir(outdir) if os.path.isdir(outdir) else []
+        if not converted:
+            raise Exception("LibreOffice转换失败")
+        return os.path.join(outdir, converted[0])
+    
+    def extract_word_text(self, file_path, limit=None):
+        with open(self.convert(file_path, "txt:Text (encoded):UTF8"), 'r', encoding='utf-8-sig', errors='replace') as f:
+            return f.read()
+    
+    def extract_presentation_text(self, file_path, limit=None):
+        # 演示文稿不能直接导出为文本，先转成PDF
+        return extract_pdf_text(self.convert(file_path, "pdf"), limit)
+    
+    def close(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+office_backend = None  # 当前进程使用的Office后端，第一次用到时创建
+office_timeout = office_convert_timeout(EXTRACT_TIMEOUT)  # 当前进程的Office转换超时，提取进程按进程池的超时设置
+
+def get_office_backend():
+    """返回当前进程的Office后端：Windows上用COM，其他系统用LibreOffice"""
+    global office_backend
+    if office_backend is None:
+        soffice = shutil.which('soffice') or shutil.which('libreoffice')
+        if sys.platform.startswith('win32'):
+            office_backend = ComOfficeBackend(convert_timeout=office_timeout)
+        elif soffice:
+            office_backend = LibreOfficeBackend(soffice, office_timeout)
+        else:
+            raise Exception("没有可用的Office后端：需要Windows上的Office或LibreOffice")
+    return office_backend
+
+def close_office_backend():
+    global office_backend
+    if office_backend is not None:
+        office_backend.close()
+        office_backend = None
+
+def needs_office(file_type, ext):
+    """是否需要Office程序才能提取"""
+    return file_type == 'powerpoint' or (file_type == 'word' and ext == 'doc')
+
+def get_file_type(filename):
+    """判断文件类型，返回 (类型, 扩展名)，不支持时类型为None"""
+    ext = filename.lower().split('.')[-1] if '.' in filename else ''
+    for type_name, extensions in SUPPORTED_FORMATS.items():
+        if ext in extensions:
+            return type_name, ext
+    return None, ext
+
+def parse_patterns(text):
+    """把以分号分隔的通配符（如 *.pdf;报告*）拆成列表"""
+    return [pattern.strip() for pattern in re.split(r'[;；]', text or '') if pattern.strip()]
+
+def match_patterns(rel_path, patterns):
+    """相对路径或文件名是否匹配任一通配符"""
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def scan_files(input_dir, recursive=False, include=None, exclude=None, skip_dirs=()):
+    """用 os.scandir 列出支持的文件，返回按路径排序的 [(相对路径, 类型, 扩展名, 大小, 修改时间)]
+    
+    相对路径用 / 分隔；include 为空时包含全部文件，匹配 exclude 的文件和文件夹都会跳过，
+    skip_dirs 中的文件夹（如输出文件夹）不会进入。
+    """
+    skip = {os.path.normcase(os.path.abspath(path)) for path in skip_dirs}
+    files = []
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(input_dir, rel_dir)) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if exclude and match_patterns(rel_path, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.normcase(os.path.abspath(entry.path)) not in skip:
+                        pending.append(rel_path)
+                    continue
+                if not entry.is_file() or (include and not match_patterns(rel_path, include)):
+                    continue
+                file_type, ext = get_file_type(entry.name)
+                if file_type:
+                    stat = entry.stat()
+                    files.append((rel_path, file_type, ext, stat.st_size, stat.st_mtime))
+            except OSError:
+                continue
+    files.sort()
+    return files
+
+def segment_cjk(text):
+    """在中日韩文字两侧加空格，使全文索引的 unicode61 分词按单字切分，词组查询即可匹配任意连续字"""
+    return CJK_CHAR_RE.sub(r' \g<0> ', text)
+
+def fts_query(query):
+    """把搜索框中以空格分隔的词转换为FTS5查询：每个词作为一个词组，多个词同时满足"""
+    terms = [segment_cjk(term.replace('"', ' ')).strip() for term in query.split()]
+    return ' AND '.join(f'"{term}"' for term in terms if term)
+
+class ExtractIndex:
+    """已处理文件的索引，按相对路径记录大小、修改时间和输出文件，重复运行时跳过没有变化的文件
+    
+    启用全文索引后，提取出的文本写入SQLite FTS5表，可用 search 按关键词查找。
+    """
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.conn = sqlite3.connect(os.path.join(output_dir, INDEX_FILE_NAME))
+        # WAL模式下批量处理写入索引时，界面仍可同时搜索
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            output TEXT,
+            processed_at REAL
+        )""")
+        self.conn.commit()
+        self.uncommitted = 0
+    
+    def output_path(self, rel_path):
+        """上次处理该文件时的输出文件路径，没有时返回None"""
+        row = self.conn.execute("SELECT output FROM files WHERE path = ?", (rel_path,)).fetchone()
+        return os.path.join(self.output_dir, row[0]) if row else None
+    
+    def is_done(self, rel_path, size, mtime, fts=False):
+        """文件是否已处理过、之后没有变化且输出文件还在；fts 为True时还要求已写入全文索引"""
+        row = self.conn.execute("SELECT size, mtime, output FROM files WHERE path = ?", (rel_path,)).fetchone()
+        if not (row is not None and row[0] == size and row[1] == mtime
+                and os.path.exists(os.path.join(self.output_dir, row[2]))):
+            return False
+        if fts:
+            row = self.conn.execute("SELECT size, mtime FROM fts_docs WHERE path = ?", (rel_path,)).fetchone()
+            return row is not None and row[0] == size and row[1] == mtime
+        return True
+    
+    def enable_fts(self):
+        """创建全文索引表，SQLite不支持FTS5时抛出 sqlite3.OperationalError"""
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS fts_docs (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE,
+            size INTEGER,
+            mtime REAL,
+            title TEXT
+        )""")
+        self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS fts_text USING fts5(title, body, tokenize='unicode61')")
+        self.conn.commit()
+    
+    def index_text(self, rel_path, size, mtime, title, content):
+        """把文件的标题和文本写入全文索引，文件修改后替换旧内容"""
+        row = self.conn.execute("SELECT id FROM fts_docs WHERE path = ?", (rel_path,)).fetchone()
+        if row:
+            doc_id = row[0]
+            self.conn.execute("DELETE FROM fts_text WHERE rowid = ?", (doc_id,))
+            self.conn.execute("UPDATE fts_docs SET size = ?, mtime = ?, title = ? WHERE id = ?",
+                              (size, mtime, title, doc_id))
+        else:
+            doc_id = self.conn.execute("INSERT INTO fts_docs (path, size, mtime, title) VALUES (?, ?, ?, ?)",
+                                       (rel_path, size, mtime, title)).lastrowid
+        self.conn.execute("INSERT INTO fts_text (rowid, title, body) VALUES (?, ?, ?)",
+                          (doc_id, segment_cjk(title or ''), segment_cjk((content or '')[:FTS_MAX_CHARS])))
+        self.uncommitted += 1
+        if self.uncommitted >= INDEX_COMMIT_EVERY:
+            self.commit()
+    
+    def search(self, query, limit=SEARCH_LIMIT):
+        """按关键词搜索全文索引，返回 [{"path", "title", "snippet"}]，按相关度排序"""
+        match = fts_query(query)
+        if not match:
+            return []
+        try:
+            rows = self.conn.execute(
+                """SELECT d.path, d.title, snippet(fts_text, 1, '[', ']', '…', 24)
+                   FROM fts_text JOIN fts_docs d ON d.id = fts_text.rowid
+                   WHERE fts_text MATCH ? ORDER BY rank LIMIT ?""",
+                (match, limit)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []  # 还没有建立全文索引
+        return [{"path": path, "title": title, "snippet": CJK_SPACES_RE.sub(r'\1', snippet).strip()}
+                for path, title, snippet in rows]
+    
+    def record(self, rel_path, size, mtime, output_path):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime, output, processed_at) VALUES (?, ?, ?, ?, ?)",
+            (rel_path, size, mtime, os.path.relpath(output_path, self.output_dir), time.time())
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= INDEX_COMMIT_EVERY:
+            self.commit()
+    
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+    
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+def extract_text_from_file(file_path, file_type, ext, limit=None):
+    """根据文件类型提取文本内容，出错时抛出异常
+    
+    limit 不为None时，提取到约 limit 个有效字符就停止，只用于生成标题。
+    """
+    if file_type == 'word':
+        return extract_word_text(file_path, ext, limit)
+    elif file_type == 'excel':
+        return extract_excel_text(file_path, ext, limit)
+    elif file_type == 'powerpoint':
+        return extract_ppt_text(file_path, ext, limit)
+    elif file_type == 'pdf':
+        return extract_pdf_text(file_path, limit)
+    elif file_type == 'web':
+        return extract_html_text(file_path, limit)
+    elif file_type == 'text':
+        return extract_txt_text(file_path)
+    return None
+
+def enough_text(text, limit):
+    """已提取的文本是否已够生成标题"""
+    return limit is not None and len(re.sub(r'\s+', ' ', '\n'.join(text)).strip()) >= limit
+
+def extract_word_text(file_path, ext, limit=None):
+    """提取Word文档文本"""
+    if ext == 'docx':
+        from docx import Document
+        doc = Document(file_path)
+        full_text = []
+        for para in doc.paragraphs:
+            full_text.append(para.text)
+            if enough_text(full_text, limit):
+                break
+        return '\n'.join(full_text)
+    elif ext == 'doc':  # 需要Office或LibreOffice
+        return get_office_backend().extract_word_text(file_path, limit)
+    return None
+
+def extract_excel_text(file_path, ext, limit=None):
+    """提取Excel文本"""
+    text = []
+    if ext == 'xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        for sheet_name in workbook.sheetnames:
+            sheet = workbook[sheet_name]
+            text.append(f"工作表: {sheet_name}")
+            for row in sheet.iter_rows(values_only=True):
+                row_text = [str(cell) if cell is not None else '' for cell in row]
+                text.append('\t'.join(row_text))
+                if enough_text(text, limit):
+                    break
+            if enough_text(text, limit):
+                break
+        workbook.close()
+    elif ext == 'xls':
+        import xlrd
+        # on_demand 只在用到时才加载工作表
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        for sheet_idx in range(workbook.nsheets):
+            sheet = workbook.sheet_by_index(sheet_idx)
+            text.append(f"工作表: {sheet.name}")
+            for row_idx in range(sheet.nrows):
+                row_text = [str(sheet.cell_value(row_idx, col_idx)) for col_idx in range(sheet.ncols)]
+                text.append('\t'.join(row_text))
+                if enough_text(text, limit):
+                    break
+            if enough_text(text, limit):
+                break
+        workbook.release_resources()
+    return '\n'.join(text)
+
+def extract_ppt_text(file_path, ext, limit=None):
+    """提取PowerPoint文本（需要Office或LibreOffice）"""
+    return get_office_backend().extract_presentation_text(file_path, limit)
+
+def extract_pdf_text(file_path, limit=None):
+    """提取PDF文本，只取标题时只解析前几页"""
+    from pdfminer.high_level import extract_text
+    return extract_text(file_path, maxpages=TITLE_PDF_PAGES if limit is not None else 0)
+
+def extract_metadata_title(file_path, file_type, ext):
+    """读取文档元数据中的标题（docx核心属性、PDF /Title、网页<title>），没有或读取失败时返回None"""
+    title = None
+    try:
+        if file_type == 'word' and ext == 'docx':
+            # 直接读取 docProps/core.xml，不必解析整个文档
+            with zipfile.ZipFile(file_path) as docx:
+                title = ET.fromstring(docx.read('docProps/core.xml')).findtext(DC_TITLE)
+        elif file_type == 'pdf':
+            from pdfminer.pdfparser import PDFParser
+            from pdfminer.pdfdocument import PDFDocument
+            from pdfminer.pdftypes import resolve1
+            from pdfminer.utils import decode_text
+            with open(file_path, 'rb') as f:
+                document = PDFDocument(PDFParser(f))
+                for info in document.info:
+                    title = resolve1(info.get('Title'))
+                    if isinstance(title, bytes):
+                        title = decode_text(title)
+                    if isinstance(title, str) and title.strip():
+                        break
+        elif file_type == 'web':
+            # 与正文使用同一编码，GBK等网页的标题不能按UTF-8解码
+            with open(file_path, 'rb') as f:
+                head = f.read(HTML_HEAD_BYTES).decode(detect_encoding(file_path), errors='ignore')
+            match = re.search(r'<title[^>]*>(.*?)</title>', head, re.IGNORECASE | re.DOTALL)
+            if match:
+                title = html.unescape(match.group(1))
+    except Exception:
+        title = None
+    return (title.strip() or None) if isinstance(title, str) else None
+
+class HTMLTextParser(HTMLParser):
+    """流式提取网页中的文本，跳过 script/style/template 的内容，不建立文档树"""
+    SKIP_TAGS = ('script', 'style', 'template')
+    
+    def __init__(self, limit=None):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.parts = []
+        self.skip_depth = 0
+        self.collected = 0  # 已提取的非空白字符数
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+    
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+            if self.limit is not None:
+                self.collected += len(data.strip())
+    
+    @property
+    def enough(self):
+        return self.limit is not None and self.collected >= self.limit
+    
+    def get_text(self):
+        return ''.join(self.parts)
+
+def extract_html_text(file_path, limit=None):
+    """提取HTML文本：分块读取并流式解析，limit 不为None时提取到足够文本就停止"""
+    parser = HTMLTextParser(limit)
+    with open(file_path, 'r', encoding=detect_encoding(file_path), errors='replace') as f:
+        while not parser.enough:
+            chunk = f.read(HTML_READ_CHARS)
+            if not chunk:
+                break
+            parser.feed(chunk)
+    if not parser.enough:
+        parser.close()
+    return parser.get_text()
+
+def detect_encoding(file_path):
+    """读取文件开头一次判断编码：BOM、UTF-8有效性检查、GB18030中文比例，都不符合时按latin-1处理"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    
+    # 样本末尾可能截断了一个多字节字符，用增量解码器忽略不完整的结尾
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    
+    try:
+        text = codecs.getincrementaldecoder('gb18030')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'latin-1'
+    # 西文编码的文本有时也能按GB18030解码，要求非ASCII字符大部分是中文字符或标点（统计开头一段即可）
+    text = text[:ENCODING_CHECK_CHARS]
+    if len(CJK_RE.findall(text)) >= len(NON_ASCII_RE.findall(text)) * 0.5:
+        return 'gb18030'  # GB18030兼容GBK和GB2312
+    return 'latin-1'
+
+def stream_text(file_type, file_path):
+    """文本文件是否太大，需要边读边转码保存而不是整体读入"""
+    return file_type == 'text' and os.path.getsize(file_path) > TEXT_STREAM_BYTES
+
+def extract_txt_text(file_path, limit=None):
+    """提取TXT文本，只判断一次编码、只解码一次；limit 不为None时只读取开头"""
+    with open(file_path, 'r', encoding=detect_encoding(file_path), errors='replace') as f:
+        if limit is None:
+            return f.read()
+        text = []
+        while not enough_text(text, limit):
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            text.append(chunk)
+        return ''.join(text)
+
+def save_text_stream(src, dst):
+    """把大文本文件边读边转成UTF-8保存"""
+    with open(src, 'r', encoding=detect_encoding(src), errors='replace', newline='') as fin, \
+            open(dst, 'w', encoding='utf-8', newline='') as fout:
+        shutil.copyfileobj(fin, fout, TEXT_READ_CHARS)
+
+def get_title_from_content(content):
+    """从提取的文本中取前50个有效字符作为文件名的一部分"""
+    if not content:
+        return "无内容"
+    
+    # 清理内容，提取前50个有效字符
+    content = re.sub(r'\s+', ' ', content).strip()  # 替换多个空白为单个空格
+    if len(content) > TITLE_LENGTH:
+        return content[:TITLE_LENGTH]
+    return content if content else "无内容"
+
+def extract_file(file_path, file_type, ext, full_text=False):
+    """提取一个文件，返回 (标题, 文本, 错误信息)
+    
+    只有网页和文本文件需要全文，其他类型优先用元数据标题，没有时只解析开头部分；
+    full_text 为True（建立全文索引）时所有类型都返回全文。
+    """
+    title = extract_metadata_title(file_path, file_type, ext)
+    content = None
+    error = None
+    try:
+        if stream_text(file_type, file_path):
+            # 大文本文件只读开头取标题，全文在保存时流式转码
+            title = extract_txt_text(file_path, limit=TITLE_LENGTH)
+            if full_text:
+                with open(file_path, 'r', encoding=detect_encoding(file_path), errors='replace') as f:
+                    content = f.read(FTS_MAX_CHARS)
+        elif file_type in TEXT_TYPES or full_text:
+            content = extract_text_from_file(file_path, file_type, ext)
+        elif not title:
+            content = extract_text_from_file(file_path, file_type, ext, limit=TITLE_LENGTH)
+    except Exception as e:
+        error = str(e)
+    return get_title_from_content(title or content), content if file_type in TEXT_TYPES or full_text else None, error
+
+def save_binary(src, dst, hardlink=False):
+    """保存二进制文件，内容不经过Python内存
+    
+    shutil.copyfile 会使用系统的快速复制（Linux上为 sendfile/copy_file_range）；
+    选择硬链接时直接链接到原文件，不支持硬链接的磁盘上改为复制。
+    """
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+def extraction_worker(conn, timeout=EXTRACT_TIMEOUT):
+    """提取进程：从管道接收 (任务编号, 路径, 类型, 扩展名, 是否要全文)，返回 (任务编号, 标题, 文本, 错误)，收到None时退出
+    
+    timeout 为进程池终止本进程的超时，Office转换超时据此缩短，保证先于进程被终止结束Office程序。
+    """
+    global office_timeout
+    office_timeout = office_convert_timeout(timeout)
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                return
+            if task is None:
+                return
+            task_id, file_path, file_type, ext, full_text = task
+            conn.send((task_id,) + extract_file(file_path, file_type, ext, full_text))
+    finally:
+        close_office_backend()
+
+class ExtractionPool:
+    """多进程提取文件
+    
+    每个工作进程有自己的管道，一次只处理一个文件。某个文件解析卡住超过超时时间时，
+    只终止处理它的进程并重新启动一个，不影响其他文件。需要Office程序的文件只交给前
+    OFFICE_WORKERS 个进程，这样只会同时运行少数几个长期复用的Office实例。
+    """
+    def __init__(self, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.workers = [self.start_worker() for _ in range(workers)]
+    
+    def start_worker(self):
+        conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(target=extraction_worker, args=(child_conn, self.timeout), daemon=True)
+        process.start()
+        child_conn.close()
+        return {"process": process, "conn": conn, "task": None, "started": 0}
+    
+    def run(self, tasks, on_result):
+        """处理所有任务 (任务编号, 路径, 类型, 扩展名, 是否要全文)，每完成一个调用 on_result(任务, 标题, 文本, 错误)"""
+        pending = [task for task in reversed(tasks) if not needs_office(task[2], task[3])]
+        office_pending = [task for task in reversed(tasks) if needs_office(task[2], task[3])]
+        try:
+            while pending or office_pending or any(worker["task"] for worker in self.workers):
+                # 给空闲的进程分配任务，前几个进程优先处理需要Office的文件
+                for idx, worker in enumerate(self.workers):
+                    if worker["task"] is not None:
+                        continue
+                    if idx < OFFICE_WORKERS and office_pending:
+                        worker["task"] = office_pending.pop()
+                    elif pending:
+                        worker["task"] = pending.pop()
+                    else:
+                        continue
+                    worker["started"] = time.monotonic()
+                    worker["conn"].send(worker["task"])
+                
+                busy = {worker["conn"]: worker for worker in self.workers if worker["task"]}
+                for conn in wait(list(busy), timeout=0.2):
+                    worker = busy[conn]
+                    task = worker["task"]
+                    worker["task"] = None
+                    try:
+                        _, title, content, error = conn.recv()
+                    except (EOFError, OSError):
+                        # 进程意外退出（如解析库崩溃），换一个新进程
+                        self.restart_worker(worker)
+                        on_result(task, None, None, "提取进程意外退出")
+                        continue
+                    on_result(task, title, content, error)
+                
+                # 终止处理超时的进程
+                now = time.monotonic()
+                for worker in self.workers:
+                    if worker["task"] and now - worker["started"] > self.timeout:
+                        task = worker["task"]
+                        self.restart_worker(worker)
+                        on_result(task, None, None, f"处理超过 {self.timeout} 秒，已终止")
+        finally:
+            self.close()
+    
+    def restart_worker(self, worker):
+        worker["process"].kill()
+        worker["process"].join()
+        worker["conn"].close()
+        worker.update(self.start_worker())
+    
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker["conn"].send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].kill()
+            worker["conn"].close()
+
+def sanitize_filename(filename):
+    """清理文件名中的非法字符"""
+    invalid_chars = '/\\:*?"<>|'
+    for char in invalid_chars:
+        filename = filename.replace(char, '_')
+    # 限制文件名长度
+    return filename[:150]
+
+def extract(file_path, full_text=False):
+    """提取单个文件，返回 {"title": 标题, "content": 全文（网页和文本文件，或 full_text 为True时）, "error": 错误信息}"""
+    file_type, ext = get_file_type(os.path.basename(file_path))
+    if not file_type:
+        return {"title": None, "content": None, "error": f"不支持的文件格式: {ext}"}
+    title, content, error = extract_file(file_path, file_type, ext, full_text)
+    return {"title": title, "content": content, "error": error}
+
+def search(output_dir, query, limit=SEARCH_LIMIT):
+    """在输出文件夹的全文索引中搜索，没有索引时返回空列表"""
+    if not os.path.exists(os.path.join(output_dir, INDEX_FILE_NAME)):
+        return []
+    index = ExtractIndex(output_dir)
+    try:
+        return index.search(query, limit)
+    finally:
+        index.close()
+
+def rename(input_dir, output_dir=None, **options):
+    """把文件夹中的文件以"旧文件名_提取信息"为名保存到输出文件夹，参数同 BatchExtractor，返回统计"""
+    return BatchExtractor(input_dir, output_dir, **options).run()
+
+class BatchExtractor:
+    """不依赖界面的批量提取
+    
+    扫描输入文件夹，用多个进程提取，按原目录结构以"旧文件名_提取信息"为名保存到输出文件夹，
+    并记录到索引。进度以字典形式交给 on_event 回调，由界面或命令行负责显示。
+    """
+    def __init__(self, input_dir, output_dir=None, recursive=False, include=None, exclude=None,
+                 hardlink=False, fts=False, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT, on_event=None):
+        self.input_dir = input_dir
+        self.output_dir = output_dir or os.path.join(input_dir, DEFAULT_SUBFOLDER)
+        self.recursive = recursive
+        self.include = include or []
+        self.exclude = exclude or []
+        self.hardlink = hardlink
+        self.fts = fts  # 是否把提取的文本写入全文索引
+        self.workers = workers
+        self.timeout = timeout
+        self.on_event = on_event
+    
+    def emit(self, event, **fields):
+        if self.on_event:
+            self.on_event(dict(event=event, **fields))
+    
+    def scan(self):
+        return scan_files(self.input_dir, self.recursive, self.include, self.exclude, skip_dirs=[self.output_dir])
+    
+    def open_index(self):
+        index = ExtractIndex(self.output_dir)
+        if self.fts:
+            try:
+                index.enable_fts()
+            except sqlite3.OperationalError as e:
+                self.fts = False
+                self.emit("error", message=f"当前SQLite不支持全文索引(FTS5)，本次不建立索引: {str(e)}")
+        return index
+    
+    def run(self):
+        """处理一遍，跳过已处理且没有变化的文件，返回统计字典"""
+        start_time = time.time()
+        os.makedirs(self.output_dir, exist_ok=True)
+        all_files = self.scan()
+        index = self.open_index()
+        try:
+            files = [f for f in all_files if not index.is_done(f[0], f[3], f[4], self.fts)]
+            self.emit("scan", found=len(all_files), skipped=len(all_files) - len(files))
+            success_count, error_count = self.extract_files(files, index)
+        finally:
+            index.close()
+        
+        elapsed = time.time() - start_time
+        summary = {
+            "found": len(all_files),
+            "skipped": len(all_files) - len(files),
+            "success": success_count,
+            "error": error_count,
+            "elapsed": round(elapsed, 3),
+            "files_per_sec": round((success_count + error_count) / max(elapsed, 0.001), 1),
+        }
+        self.emit("done", **summary)
+        return summary
+    
+    def watch(self, stop, interval=None):
+        """定时扫描，处理新出现或修改过的文件，直到 stop（threading.Event）被设置
+        
+        文件的大小和修改时间在两次检查之间没有变化才处理，避免处理还在复制中的文件；
+        处理失败的文件在再次修改前不会重试。
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        index = self.open_index()
+        last_seen = {}
+        failed = {}
+        try:
+            while not stop.is_set():
+                seen = {}
+                ready = []
+                for f in self.scan():
+                    rel_path, size, mtime = f[0], f[3], f[4]
+                    seen[rel_path] = (size, mtime)
+                    if (last_seen.get(rel_path) == (size, mtime) and failed.get(rel_path) != (size, mtime)
+                            and not index.is_done(rel_path, size, mtime, self.fts)):
+                        ready.append(f)
+                last_seen = seen
+                if ready:
+                    self.emit("new_files", count=len(ready))
+                    done = set()
+                    self.extract_files(ready, index, done)
+                    index.commit()
+                    for f in ready:
+                        if f[0] not in done:
+                            failed[f[0]] = (f[3], f[4])
+                stop.wait(interval or WATCH_INTERVAL)
+        finally:
+            index.close()
+    
+    def extract_files(self, files, index, done=None):
+        """提取文件并按原目录结构保存、记录到索引，返回 (成功数, 失败数)"""
+        if not files:
+            return 0, 0
+        counts = {"success": 0, "error": 0}
+        
+        def on_result(task, extracted_info, content, error):
+            rel_path, file_type, ext, size, mtime = files[task[0]]
+            
+            # 按原目录结构保存；文件修改后重新处理时替换上次的输出
+            target_dir = os.path.join(self.output_dir, *rel_path.split('/')[:-1])
+            previous = index.output_path(rel_path)
+            try:
+                os.makedirs(target_dir, exist_ok=True)
+                if previous and os.path.exists(previous):
+                    os.remove(previous)
+            except OSError as e:
+                self.emit("error", message=f"准备输出文件夹时出错: {str(e)}")
+            
+            output_path, save_error = self.save_result(task[1], file_type, ext, target_dir, extracted_info, content)
+            if output_path:
+                index.record(rel_path, size, mtime, output_path)
+                if self.fts:
+                    index.index_text(rel_path, size, mtime, extracted_info, content)
+                if done is not None:
+                    done.add(rel_path)
+                counts["success"] += 1
+            else:
+                counts["error"] += 1
+            self.emit("file", path=rel_path, ok=bool(output_path), title=extracted_info,
+                      output=os.path.relpath(output_path, self.output_dir) if output_path else None,
+                      extract_error=error, error=save_error)
+        
+        tasks = [(i, os.path.join(self.input_dir, *f[0].split('/')), f[1], f[2], self.fts) for i, f in enumerate(files)]
+        try:
+            ExtractionPool(min(self.workers, len(tasks)), self.timeout).run(tasks, on_result)
+        except Exception as e:
+            self.emit("error", message=f"批量处理出错: {str(e)}")
+        return counts["success"], counts["error"]
+    
+    def save_result(self, file_path, file_type, ext, output_dir, extracted_info, content):
+        """以"旧文件名_提取信息"为名把文件保存到输出文件夹，返回 (保存的路径, 错误信息)"""
+        if not extracted_info:
+            return None, "无法提取信息"
+        
+        # 获取原文件名（不含扩展名）
+        original_name = os.path.splitext(os.path.basename(file_path))[0]
+        
+        # 组合旧文件名和提取的信息作为新文件名
+        new_filename_base = f"{original_name}_{extracted_info}"
+        
+        # 清理文件名并添加扩展名
+        filename = sanitize_filename(new_filename_base) + f".{ext}"
+        
+        # 处理可能的文件名重复
+        base_filename, ext = os.path.splitext(filename)
+        counter = 1
+        output_path = os.path.join(output_dir, filename)
+        
+        # 如果文件已存在，添加编号
+        while os.path.exists(output_path):
+            filename = f"{base_filename}_{counter}{ext}"
+            output_path = os.path.join(output_dir, filename)
+            counter += 1
+        
+        # 复制文件（保留原格式）
+        try:
+            # 对于二进制文件直接复制
+            if file_type not in TEXT_TYPES:
+                save_binary(file_path, output_path, self.hardlink)
+            # 对于大文本文件，边读边转码为UTF-8
+            elif stream_text(file_type, file_path):
+                save_text_stream(file_path, output_path)
+            # 对于文本文件，使用提取进程返回的内容以UTF-8编码保存，不再重新解析
+            else:
+                if content:
+                    with open(output_path, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                else:
+                    raise Exception("无法提取文件内容")
+            return output_path, None
+        except Exception as e:
+            return None, str(e)
 
 class MultiFormatExtractorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("多格式文件内容提取工具 | V0.1")
-        self.root.geometry("800x650")
+        self.root.geometry("800x750")
         self.root.resizable(True, True)
         
         # 设置中文字体支持
@@ -33,20 +1010,28 @@ class MultiFormatExtractorApp:
         # 输入文件夹路径
         self.input_dir = tk.StringVar()
         # 子文件夹名称
-        self.subfolder_name = tk.StringVar(value="提取结果")
+        self.subfolder_name = tk.StringVar(value=DEFAULT_SUBFOLDER)
+        # 是否用硬链接代替复制（输出文件与原文件共用同一份数据）
+        self.use_hardlink = tk.BooleanVar(value=False)
+        # 是否把提取的文本写入全文索引，以及搜索关键词
+        self.use_fts = tk.BooleanVar(value=False)
+        self.search_query = tk.StringVar()
+        # 是否处理子文件夹，以及包含/排除的通配符
+        self.recursive = tk.BooleanVar(value=False)
+        self.include_patterns = tk.StringVar()
+        self.exclude_patterns = tk.StringVar()
         
         # 支持的文件格式
-        self.supported_formats = {
-            'word': ['doc', 'docx'],
-            'excel': ['xls', 'xlsx'],
-            'powerpoint': ['ppt', 'pptx'],
-            'pdf': ['pdf'],
-            'web': ['html'],
-            'text': ['txt']
-        }
+        self.supported_formats = SUPPORTED_FORMATS
+        
+        # 后台处理线程通过队列把日志和结果交给界面线程显示
+        self.ui_queue = queue.Queue()
+        # 监视模式的停止信号，不在监视时为None
+        self.watch_stop = None
         
         # 创建UI元素
         self.create_widgets()
+        self.root.after(UI_POLL_INTERVAL, self.poll_ui_queue)
     
     def create_widgets(self):
         # 标题
@@ -68,35 +1053,71 @@ class MultiFormatExtractorApp:
         subfolder_entry = ttk.Entry(self.main_frame, textvariable=self.subfolder_name, width=60)
         subfolder_entry.grid(row=2, column=1, sticky=tk.W, pady=10, padx=5)
         
+        option_frame = ttk.Frame(self.main_frame)
+        option_frame.grid(row=2, column=2, sticky=tk.W, pady=10, padx=5)
+        ttk.Checkbutton(option_frame, text="硬链接代替复制", variable=self.use_hardlink).pack(anchor=tk.W)
+        ttk.Checkbutton(option_frame, text="建立全文索引", variable=self.use_fts).pack(anchor=tk.W)
+        
+        # 子文件夹和文件筛选
+        ttk.Label(self.main_frame, text="文件筛选:").grid(row=3, column=0, sticky=tk.W, pady=10)
+        
+        filter_frame = ttk.Frame(self.main_frame)
+        filter_frame.grid(row=3, column=1, columnspan=2, sticky=tk.W, pady=10, padx=5)
+        ttk.Checkbutton(filter_frame, text="包含子文件夹", variable=self.recursive).pack(side=tk.LEFT)
+        ttk.Label(filter_frame, text="  包含:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.include_patterns, width=16).pack(side=tk.LEFT, padx=3)
+        ttk.Label(filter_frame, text="排除:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.exclude_patterns, width=16).pack(side=tk.LEFT, padx=3)
+        ttk.Label(filter_frame, text="多个用;分隔，如 *.pdf;报告*", font=("SimHei", 8)).pack(side=tk.LEFT, padx=3)
+        
+        # 全文搜索
+        ttk.Label(self.main_frame, text="全文搜索:").grid(row=4, column=0, sticky=tk.W, pady=10)
+        
+        search_entry = ttk.Entry(self.main_frame, textvariable=self.search_query, width=60)
+        search_entry.grid(row=4, column=1, sticky=tk.W, pady=10, padx=5)
+        search_entry.bind("<Return>", lambda event: self.search_index())
+        
+        search_btn = ttk.Button(self.main_frame, text="搜索", command=self.search_index)
+        search_btn.grid(row=4, column=2, pady=10, padx=5)
+        
         # 支持的格式说明 - 加大字号
         supported_formats = []
         for fmt_list in self.supported_formats.values():
             supported_formats.extend(fmt_list)
         format_label = ttk.Label(self.main_frame, text=f"支持格式: {', '.join(supported_formats)}", 
                                 font=("SimHei", 11, "bold"))
-        format_label.grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=10)
+        format_label.grid(row=5, column=0, columnspan=3, sticky=tk.W, pady=10)
         
         # 状态显示区域
-        ttk.Label(self.main_frame, text="处理状态:").grid(row=4, column=0, sticky=tk.NW, pady=10)
+        ttk.Label(self.main_frame, text="处理状态:").grid(row=6, column=0, sticky=tk.NW, pady=10)
         
         self.status_text = tk.Text(self.main_frame, height=12, width=60)
-        self.status_text.grid(row=4, column=1, columnspan=2, pady=10, padx=5, sticky=tk.NSEW)
+        self.status_text.grid(row=6, column=1, columnspan=2, pady=10, padx=5, sticky=tk.NSEW)
         scrollbar = ttk.Scrollbar(self.main_frame, command=self.status_text.yview)
-        scrollbar.grid(row=4, column=3, sticky=tk.NS)
+        scrollbar.grid(row=6, column=3, sticky=tk.NS)
         self.status_text.config(yscrollcommand=scrollbar.set, state=tk.DISABLED)
         
         # 按钮区域
         button_frame = ttk.Frame(self.main_frame)
-        button_frame.grid(row=5, column=0, columnspan=3, pady=15)
+        button_frame.grid(row=7, column=0, columnspan=3, pady=15)
         
         # 处理按钮 - 加大尺寸
-        process_btn = ttk.Button(
+        self.process_btn = ttk.Button(
             button_frame, 
             text="开始批量提取", 
             command=self.process_files, 
             style="Large.TButton"
         )
-        process_btn.pack(side=tk.LEFT, padx=10)
+        self.process_btn.pack(side=tk.LEFT, padx=10)
+        
+        # 监视按钮：持续处理放入文件夹的新文件
+        self.watch_btn = ttk.Button(
+            button_frame, 
+            text="监视文件夹", 
+            command=self.toggle_watch, 
+            style="Large.TButton"
+        )
+        self.watch_btn.pack(side=tk.LEFT, padx=10)
         
         # 删除空文件按钮
         delete_empty_btn = ttk.Button(
@@ -109,11 +1130,11 @@ class MultiFormatExtractorApp:
         
         # 配置网格权重，使界面可缩放
         self.main_frame.columnconfigure(1, weight=1)
-        self.main_frame.rowconfigure(4, weight=1)
+        self.main_frame.rowconfigure(6, weight=1)
         
         # 底部信息
         footer_label = ttk.Label(self.main_frame, text="保留原格式 | 文件名格式: 旧文件名+提取信息 | V0.1", font=("SimHei", 8))
-        footer_label.grid(row=6, column=0, columnspan=3, pady=10)
+        footer_label.grid(row=8, column=0, columnspan=3, pady=10)
     
     def browse_input(self):
         """选择输入的文件夹"""
@@ -130,168 +1151,52 @@ class MultiFormatExtractorApp:
         self.status_text.config(state=tk.DISABLED)
         self.root.update_idletasks()  # 刷新界面
     
-    def get_file_type(self, filename):
-        """判断文件类型"""
-        ext = filename.lower().split('.')[-1] if '.' in filename else ''
-        for type_name, extensions in self.supported_formats.items():
-            if ext in extensions:
-                return type_name, ext
-        return None, ext
-    
-    def extract_text_from_file(self, file_path, file_type, ext):
-        """根据文件类型提取文本内容"""
-        try:
-            if file_type == 'word':
-                return self.extract_word_text(file_path, ext)
-            elif file_type == 'excel':
-                return self.extract_excel_text(file_path, ext)
-            elif file_type == 'powerpoint':
-                return self.extract_ppt_text(file_path, ext)
-            elif file_type == 'pdf':
-                return self.extract_pdf_text(file_path)
-            elif file_type == 'web':
-                return self.extract_html_text(file_path)
-            elif file_type == 'text':
-                return self.extract_txt_text(file_path)
-            else:
-                return None
-        except Exception as e:
-            self.log(f"提取文本时出错: {str(e)}")
-            return None
-    
-    def extract_word_text(self, file_path, ext):
-        """提取Word文档文本"""
-        if ext == 'docx':
-            doc = Document(file_path)
-            full_text = []
-            for para in doc.paragraphs:
-                full_text.append(para.text)
-            return '\n'.join(full_text)
-        elif ext == 'doc':  # 需要Windows系统支持
-            word = comtypes.client.CreateObject('Word.Application')
-            word.Visible = False
-            doc = word.Documents.Open(os.path.abspath(file_path))
-            content = doc.Content.Text
-            doc.Close()
-            word.Quit()
-            return content
-        return None
+    def post(self, kind, *args):
+        """后台线程向界面发送消息，界面线程在 poll_ui_queue 中处理"""
+        self.ui_queue.put((kind,) + args)
     
-    def extract_excel_text(self, file_path, ext):
-        """提取Excel文本"""
-        text = []
-        if ext == 'xlsx':
-            workbook = openpyxl.load_workbook(file_path, read_only=True)
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text.append(f"工作表: {sheet_name}")
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = [str(cell) if cell is not None else '' for cell in row]
-                    text.append('\t'.join(row_text))
-            workbook.close()
-        elif ext == 'xls':
-            workbook = xlrd.open_workbook(file_path)
-            for sheet_idx in range(workbook.nsheets):
-                sheet = workbook.sheet_by_index(sheet_idx)
-                text.append(f"工作表: {sheet.name}")
-                for row_idx in range(sheet.nrows):
-                    row_text = [str(sheet.cell_value(row_idx, col_idx)) for col_idx in range(sheet.ncols)]
-                    text.append('\t'.join(row_text))
-        return '\n'.join(text)
-    
-    def extract_ppt_text(self, file_path, ext):
-        """提取PowerPoint文本（需要Windows系统）"""
+    def poll_ui_queue(self):
+        """定时处理后台线程发来的日志和完成消息"""
         try:
-            powerpoint = comtypes.client.CreateObject('PowerPoint.Application')
-            powerpoint.Visible = False
-            presentation = powerpoint.Presentations.Open(os.path.abspath(file_path))
-            
-            text = []
-            for slide_idx, slide in enumerate(presentation.Slides):
-                text.append(f"幻灯片 {slide_idx + 1}")
-                for shape in slide.Shapes:
-                    if shape.HasTextFrame and shape.TextFrame.HasText:
-                        text.append(shape.TextFrame.TextRange.Text)
-            
-            presentation.Close()
-            powerpoint.Quit()
-            return '\n'.join(text)
-        except Exception as e:
-            self.log(f"PPT提取错误: {str(e)}")
-            return None
+            while True:
+                kind, *args = self.ui_queue.get_nowait()
+                if kind == "log":
+                    self.log(args[0])
+                elif kind == "info":
+                    self.process_btn.config(state=tk.NORMAL)
+                    self.watch_btn.config(state=tk.NORMAL)
+                    messagebox.showinfo("提示", args[0])
+                elif kind == "done":
+                    self.finish_processing(*args)
+                elif kind == "watch_stopped":
+                    self.watch_stop = None
+                    self.watch_btn.config(text="监视文件夹", state=tk.NORMAL)
+                    self.process_btn.config(state=tk.NORMAL)
+        except queue.Empty:
+            pass
+        self.root.after(UI_POLL_INTERVAL, self.poll_ui_queue)
     
-    def extract_pdf_text(self, file_path):
-        """提取PDF文本"""
-        try:
-            return extract_text(file_path)
-        except Exception as e:
-            self.log(f"PDF提取错误: {str(e)}")
-            return None
-    
-    def extract_html_text(self, file_path):
-        """提取HTML文本"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                soup = BeautifulSoup(f.read(), 'html.parser')
-                return soup.get_text()
-        except Exception as e:
-            self.log(f"HTML提取错误: {str(e)}")
-            return None
-    
-    def extract_txt_text(self, file_path):
-        """提取TXT文本"""
-        try:
-            encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        return f.read()
-                except UnicodeDecodeError:
-                    continue
-            # 如果所有编码都尝试失败
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                return f.read()
-        except Exception as e:
-            self.log(f"TXT提取错误: {str(e)}")
-            return None
-    
-    def get_title_for_filename(self, file_path, file_type, ext):
-        """从文件中提取标题作为文件名的一部分"""
-        content = self.extract_text_from_file(file_path, file_type, ext)
-        if not content:
-            return "无内容"
-        
-        # 清理内容，提取前50个有效字符
-        content = re.sub(r'\s+', ' ', content).strip()  # 替换多个空白为单个空格
-        if len(content) > 50:
-            return content[:50]
-        return content if content else "无内容"
-    
-    def sanitize_filename(self, filename):
-        """清理文件名中的非法字符"""
-        invalid_chars = '/\\:*?"<>|'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        # 限制文件名长度
-        return filename[:150]
+    def get_file_type(self, filename):
+        """判断文件类型"""
+        return get_file_type(filename)
     
-    def process_files(self):
-        """批量处理文件夹中的文件"""
+    def prepare_output(self):
+        """验证输入并创建输出子文件夹，返回 (输入文件夹, 输出文件夹)，失败时返回None"""
         input_dir = self.input_dir.get()
         subfolder_name = self.subfolder_name.get()
         
         # 验证输入
         if not input_dir:
             messagebox.showerror("错误", "请选择输入文件夹")
-            return
+            return None
         
         if not os.path.exists(input_dir):
             messagebox.showerror("错误", "所选输入文件夹不存在")
-            return
+            return None
         
         if not subfolder_name.strip():
             messagebox.showerror("错误", "请输入子文件夹名称")
-            return
+            return None
         
         # 创建输出子文件夹
         output_dir = os.path.join(input_dir, subfolder_name)
@@ -299,92 +1204,128 @@ class MultiFormatExtractorApp:
             os.makedirs(output_dir, exist_ok=True)
         except Exception as e:
             messagebox.showerror("错误", f"无法创建输出子文件夹: {str(e)}")
+            return None
+        return input_dir, output_dir
+    
+    def scan_options(self):
+        """在界面线程中读取扫描选项，交给后台线程使用"""
+        return {
+            "fts": self.use_fts.get(),
+            "recursive": self.recursive.get(),
+            "include": parse_patterns(self.include_patterns.get()),
+            "exclude": parse_patterns(self.exclude_patterns.get()),
+        }
+    
+    def process_files(self):
+        """批量处理文件夹中的文件"""
+        dirs = self.prepare_output()
+        if not dirs:
             return
+        input_dir, output_dir = dirs
         
-        # 获取文件夹中所有支持的文件
-        all_files = []
-        for f in os.listdir(input_dir):
-            file_path = os.path.join(input_dir, f)
-            if os.path.isfile(file_path):
-                file_type, ext = self.get_file_type(f)
-                if file_type:
-                    all_files.append((f, file_type, ext))
+        # 开始批量处理
+        self.log(f"开始扫描: {input_dir}")
+        self.log(f"提取结果将保存至: {output_dir}")
+        self.process_btn.config(state=tk.DISABLED)
+        self.watch_btn.config(state=tk.DISABLED)
+        threading.Thread(target=self.run_batch,
+                         args=(input_dir, output_dir, self.scan_options(), self.use_hardlink.get()),
+                         daemon=True).start()
+    
+    def run_batch(self, input_dir, output_dir, options, use_hardlink=False):
+        """后台线程：扫描文件夹，跳过已处理且未变化的文件，提取其余文件"""
+        start_time = time.time()
+        try:
+            summary = BatchExtractor(input_dir, output_dir, hardlink=use_hardlink,
+                                     on_event=self.on_batch_event, **options).run()
+        except Exception as e:
+            self.post("log", f"批量处理出错: {str(e)}")
+            self.post("done", 0, 0, time.time() - start_time, output_dir)
+            return
         
-        if not all_files:
+        if not summary["found"]:
             supported_formats = []
             for fmt_list in self.supported_formats.values():
                 supported_formats.extend(fmt_list)
-            messagebox.showinfo("提示", f"所选文件夹中没有找到支持的文件格式\n支持格式: {', '.join(supported_formats)}")
+            self.post("info", f"所选文件夹中没有找到支持的文件格式\n支持格式: {', '.join(supported_formats)}")
             return
-        
-        # 开始批量处理
-        self.log(f"开始批量处理，共发现 {len(all_files)} 个支持的文件")
-        self.log(f"提取结果将保存至: {output_dir}")
-        success_count = 0
-        error_count = 0
-        
-        for file, file_type, ext in all_files:
-            file_path = os.path.join(input_dir, file)
-            self.log(f"\n处理文件: {file}")
-            
-            # 获取原文件名（不含扩展名）
-            original_name = os.path.splitext(file)[0]
-            
-            # 获取提取的信息作为文件名的一部分
-            extracted_info = self.get_title_for_filename(file_path, file_type, ext)
-            
-            if not extracted_info:
-                self.log(f"处理 {file} 失败：无法提取信息")
-                error_count += 1
-                continue
-            
-            # 组合旧文件名和提取的信息作为新文件名
-            new_filename_base = f"{original_name}_{extracted_info}"
-            
-            # 清理文件名并添加扩展名
-            filename = self.sanitize_filename(new_filename_base) + f".{ext}"
-            
-            # 处理可能的文件名重复
-            base_filename, ext = os.path.splitext(filename)
-            counter = 1
-            output_path = os.path.join(output_dir, filename)
-            
-            # 如果文件已存在，添加编号
-            while os.path.exists(output_path):
-                filename = f"{base_filename}_{counter}{ext}"
-                output_path = os.path.join(output_dir, filename)
-                counter += 1
-            
-            # 复制文件（保留原格式）
-            try:
-                # 对于二进制文件直接复制
-                if file_type in ['word', 'excel', 'powerpoint', 'pdf']:
-                    with open(file_path, 'rb') as src, open(output_path, 'wb') as dst:
-                        dst.write(src.read())
-                # 对于文本文件，使用UTF-8编码保存
-                else:
-                    content = self.extract_text_from_file(file_path, file_type, ext)
-                    if content:
-                        with open(output_path, 'w', encoding='utf-8') as f:
-                            f.write(content)
-                    else:
-                        raise Exception("无法提取文件内容")
-                
-                self.log(f"已保存至: {filename}")
-                success_count += 1
-                
-                # 短暂延迟，避免界面卡顿
-                self.root.update()
-                time.sleep(0.1)
-                
-            except Exception as e:
-                self.log(f"保存 {file} 时出错: {str(e)}")
-                error_count += 1
-        
-        # 处理完成
-        self.log(f"\n处理完成！成功: {success_count} 个, 失败: {error_count} 个")
-        messagebox.showinfo("完成", f"批量处理完成！\n成功: {success_count} 个文件\n失败: {error_count} 个文件\n结果保存至: {output_dir}")
+        self.post("done", summary["success"], summary["error"], summary["elapsed"], output_dir)
+    
+    def on_batch_event(self, event):
+        """把批量提取的进度事件转换为日志，在后台线程中调用"""
+        kind = event["event"]
+        if kind == "scan" and event["found"]:
+            self.post("log", f"共发现 {event['found']} 个支持的文件，其中 {event['skipped']} 个已处理过且没有变化，跳过")
+        elif kind == "new_files":
+            self.post("log", f"\n发现 {event['count']} 个新文件")
+        elif kind == "file":
+            self.post("log", f"\n处理文件: {event['path']}")
+            if event["extract_error"]:
+                self.post("log", f"提取文本时出错: {event['extract_error']}")
+            if event["ok"]:
+                self.post("log", f"已保存至: {os.path.basename(event['output'])}")
+            else:
+                self.post("log", f"处理 {os.path.basename(event['path'])} 失败：{event['error']}")
+        elif kind == "error":
+            self.post("log", event["message"])
+
+    def search_index(self):
+        """在当前输出文件夹的全文索引中搜索关键词，结果显示在状态区"""
+        query = self.search_query.get().strip()
+        input_dir = self.input_dir.get()
+        if not query or not input_dir:
+            return
+        output_dir = os.path.join(input_dir, self.subfolder_name.get())
+        start_time = time.perf_counter()
+        results = search(output_dir, query)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        self.log(f"\n搜索“{query}”：找到 {len(results)} 个结果，用时 {elapsed:.0f} 毫秒")
+        if not results and not os.path.exists(os.path.join(output_dir, INDEX_FILE_NAME)):
+            self.log("输出文件夹中还没有全文索引，请勾选“建立全文索引”后批量提取")
+        for result in results:
+            self.log(f"{result['path']} | {result['title']}")
+            self.log(f"    {result['snippet']}")
     
+    def toggle_watch(self):
+        """开始或停止监视输入文件夹"""
+        if self.watch_stop:
+            self.watch_stop.set()
+            self.watch_btn.config(state=tk.DISABLED)
+            self.log("正在停止监视...")
+            return
+        dirs = self.prepare_output()
+        if not dirs:
+            return
+        input_dir, output_dir = dirs
+        self.watch_stop = threading.Event()
+        self.watch_btn.config(text="停止监视")
+        self.process_btn.config(state=tk.DISABLED)
+        self.log(f"开始监视: {input_dir}，每 {WATCH_INTERVAL} 秒检查一次新文件")
+        threading.Thread(target=self.watch_folder,
+                         args=(input_dir, output_dir, self.scan_options(), self.use_hardlink.get(), self.watch_stop),
+                         daemon=True).start()
+    
+    def watch_folder(self, input_dir, output_dir, options, use_hardlink, stop):
+        """后台线程：持续处理放入文件夹的新文件，直到停止监视"""
+        try:
+            BatchExtractor(input_dir, output_dir, hardlink=use_hardlink,
+                           on_event=self.on_batch_event, **options).watch(stop)
+        except Exception as e:
+            self.post("log", f"监视出错: {str(e)}")
+        finally:
+            self.post("log", "已停止监视")
+            self.post("watch_stopped")
+
+    def finish_processing(self, success_count, error_count, elapsed, output_dir):
+        """处理完成后显示统计"""
+        self.process_btn.config(state=tk.NORMAL)
+        self.watch_btn.config(state=tk.NORMAL)
+        rate = (success_count + error_count) / max(elapsed, 0.001)
+        self.log(f"\n处理完成！成功: {success_count} 个, 失败: {error_count} 个, "
+                 f"用时 {elapsed:.1f} 秒, 平均 {rate:.1f} 个/秒")
+        messagebox.showinfo("完成", f"批量处理完成！\n成功: {success_count} 个文件\n失败: {error_count} 个文件\n"
+                                  f"平均速度: {rate:.1f} 个/秒\n结果保存至: {output_dir}")
+
     def delete_empty_files(self):
         """删除所选文件夹中的空文件"""
         input_dir = self.input_dir.get()
@@ -440,7 +1381,64 @@ class MultiFormatExtractorApp:
             f"空文件处理完成！\n已删除: {deleted_count} 个空文件\n未删除: {skipped_count} 个非空文件或文件夹"
         )
 
+def main(argv=None):
+    """命令行模式：处理输入文件夹，进度以每行一个JSON对象输出到标准输出"""
+    parser = argparse.ArgumentParser(description="多格式文件内容提取工具（命令行模式，不带参数运行时打开界面）")
+    parser.add_argument("input_dir", help="输入文件夹")
+    parser.add_argument("-o", "--output", default=DEFAULT_SUBFOLDER, help="输出文件夹，相对路径表示输入文件夹下的子文件夹")
+    parser.add_argument("-r", "--recursive", action="store_true", help="包含子文件夹")
+    parser.add_argument("--include", default="", help="只处理匹配的文件，多个用;分隔，如 *.pdf;报告*")
+    parser.add_argument("--exclude", default="", help="跳过匹配的文件和文件夹，多个用;分隔")
+    parser.add_argument("-j", "--jobs", type=int, default=EXTRACT_WORKERS, help="提取进程数")
+    parser.add_argument("--timeout", type=float, default=EXTRACT_TIMEOUT, help="单个文件的提取超时(秒)")
+    parser.add_argument("--hardlink", action="store_true", help="用硬链接代替复制")
+    parser.add_argument("--watch", action="store_true", help="持续监视输入文件夹，按Ctrl+C停止")
+    parser.add_argument("--fts", action="store_true", help="把提取的文本写入全文索引")
+    parser.add_argument("--search", metavar="关键词", help="在输出文件夹的全文索引中搜索，不处理文件")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"输入文件夹不存在: {args.input_dir}")
+    
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+    
+    def print_event(event):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+    
+    if args.search:
+        for result in search(os.path.join(args.input_dir, args.output), args.search):
+            print_event(dict(event="result", **result))
+        return 0
+    
+    batch = BatchExtractor(
+        args.input_dir,
+        os.path.join(args.input_dir, args.output),
+        recursive=args.recursive,
+        include=parse_patterns(args.include),
+        exclude=parse_patterns(args.exclude),
+        hardlink=args.hardlink,
+        fts=args.fts,
+        workers=max(1, args.jobs),
+        timeout=args.timeout,
+        on_event=print_event,
+    )
+    if args.watch:
+        try:
+            batch.watch(threading.Event())
+        except KeyboardInterrupt:
+            pass
+        return 0
+    summary = batch.run()
+    return 1 if summary["error"] else 0
+
 if __name__ == "__main__":
+    # 打包成exe后，提取进程启动时直接进入工作函数而不是再打开一个界面
+    multiprocessing.freeze_support()
+    
+    # 带参数时使用命令行模式
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    
     # 创建自定义按钮样式
     root = tk.Tk()
     style = ttk.Style()
@@ -7,7 +7,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['comtypes.client', 'xlrd', 'openpyxl', 'pdfminer', 'bs4'],
+    hiddenimports=['comtypes.client', 'xlrd', 'openpyxl', 'pdfminer'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,41 @@
+"""网页标题编码识别测试
+
+用法:
+    python -m unittest test_html_title
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import multi_format_extractor
+
+
+PAGE = "<html><head><title>中文标题</title></head><body><p>网页正文内容，用于测试编码识别。</p></body></html>"
+
+
+class HtmlTitleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="test_html_title_")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_page(self, encoding):
+        path = os.path.join(self.directory, f"page_{encoding}.html")
+        with open(path, 'w', encoding=encoding) as f:
+            f.write(PAGE)
+        return path
+
+    def test_title_matches_body_encoding(self):
+        for encoding in ('gbk', 'utf-8', 'utf-8-sig', 'utf-16'):
+            with self.subTest(encoding=encoding):
+                path = self.write_page(encoding)
+                self.assertEqual(multi_format_extractor.extract_metadata_title(path, 'web', 'html'), "中文标题")
+                result = multi_format_extractor.extract(path)
+                self.assertEqual(result["title"], "中文标题")
+                self.assertIn("网页正文内容", result["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,31 @@
 import os
 import sys
-import shutil
+import stat
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import ctypes
 import subprocess
 import platform
 import threading
+import queue
+import time
+import tempfile
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SIZE_SCAN_WORKERS = min(32, (os.cpu_count() or 4) * 4)  # 计算大小的线程数，主要在等待磁盘，可多于CPU数
+SIZE_FLUSH_FILES = 2000  # 每统计多少个文件向界面汇报一次部分结果
+SIZE_POLL_INTERVAL = 200  # 界面刷新扫描进度的间隔(毫秒)
+DEEP_SCAN_MAX_DEPTH = 4  # 深度扫描的最大目录层数
+DEEP_SCAN_WORKERS = 16  # 深度扫描同时列举目录的线程数
+# 深度扫描时跳过的驱动器根目录下的系统文件夹（小写）
+DEEP_SCAN_SKIP_DIRS = {
+    'windows', 'windows.old', '$recycle.bin', 'system volume information', 'recovery',
+    'config.msi', 'perflogs', '$windows.~bt', '$windows.~ws', '$winreagent', '$sysreset',
+}
+DELETE_WORKERS = 16  # 并行删除文件的线程数
+DELETE_BATCH_FILES = 500  # 每批交给一个线程删除的文件数
+TRASH_DIR_NAME = ".cleaner_trash"  # 暂存待删除内容的临时文件夹，建在被清理文件夹的上一级，保证在同一分区
 
 class WeChatCleaner:
     def __init__(self, root):
@@ -27,14 +45,43 @@ class WeChatCleaner:
         
         # 微信文件夹路径
         self.default_paths = self.get_default_paths()
-        self.scanned_paths = []  # 存储深度扫描到的路径
+        self.scanned_paths = set()  # 存储深度扫描到的路径
+        # 深度扫描的进度：已列举的目录数、开始时间，由后台线程更新
+        self.deep_lock = threading.Lock()
+        self.deep_dirs = 0
+        self.deep_start = 0
+        self.deep_scan_done = True
         self.all_paths = self.default_paths.copy()
         
         self.folder_states = {path: tk.BooleanVar(value=True) for path in self.all_paths}
         self.folder_sizes = {}
+        # 大小扫描的进度：各路径已统计的字节数、文件数、已完成/总任务数，由后台线程更新
+        self.size_lock = threading.Lock()
+        self.size_partial = {}
+        self.size_files = 0
+        self.size_tasks_done = 0
+        self.size_tasks_total = 0
+        self.size_scan_done = True
+        # 删除进度：已释放的字节数、已删除的文件数、出错信息，由后台线程更新
+        self.delete_lock = threading.Lock()
+        self.delete_bytes = 0
+        self.delete_files = 0
+        self.delete_errors = []
+        self.delete_start = 0
+        self.delete_targets = []
+        self.delete_use_trash = True
+        self.delete_staged = False  # 已全部移到临时文件夹，界面可以先恢复
+        self.delete_released = False  # 界面已恢复，剩余内容在后台清除
+        self.delete_done = True
+        self.stop_delete = False
+        self.deleting = False
+        self.size_scan_paths = []
+        # 目录大小缓存：{目录: (修改时间, 直接包含的文件大小, 文件数, 子目录列表)}，只在删除后重新扫描时使用
+        self.size_cache = {}
         self.scanning = False  # 扫描状态标记
         self.stop_scan = False  # 停止扫描标记
         self.filter_type = tk.StringVar(value="全部")  # 筛选类型
+        self.use_trash = tk.BooleanVar(value=True)  # 删除时先移到临时文件夹
         
         # 创建UI
         self.create_widgets()
@@ -169,7 +216,15 @@ class WeChatCleaner:
         # 删除按钮
         delete_btn = ttk.Button(main_frame, text="删除选中的文件夹内容", command=self.delete_selected, 
                               style="Danger.TButton")
-        delete_btn.pack(fill=tk.X, pady=(0, 20))
+        delete_btn.pack(fill=tk.X, pady=(0, 5))
+        
+        # 删除选项和后台清除状态
+        delete_frame = ttk.Frame(main_frame)
+        delete_frame.pack(fill=tk.X, pady=(0, 15))
+        ttk.Checkbutton(delete_frame, text="先移到临时文件夹，再在后台清除（界面立即响应）", 
+                        variable=self.use_trash).pack(side=tk.LEFT)
+        self.delete_status = ttk.Label(delete_frame, text="")
+        self.delete_status.pack(side=tk.RIGHT)
         
         # 风险提示区域
         risk_frame = ttk.LabelFrame(main_frame, text="⚠️ 重要提示", padding=10)
@@ -276,27 +331,90 @@ class WeChatCleaner:
         
         self.update_folder_list()
     
-    def get_folder_size(self, folder):
-        """计算文件夹大小，支持中途停止"""
+    def get_folder_size(self, folder, root=None):
+        """用 os.scandir 计算文件夹大小，支持中途停止
+        
+        DirEntry 自带的类型和大小信息（Windows上由目录列举直接返回）省去了每个文件的额外系统调用。
+        指定 root 时，每统计一批文件就把部分结果累加到 root 的进度中。
+        """
         total_size = 0
+        pending_size = 0
+        pending_files = 0
+        dirs = [folder]
+        while dirs:
+            # 检查是否需要停止
+            if self.stop_scan:
+                return -1
+            
+            size, files, subdirs = self.read_dir(dirs.pop())
+            pending_size += size
+            pending_files += files
+            dirs.extend(subdirs)
+            
+            if root is not None and pending_files >= SIZE_FLUSH_FILES:
+                self.add_size_progress(root, pending_size, pending_files)
+                total_size += pending_size
+                pending_size = pending_files = 0
+        
+        if root is not None:
+            self.add_size_progress(root, pending_size, pending_files)
+        return total_size + pending_size
+    
+    def read_dir(self, path):
+        """返回目录直接包含的文件总大小、文件数和子目录列表
+        
+        目录的修改时间在其中增删、重命名文件或子目录时才会变化，未变化时直接使用缓存，
+        不再列举其中的文件；子目录仍逐个检查，所以只有发生变化的目录会被重新列举。
+        原地变大的文件（如微信的数据库）不会改变目录的修改时间，FAT/exFAT分区也不一定更新，
+        所以手动扫描时清空缓存重新统计。已删除或移走的子目录在重新列举时连同其下所有目录从缓存中删除。
+        """
         try:
-            for dirpath, _, filenames in os.walk(folder):
-                # 检查是否需要停止
-                if self.stop_scan:
-                    return -1
-                    
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    if os.path.exists(fp):
-                        total_size += os.path.getsize(fp)
-                        
-                # 再次检查是否需要停止
-                if self.stop_scan:
-                    return -1
-                    
-        except Exception as e:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.forget_cached_dirs([path])
+            return 0, 0, []
+        
+        cached = self.size_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1:]
+        
+        size = 0
+        files = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError as e:
             print(f"计算大小出错: {e}")
-        return total_size
+            return size, files, subdirs
+        
+        if cached:
+            self.forget_cached_dirs(set(cached[3]).difference(subdirs))
+        # 先取修改时间再列举，列举期间目录若有变化，下次扫描会因时间不同而重新列举
+        self.size_cache[path] = (mtime, size, files, subdirs)
+        return size, files, subdirs
+    
+    def forget_cached_dirs(self, paths):
+        """删除这些目录及其下所有子目录的大小缓存"""
+        stack = list(paths)
+        while stack:
+            cached = self.size_cache.pop(stack.pop(), None)
+            if cached:
+                stack.extend(cached[3])
+    
+    def add_size_progress(self, root, size, files):
+        """后台线程累加某个路径已统计的大小和文件数"""
+        with self.size_lock:
+            self.size_partial[root] += size
+            self.size_files += files
     
     def format_size(self, size_bytes):
         """格式化文件大小为易读格式"""
@@ -309,12 +427,17 @@ class WeChatCleaner:
         else:
             return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
     
-    def scan_folders(self):
-        """扫描文件夹大小，支持中途停止"""
+    def scan_folders(self, paths=None, use_cache=False):
+        """扫描文件夹大小，支持中途停止；paths 为空时扫描全部路径
+        
+        use_cache 为真时（删除后重新扫描）沿用修改时间未变的目录的缓存，否则清空缓存完整统计。
+        """
         if self.scanning:
             messagebox.showinfo("提示", "正在进行扫描操作，请等待完成")
             return
             
+        if not use_cache:
+            self.size_cache.clear()
         self.scanning = True
         self.stop_scan = False
         
@@ -348,12 +471,14 @@ class WeChatCleaner:
         self.size_status.pack(pady=5)
         
         # 在新线程中执行扫描，避免UI冻结
+        self.size_scan_paths = list(paths or self.all_paths)
+        self.size_scan_done = False
         scan_thread = threading.Thread(target=self.perform_size_scan)
         scan_thread.daemon = True
         scan_thread.start()
         
         # 检查扫描线程是否完成
-        self.root.after(100, self.check_size_scan_complete)
+        self.root.after(SIZE_POLL_INTERVAL, self.check_size_scan_complete)
     
     def set_child_window_icon(self, window):
         """为子窗口设置图标"""
@@ -371,32 +496,63 @@ class WeChatCleaner:
             pass  # 子窗口图标设置失败不影响主功能
     
     def perform_size_scan(self):
-        """执行大小扫描的实际操作"""
-        total_paths = len(self.all_paths)
-        completed = 0
+        """执行大小扫描的实际操作（后台线程）
         
-        for path in self.all_paths:
-            # 检查是否需要停止
-            if self.stop_scan:
-                return
+        每个路径的第一层子文件夹作为独立任务放入线程池并行统计，第一层的文件直接统计；
+        部分结果累加到 size_partial，由界面线程定时显示。
+        """
+        paths = [path for path in self.size_scan_paths if os.path.exists(path)]
+        with self.size_lock:
+            self.size_partial = {path: 0 for path in paths}
+            self.size_files = 0
+            self.size_tasks_done = 0
+            self.size_tasks_total = 0
+        
+        try:
+            with ThreadPoolExecutor(max_workers=SIZE_SCAN_WORKERS) as pool:
+                futures = []
+                for path in paths:
+                    if self.stop_scan:
+                        return
+                    top_size, top_files, subdirs = self.read_dir(path)
+                    self.add_size_progress(path, top_size, top_files)
+                    for subdir in subdirs:
+                        futures.append(pool.submit(self.get_folder_size, subdir, path))
                 
-            # 更新进度
-            completed += 1
-            progress = (completed / total_paths) * 100
-            self.size_progress["value"] = progress
-            self.size_status.config(text=f"正在扫描: {os.path.basename(path)}")
+                with self.size_lock:
+                    self.size_tasks_total = len(futures)
+                for future in as_completed(futures):
+                    with self.size_lock:
+                        self.size_tasks_done += 1
+                    if future.result() == -1:  # 被停止，取消还没开始的任务
+                        for pending in futures:
+                            pending.cancel()
+                        return
             
-            if os.path.exists(path):
-                size = self.get_folder_size(path)
-                if size == -1:  # 被停止
-                    return
-                self.folder_sizes[path] = self.format_size(size)
+            for path in paths:
+                self.folder_sizes[path] = self.format_size(self.size_partial[path])
+        finally:
+            self.size_scan_done = True
     
     def check_size_scan_complete(self):
-        """检查大小扫描是否完成"""
-        if self.scanning and hasattr(self, 'progress_window') and self.progress_window.winfo_exists():
+        """检查大小扫描是否完成，未完成时显示已统计的部分结果"""
+        if not self.size_scan_done:
+            if hasattr(self, 'progress_window') and self.progress_window.winfo_exists():
+                with self.size_lock:
+                    partial = dict(self.size_partial)
+                    files = self.size_files
+                    done, total = self.size_tasks_done, self.size_tasks_total
+                if total:
+                    self.size_progress["value"] = done / total * 100
+                self.size_status.config(text=f"已统计 {files} 个文件，共 {self.format_size(sum(partial.values()))}")
+                for path, size in partial.items():
+                    self.folder_sizes[path] = f"{self.format_size(size)}..."
+                self.update_folder_list()
+            else:
+                # 进度窗口被关闭，视为停止扫描
+                self.stop_scan = True
             # 继续等待
-            self.root.after(100, self.check_size_scan_complete)
+            self.root.after(SIZE_POLL_INTERVAL, self.check_size_scan_complete)
             return
             
         # 恢复按钮状态
@@ -412,6 +568,10 @@ class WeChatCleaner:
         self.update_folder_list()
         
         if self.stop_scan:
+            # 被终止的路径只统计了一部分，不显示不完整的大小
+            for path in self.size_partial:
+                self.folder_sizes.pop(path, None)
+            self.update_folder_list()
             messagebox.showinfo("已停止", "文件夹大小扫描已被终止")
             self.stop_scan = False
         else:
@@ -438,12 +598,12 @@ class WeChatCleaner:
             return
             
         # 确认深度扫描
-        if not messagebox.askyesno("确认", "深度扫描将搜索所有驱动器中包含'wechat'字符的文件夹，\n限制扫描4层目录，可能需要几分钟时间，是否继续？"):
+        if not messagebox.askyesno("确认", f"深度扫描将搜索所有驱动器中包含'wechat'字符的文件夹，\n限制扫描{DEEP_SCAN_MAX_DEPTH}层目录，可能需要几分钟时间，是否继续？"):
             return
-            
+        
         self.scanning = True
         self.stop_scan = False
-        self.scanned_paths = []
+        self.scanned_paths = set()
         
         # 更新按钮状态
         self.scan_btn.config(state=tk.DISABLED)
@@ -478,90 +638,102 @@ class WeChatCleaner:
         self.scan_progress.start()
         
         # 在新线程中执行扫描，避免UI冻结
+        self.deep_scan_done = False
         scan_thread = threading.Thread(target=self.perform_deep_scan)
         scan_thread.daemon = True
         scan_thread.start()
         
         # 检查扫描线程是否完成
-        self.root.after(100, self.check_scan_complete)
+        self.root.after(SIZE_POLL_INTERVAL, self.check_scan_complete)
     
-    def perform_deep_scan(self):
-        """执行深度扫描的实际操作，限制在4层文件夹，支持停止"""
+    def perform_deep_scan(self, max_depth=DEEP_SCAN_MAX_DEPTH):
+        """执行深度扫描的实际操作（后台线程），限制目录层数，支持停止
+        
+        所有驱动器的目录放入同一个队列，由多个线程按广度优先并行列举。
+        """
         # 正则表达式匹配包含wechat的文件夹（不区分大小写）
         pattern = re.compile(r'wechat', re.IGNORECASE)
-        
-        # 获取所有驱动器
-        drives = self.get_all_drives()
-        max_depth = 4  # 限制最大扫描深度为4层
-        
-        # 扫描每个驱动器
-        for drive in drives:
-            # 检查是否需要停止
-            if self.stop_scan:
+        known = set(self.all_paths)
+        with self.deep_lock:
+            self.deep_dirs = 0
+            self.deep_start = time.perf_counter()
+        
+        # 跳过默认路径所在的驱动器以提高效率
+        default_drive = os.path.splitdrive(self.default_paths[0])[0] + "\\"
+        work = queue.Queue()
+        for drive in self.get_all_drives():
+            if drive != default_drive:
+                work.put((drive, 0))
+        
+        workers = [threading.Thread(target=self.crawl_directories, args=(work, max_depth, pattern, known), daemon=True)
+                   for _ in range(DEEP_SCAN_WORKERS)]
+        for worker in workers:
+            worker.start()
+        try:
+            # 队列中的目录都处理完（包括处理时新加入的子目录）才算扫描完成
+            work.join()
+        finally:
+            for _ in workers:
+                work.put(None)
+            self.deep_scan_done = True
+    
+    def crawl_directories(self, work, max_depth, pattern, known):
+        """深度扫描的工作线程：从队列取出目录，记录名称匹配的子目录，未超过层数的子目录放回队列"""
+        while True:
+            item = work.get()
+            if item is None:
                 return
-                
-            # 更新状态
-            self.scan_status.config(text=f"正在扫描: {drive}")
-            
-            # 跳过默认路径所在的驱动器以提高效率
-            default_drive = os.path.splitdrive(self.default_paths[0])[0] + "\\"
-            if drive == default_drive:
-                continue
-                
+            current_dir, depth = item
             try:
-                # 递归扫描驱动器，限制深度
-                self.scan_directory(drive, 0, max_depth, pattern)
-                
-            except Exception as e:
-                print(f"扫描驱动器 {drive} 时出错: {e}")
-                continue
+                # 停止后只清空队列，不再列举
+                if not self.stop_scan:
+                    self.crawl_directory(work, current_dir, depth, max_depth, pattern, known)
+            finally:
+                work.task_done()
     
-    def scan_directory(self, current_dir, current_depth, max_depth, pattern):
-        """递归扫描目录，限制深度，支持停止"""
-        # 检查是否需要停止
-        if self.stop_scan:
-            return
-            
-        if current_depth > max_depth:
-            return
-            
-        # 检查当前目录是否包含wechat
-        if pattern.search(current_dir):
-            if current_dir not in self.all_paths:
-                self.scanned_paths.append(current_dir)
-                
+    def crawl_directory(self, work, current_dir, depth, max_depth, pattern, known):
+        """列举一个目录的子目录"""
         try:
-            # 获取子目录
-            dirs = [d for d in os.listdir(current_dir) 
-                   if os.path.isdir(os.path.join(current_dir, d))]
-            
-            # 递归扫描子目录
-            for dir_name in dirs:
-                # 检查是否需要停止
-                if self.stop_scan:
-                    return
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_dir(follow_symlinks=False):
+                            continue
+                    except OSError:
+                        continue
+                    if depth == 0 and entry.name.lower() in DEEP_SCAN_SKIP_DIRS:
+                        continue
                     
-                # 检查子目录名是否包含wechat
-                if pattern.search(dir_name):
-                    full_path = os.path.join(current_dir, dir_name)
-                    if full_path not in self.all_paths:
-                        self.scanned_paths.append(full_path)
-                
-                # 继续扫描下一层
-                self.scan_directory(os.path.join(current_dir, dir_name), 
-                                   current_depth + 1, max_depth, pattern)
-                                   
-        except Exception as e:
+                    # 检查子目录路径是否包含wechat
+                    if pattern.search(entry.path) and entry.path not in known:
+                        with self.deep_lock:
+                            self.scanned_paths.add(entry.path)
+                    
+                    # 继续扫描下一层
+                    if depth < max_depth:
+                        work.put((entry.path, depth + 1))
+        except OSError as e:
             # 忽略没有访问权限的目录
-            if "访问被拒绝" not in str(e):
+            if not isinstance(e, PermissionError):
                 print(f"扫描目录 {current_dir} 时出错: {e}")
-            return
+        
+        with self.deep_lock:
+            self.deep_dirs += 1
     
     def check_scan_complete(self):
-        """检查深度扫描是否完成"""
-        if self.scanning and hasattr(self, 'scan_progress_window') and self.scan_progress_window.winfo_exists():
+        """检查深度扫描是否完成，未完成时显示扫描速度"""
+        if not self.deep_scan_done:
+            if hasattr(self, 'scan_progress_window') and self.scan_progress_window.winfo_exists():
+                with self.deep_lock:
+                    dirs = self.deep_dirs
+                    found = len(self.scanned_paths)
+                elapsed = max(time.perf_counter() - self.deep_start, 0.001)
+                self.scan_status.config(text=f"已扫描 {dirs} 个目录（{dirs / elapsed:.0f} 个/秒），发现 {found} 个相关文件夹")
+            else:
+                # 进度窗口被关闭，视为停止扫描
+                self.stop_scan = True
             # 继续等待
-            self.root.after(100, self.check_scan_complete)
+            self.root.after(SIZE_POLL_INTERVAL, self.check_scan_complete)
             return
             
         # 恢复按钮状态
@@ -582,12 +754,12 @@ class WeChatCleaner:
         else:
             # 扫描正常完成
             if self.scanned_paths:
-                # 去重处理
-                unique_paths = list(set(self.scanned_paths))
+                unique_paths = sorted(self.scanned_paths)
                 
                 # 添加新扫描到的路径
+                known = set(self.all_paths)
                 for path in unique_paths:
-                    if path not in self.all_paths:
+                    if path not in known:
                         self.all_paths.append(path)
                         self.folder_states[path] = tk.BooleanVar(value=False)  # 新扫描的路径默认不选中
                 
@@ -609,7 +781,10 @@ class WeChatCleaner:
         if self.scanning:
             messagebox.showinfo("提示", "正在进行扫描操作，请等待完成")
             return
-            
+        if self.deleting:
+            messagebox.showinfo("提示", "正在后台清除上次删除的内容，请等待完成")
+            return
+        
         # 获取选中的文件夹
         selected = [path for path in self.all_paths 
                    if self.folder_states[path].get() and os.path.exists(path)]
@@ -617,6 +792,7 @@ class WeChatCleaner:
         if not selected:
             messagebox.showinfo("提示", "请先选择要删除的文件夹")
             return
+        selected = self.remove_nested_paths(selected)
         
         # 显示风险提示并确认
         confirm_msg = "警告：删除操作将清除以下文件夹中的所有内容，\n可能导致微信数据永久丢失！\n\n"
@@ -625,23 +801,294 @@ class WeChatCleaner:
         if not messagebox.askyesno("确认删除", confirm_msg):
             return
         
-        # 执行删除
-        results = []
-        for path in selected:
+        self.start_delete(selected)
+    
+    def remove_nested_paths(self, paths):
+        """去掉重复的路径和位于另一个路径之中的路径
+        
+        清理上级文件夹时其中的子文件夹已一并删除；若分别处理，子文件夹的临时文件夹会被移进上级文件夹的临时文件夹，
+        之后找不到而报告清理失败。
+        """
+        result = []
+        kept = []
+        for path in sorted(paths, key=lambda p: len(os.path.abspath(p))):
+            key = os.path.join(os.path.normcase(os.path.abspath(path)), "")
+            if not any(key.startswith(parent) for parent in kept):
+                kept.append(key)
+                result.append(path)
+        # 保持原来的顺序
+        return [path for path in paths if path in result]
+    
+    def start_delete(self, selected):
+        """在后台线程中删除选中文件夹的内容，显示删除进度"""
+        self.scanning = True
+        self.deleting = True
+        self.stop_delete = False
+        self.delete_targets = selected
+        self.delete_use_trash = self.use_trash.get()
+        self.delete_staged = False
+        self.delete_released = False
+        self.delete_done = False
+        with self.delete_lock:
+            self.delete_bytes = 0
+            self.delete_files = 0
+            self.delete_errors = []
+            self.delete_start = time.perf_counter()
+        
+        # 更新按钮状态
+        self.scan_btn.config(state=tk.DISABLED)
+        self.deep_scan_btn.config(state=tk.DISABLED)
+        
+        # 显示删除进度窗口
+        self.delete_window = tk.Toplevel(self.root)
+        self.delete_window.title("删除中")
+        self.delete_window.geometry("400x130")
+        self.delete_window.transient(self.root)
+        self.delete_window.grab_set()
+        self.set_child_window_icon(self.delete_window)
+        
+        ttk.Label(self.delete_window, text="正在删除选中文件夹的内容，请稍候...", padding=10).pack()
+        self.delete_label = ttk.Label(self.delete_window, text="准备开始删除...")
+        self.delete_label.pack(pady=5)
+        ttk.Button(self.delete_window, text="取消", command=self.cancel_delete).pack(pady=5)
+        
+        delete_thread = threading.Thread(target=self.perform_delete, args=(selected, self.delete_use_trash))
+        delete_thread.daemon = True
+        delete_thread.start()
+        
+        self.root.after(SIZE_POLL_INTERVAL, self.check_delete_progress)
+    
+    def cancel_delete(self):
+        """取消删除，已删除的内容无法恢复"""
+        if messagebox.askyesno("确认", "确定要取消删除吗？已移到临时文件夹的内容会移回原处，已删除的文件无法恢复"):
+            self.request_cancel()
+    
+    def request_cancel(self):
+        """请求取消删除；已全部移到临时文件夹或删除已结束时忽略，保证临时文件夹总会被清除
+        
+        确认对话框打开期间界面可能已经恢复，所以在这里而不是打开对话框前检查状态。
+        """
+        with self.delete_lock:
+            if not self.delete_staged and not self.delete_done:
+                self.stop_delete = True
+    
+    def perform_delete(self, selected, use_trash):
+        """执行删除的实际操作（后台线程）
+        
+        use_trash 为真时先把内容重命名到同一分区的临时文件夹，被清理的文件夹立即变空，
+        再清除临时文件夹（包括上次没清除完的）；无法移动的内容原地删除。
+        """
+        try:
+            targets = []
+            trash_dirs = set()
+            stage_dirs = []
+            staged = []  # (移动后的路径, 原路径)，取消时移回原处
+            for path in selected:
+                if self.stop_delete:
+                    break
+                try:
+                    items = [os.path.join(path, name) for name in os.listdir(path)]
+                except OSError as e:
+                    self.add_delete_error(path, e)
+                    continue
+                
+                if use_trash:
+                    trash_root = os.path.join(os.path.dirname(path), TRASH_DIR_NAME)
+                    try:
+                        os.makedirs(trash_root, exist_ok=True)
+                        # 多个被清理的文件夹可能在同一上一级目录下，用 mkdtemp 保证名称不重复
+                        stage_dir = tempfile.mkdtemp(dir=trash_root)
+                        trash_dirs.add(trash_root)
+                        stage_dirs.append(stage_dir)
+                    except OSError:
+                        stage_dir = None
+                    if stage_dir:
+                        remaining = []
+                        for item in items:
+                            if self.stop_delete:
+                                break
+                            staged_path = os.path.join(stage_dir, os.path.basename(item))
+                            try:
+                                os.rename(item, staged_path)
+                                staged.append((staged_path, item))
+                            except OSError:
+                                # 正在使用或不在同一分区，只能原地删除
+                                remaining.append(item)
+                        items = remaining
+                targets.extend(items)
+            
+            with self.delete_lock:
+                # 全部移到临时文件夹后不再响应取消
+                if use_trash and not self.stop_delete:
+                    self.delete_staged = True
+            if self.stop_delete:
+                self.restore_staged(staged, stage_dirs, trash_dirs)
+                return
+            self.purge(targets + sorted(trash_dirs))
+        finally:
+            self.delete_done = True
+    
+    def restore_staged(self, staged, stage_dirs, trash_dirs):
+        """取消时把已移到临时文件夹的内容移回原处，并删除空的临时文件夹"""
+        for staged_path, original in reversed(staged):
             try:
-                # 遍历文件夹并删除内容
-                for item in os.listdir(path):
-                    item_path = os.path.join(path, item)
-                    if os.path.isfile(item_path) or os.path.islink(item_path):
-                        os.unlink(item_path)
-                    elif os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
+                os.rename(staged_path, original)
+            except OSError as e:
+                self.add_delete_error(original, e)
+        # 临时文件夹中可能还有上次没清除完的内容，只删除空文件夹
+        for path in stage_dirs + sorted(trash_dirs):
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+    
+    def purge(self, targets):
+        """删除目标文件和文件夹：文件分批并行删除，全部删完后再自底向上删除目录，支持取消"""
+        dirs = []
+        batch = []
+        stack = list(targets)
+        with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as pool:
+            futures = []
+            while stack:
+                if self.stop_delete:
+                    break
+                
+                path = stack.pop()
+                try:
+                    st = os.lstat(path)
+                except OSError as e:
+                    self.add_delete_error(path, e)
+                    continue
+                if not self.is_real_dir(st):
+                    batch.append((path, st.st_size))
+                    continue
+                
+                dirs.append(path)
+                try:
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            try:
+                                st = entry.stat(follow_symlinks=False)
+                            except OSError as e:
+                                self.add_delete_error(entry.path, e)
+                                continue
+                            if self.is_real_dir(st):
+                                stack.append(entry.path)
+                            else:
+                                batch.append((entry.path, st.st_size))
+                            if len(batch) >= DELETE_BATCH_FILES:
+                                futures.append(pool.submit(self.delete_batch, batch))
+                                batch = []
+                except OSError as e:
+                    self.add_delete_error(path, e)
+            
+            if batch and not self.stop_delete:
+                futures.append(pool.submit(self.delete_batch, batch))
+            for future in futures:
+                future.result()
+        
+        if self.stop_delete:
+            return
+        # 子目录总在父目录之后加入列表，倒序删除保证先删子目录
+        for path in reversed(dirs):
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                self.add_delete_error(path, e)
+    
+    def is_real_dir(self, st):
+        """是否为需要进入删除内容的目录；符号链接和目录联接只删除链接本身，不能进入"""
+        if not stat.S_ISDIR(st.st_mode):
+            return False
+        return not getattr(st, 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_REPARSE_POINT
+    
+    def delete_batch(self, batch):
+        """删除一批文件（线程池中执行），只读文件去掉只读属性后重试"""
+        deleted_size = 0
+        deleted_files = 0
+        for path, size in batch:
+            if self.stop_delete:
+                break
+            try:
+                try:
+                    os.unlink(path)
+                except PermissionError:
+                    os.chmod(path, stat.S_IWRITE)
+                    os.unlink(path)
+            except OSError as e:
+                self.add_delete_error(path, e)
+                continue
+            deleted_size += size
+            deleted_files += 1
+        
+        with self.delete_lock:
+            self.delete_bytes += deleted_size
+            self.delete_files += deleted_files
+    
+    def add_delete_error(self, path, error):
+        """记录删除出错的路径
+        
+        未删除的文件使所在目录的修改时间可能没有变化，清除该目录的缓存，删除后重新扫描时按实际内容统计。
+        """
+        with self.delete_lock:
+            self.delete_errors.append((path, str(error)))
+        self.forget_cached_dirs([path, os.path.dirname(path)])
+    
+    def check_delete_progress(self):
+        """显示删除进度；删除完成，或已全部移到临时文件夹时恢复界面，剩余内容继续在后台清除"""
+        with self.delete_lock:
+            deleted_size = self.delete_bytes
+            deleted_files = self.delete_files
+            errors = list(self.delete_errors)
+        elapsed = max(time.perf_counter() - self.delete_start, 0.001)
+        progress = f"已释放 {self.format_size(deleted_size)}，删除 {deleted_files} 个文件（{deleted_files / elapsed:.0f} 个/秒）"
+        
+        if not self.delete_released:
+            if self.delete_window.winfo_exists():
+                self.delete_label.config(text=progress)
+            else:
+                # 进度窗口被关闭，视为取消删除
+                self.request_cancel()
+            
+            if self.delete_done or self.delete_staged:
+                self.release_delete()
+        elif self.delete_done:
+            failed = f"，{len(errors)} 项未能删除" if errors else ""
+            self.delete_status.config(text=f"后台清除完成，{progress}{failed}")
+        else:
+            self.delete_status.config(text=f"后台清除中：{progress}")
+        
+        if self.delete_done:
+            self.deleting = False
+        else:
+            self.root.after(SIZE_POLL_INTERVAL, self.check_delete_progress)
+    
+    def release_delete(self):
+        """关闭删除进度窗口，恢复按钮，重新扫描清理过的文件夹并显示结果"""
+        self.delete_released = True
+        with self.delete_lock:
+            errors = list(self.delete_errors)
+        if self.delete_window.winfo_exists():
+            self.delete_window.destroy()
+        self.scanning = False
+        self.scan_btn.config(state=tk.NORMAL)
+        self.deep_scan_btn.config(state=tk.NORMAL)
+        
+        results = []
+        for path in self.delete_targets:
+            failed = [error for error_path, error in errors 
+                      if error_path == path or error_path.startswith(os.path.join(path, ""))]
+            if self.stop_delete and failed and self.delete_use_trash:
+                results.append(f"已取消，{len(failed)} 项未能移回原处，保留在上一级的 {TRASH_DIR_NAME} 文件夹中: {path}")
+            elif self.stop_delete:
+                results.append(f"已取消，未删除的内容保留在原处: {path}")
+            elif failed:
+                results.append(f"清理失败 {path}: {failed[0]}（共 {len(failed)} 项未删除）")
+            else:
                 results.append(f"成功清理: {path}")
-            except Exception as e:
-                results.append(f"清理失败 {path}: {str(e)}")
         
-        # 重新扫描大小
-        self.scan_folders()
+        # 只重新扫描清理过的文件夹，其余文件夹保留原大小
+        self.scan_folders(self.delete_targets, use_cache=True)
         
         # 显示结果
         messagebox.showinfo("操作结果", "\n".join(results))